@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Атомарная запись файлов: временный файл рядом с целевым, fsync,
+os.replace и fsync каталога. При сбое на диске остаётся либо старая,
+либо новая версия файла целиком - обрезанного JSON не бывает.
+"""
+
+import json
+import os
+
+
+def fsync_dir(path):
+    """Сбрасывает на диск запись каталога (иначе переименование может потеряться при сбое питания)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Платформа не даёт открыть каталог (Windows)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path, text):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_dir(path)
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """json.dump в файл через временный файл + fsync + rename"""
+    dump_kwargs.setdefault('ensure_ascii', False)
+    atomic_write_text(path, json.dumps(data, **dump_kwargs))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки чистых функций tracker_bot.py (текст и клавиатуры)
+Сообщения генерируются в формате утреннего/вечернего расписания
+на 5-500 задач; для каждой функции меряется время вызова и память
+(пик tracemalloc). Результаты сравниваются с сохранённым базовым
+уровнем: рост больше порога - ненулевой код выхода.
+
+    python bench_tracker.py            # прогон и сравнение с bench_baseline.json (если есть)
+    python bench_tracker.py save       # прогон и сохранение базового уровня
+    python bench_tracker.py run        # только прогон
+
+BENCH_THRESHOLD - допустимый рост (0.25 = +25%), BENCH_BASELINE - файл
+базового уровня. Время сравнивается в единицах калибровочной нагрузки
+(фиксированный цикл на чистом Python, замеряется рядом с каждой функцией),
+чтобы сравнение переживало смену скорости машины; базовый уровень всё
+равно лучше сохранять на той же машине, где сравниваете.
+"""
+
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SIZES = (5, 20, 100, 500)
+REPEATS = 5
+MIN_REPEAT_TIME = 0.05  # Секунд на один повтор (число вызовов подбирается)
+
+TASK_WORDS = [
+    'Зарядка 15 минут', 'Почитать книгу с детьми и обсудить прочитанное', 'Прогулка',
+    '<i>Разобрать почту</i>', 'Позвонить родителям', 'Полить цветы', 'Проверить уроки',
+    'Подготовить одежду на завтра', 'Планирование завтрашнего дня (10 минут)', 'Медитация',
+]
+CANT_DO_WORDS = ['Сладкое после 19:00', 'Соцсети утром', 'Кричать на детей', 'Телефон за столом', 'Кофе после 16:00']
+
+
+def generate_message(tasks_count, seed=0):
+    """Сообщение расписания с tasks_count задачами, разбитыми на дневные/НЕЛЬЗЯ/вечерние"""
+    rnd = random.Random(seed)
+    cant_do = max(1, tasks_count // 5)
+    evening = max(1, (tasks_count - cant_do) // 3)
+    day = max(1, tasks_count - cant_do - evening)
+
+    lines = ['🌅 <b>Доброе утро!</b>', '<i>Пятница, 14 марта</i>', '']
+    lines.append('☀️ <b>Дневные задачи:</b>')
+    lines += [f"• {rnd.choice(TASK_WORDS)}" for _ in range(day)]
+    lines += ['', '⛔ <b>Нельзя делать:</b>']
+    lines += [f"• {rnd.choice(CANT_DO_WORDS)}" for _ in range(cant_do)]
+    lines += ['', '🌙 <b>Вечерние задачи:</b>']
+    lines += [f"• {rnd.choice(TASK_WORDS)}" for _ in range(evening)]
+    lines += ['', '💭 <b>Мудрость дня:</b>', 'Счастлив тот, кто счастлив у себя дома. — Лев Толстой', '']
+    return '\n'.join(lines)
+
+
+def half_completed(tasks, seed=0):
+    rnd = random.Random(seed)
+    return {section: sorted(rnd.sample(range(len(items)), len(items) // 2)) for section, items in tasks.items()}
+
+
+def create_bot():
+    """Бот без сети и файлов: фиктивное окружение, рабочий каталог во временной папке"""
+    os.environ.setdefault('TELEGRAM_TOKEN', 'bench')
+    os.environ.setdefault('TELEGRAM_CHAT_ID', 'bench')
+    os.environ.setdefault('UPDATE_MODE', 'webhook')
+    os.chdir(tempfile.mkdtemp(prefix='bench_tracker_'))
+    logging.disable(logging.CRITICAL)  # Функции логируют на каждом вызове
+    import tracker_bot
+    return tracker_bot.TaskTrackerBot()
+
+
+def cases(bot):
+    """(имя, размер, setup() -> func()) для всех функций и размеров"""
+    result = []
+    for size in SIZES:
+        text = generate_message(size, seed=size)
+        tasks = bot.parse_tasks(text)
+        completed = half_completed(tasks, seed=size)
+
+        def parse_cold(text=text):
+            bot.parser.cache.clear()
+            return bot.parse_tasks(text)
+
+        def toggle_render(tasks=tasks, completed=completed):
+            from state_store import TrackedMessage
+            state = TrackedMessage(tasks, completed)
+            bot.render_checklist(state)
+            return lambda: (state.toggle('day', 0), bot.render_checklist(state))
+
+        result += [
+            ('parse_tasks', size, lambda f=parse_cold: f),
+            ('parse_tasks[cached]', size, lambda text=text: (lambda: bot.parse_tasks(text))),
+            ('update_original_message_with_progress', size,
+             lambda text=text, tasks=tasks, completed=completed:
+             (lambda: bot.update_original_message_with_progress(text, tasks, completed))),
+            ('format_checklist_message', size,
+             lambda tasks=tasks, completed=completed: (lambda: bot.format_checklist_message(tasks, completed))),
+            ('create_checklist_keyboard', size,
+             lambda tasks=tasks, completed=completed: (lambda: bot.create_checklist_keyboard(tasks, completed))),
+            ('render_checklist[toggle]', size, toggle_render),
+        ]
+    result.append(('get_progress_bar', 1, lambda: (lambda: [bot.get_progress_bar(p) for p in range(0, 101, 10)])))
+    return result
+
+
+def measure_time(func):
+    """Лучшее время одного вызова (мкс) из REPEATS повторов (сборщик мусора выключен, как в timeit)"""
+    gc.disable()
+    try:
+        return _measure_time(func)
+    finally:
+        gc.enable()
+
+
+def _measure_time(func):
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_REPEAT_TIME or loops >= 1_000_000:
+            break
+        loops *= 2
+    best = elapsed
+    for _ in range(REPEATS - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return best / loops * 1e6
+
+
+def measure_memory(func):
+    """Пик выделенной памяти за один вызов (КБ)"""
+    func()  # Прогрев (кэши, ленивые атрибуты)
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - before) / 1024
+
+
+def calibration_workload():
+    """Фиксированная нагрузка того же характера: строки, словари, списки"""
+    parts = []
+    for i in range(200):
+        line = f"• Задача номер {i}"
+        parts.append({'text': line[:35], 'callback_data': f'toggle_day_{i}'})
+    return ''.join(item['text'] for item in parts)
+
+
+def measure_case(func):
+    # Калибровка до и после замера: скорость машины могла измениться за время прогона
+    calibration = measure_time(calibration_workload)
+    elapsed = measure_time(func)
+    calibration = min(calibration, measure_time(calibration_workload))
+    return {
+        'us': round(elapsed, 2),
+        'kb': round(measure_memory(func), 2),
+        'cal_us': round(calibration, 2)
+    }
+
+
+def run_benchmarks():
+    """Замеры всех функций: ({key: метрики}, {key: func} для повторных замеров)"""
+    bot = create_bot()
+    results = {}
+    funcs = {}
+    for name, size, setup in cases(bot):
+        key = f"{name}/{size}"
+        funcs[key] = setup()
+        results[key] = measure_case(funcs[key])
+        print(f"{key:50} {results[key]['us']:>12.2f} мкс {results[key]['kb']:>10.2f} КБ")
+    return results, funcs
+
+
+def compare(results, baseline, threshold):
+    """Регрессии: метрики, выросшие больше чем на threshold относительно базового уровня"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        # Поправка на скорость машины: во сколько раз калибровочная нагрузка стала медленнее
+        speed = current['cal_us'] / base['cal_us'] if base.get('cal_us') else 1.0
+        for metric in ('us', 'kb'):
+            # Крошечные значения шумят - сравниваем от небольшого минимума
+            floor = 1.0 if metric == 'us' else 0.5
+            expected = base[metric] * (speed if metric == 'us' else 1.0)
+            if current[metric] > max(expected, floor) * (1 + threshold):
+                regressions.append((key, metric, base[metric], current[metric], current[metric] / max(expected, floor)))
+    return regressions
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'compare'
+    baseline_path = os.path.abspath(os.getenv('BENCH_BASELINE', 'bench_baseline.json'))
+    threshold = float(os.getenv('BENCH_THRESHOLD', 0.25))
+
+    results, funcs = run_benchmarks()
+
+    if command == 'save':
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"💾 Базовый уровень сохранён: {baseline_path}")
+        return 0
+
+    if command == 'compare' and os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, threshold)
+        for _ in range(2):
+            if not regressions:
+                break
+            # Подозрение на регрессию перепроверяем: берём лучший из замеров (меньше шума)
+            for key in {key for key, *_ in regressions}:
+                again = measure_case(funcs[key])
+                if again['us'] / again['cal_us'] < results[key]['us'] / results[key]['cal_us']:
+                    results[key] = again
+            regressions = compare(results, baseline, threshold)
+        for key, metric, before, after, ratio in regressions:
+            unit = 'мкс' if metric == 'us' else 'КБ'
+            # Процент - с поправкой на скорость машины
+            print(f"❌ {key}: {before} → {after} {unit} (+{(ratio - 1) * 100:.0f}%)")
+        if regressions:
+            print(f"❌ Регрессий: {len(regressions)} (порог +{threshold * 100:.0f}%)")
+            return 1
+        print(f"✅ Регрессий нет (порог +{threshold * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Календарь семейных дат для notifier.py
+Дни рождения, дни памяти, годовщины и традиции по правилам (последняя /
+вторая / третья суббота месяца) раскладываются один раз на весь год в
+словарь дата -> события. Дальше любые вопросы - «что в ближайшие N дней»,
+«когда следующий раз X» - решаются прямым поиском по датам, в том числе
+через границу месяца и года (следующий год строится при первом обращении).
+"""
+
+from bisect import bisect_left
+from calendar import monthcalendar
+from datetime import date, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Правило традиции -> (день недели, номер вхождения в месяце; -1 - последнее)
+RULES = {
+    'last_saturday': (5, -1),
+    'second_saturday': (5, 1),
+    'third_saturday': (5, 2),
+}
+
+
+def birthday_kind(name):
+    if '(день памяти)' in name:
+        return 'memorial'
+    if name.startswith('Годовщина'):
+        return 'anniversary'
+    return 'birthday'
+
+
+def nth_weekday(year, month, weekday, index):
+    """День месяца index-го вхождения дня недели (None - такого нет)"""
+    days = [week[weekday] for week in monthcalendar(year, month) if week[weekday] != 0]
+    try:
+        return days[index]
+    except IndexError:
+        return None
+
+
+class CalendarIndex:
+    """
+    Индекс дата -> события, строится лениво по годам.
+    День рождения 29 февраля в невисокосный год отмечается 28 февраля
+    (раньше такое событие в невисокосные годы не напоминалось вовсе).
+    """
+
+    def __init__(self, birthdays, recurring_events):
+        self.birthdays = birthdays  # {имя: (день, месяц)}
+        self.recurring_events = recurring_events  # {ключ: {'name', 'rule', ...}}
+        self.years = {}  # год -> {дата: [событие, ...]}
+        self.occurrences = {}  # год -> {ключ: [даты по возрастанию]}
+
+    def build_year(self, year):
+        days = {}
+        occurrences = {}
+
+        def add(day, event):
+            days.setdefault(day, []).append(event)
+            occurrences.setdefault(event['key'], []).append(day)
+
+        for name, (day, month) in self.birthdays.items():
+            try:
+                when = date(year, month, day)
+            except ValueError:
+                when = date(year, 2, 28)  # 29 февраля в невисокосный год
+            add(when, {'key': name, 'name': name, 'kind': birthday_kind(name)})
+
+        for key, event in self.recurring_events.items():
+            rule = RULES.get(event.get('rule'))
+            if rule is None:
+                logger.warning(f"⚠️ Неизвестное правило традиции {key}: {event.get('rule')}")
+                continue
+            for month in range(1, 13):
+                day = nth_weekday(year, month, *rule)
+                if day:
+                    add(date(year, month, day), {'key': key, 'name': event['name'], 'kind': 'tradition', 'event': event})
+
+        for dates in occurrences.values():
+            dates.sort()
+        self.years[year] = days
+        self.occurrences[year] = occurrences
+        logger.info(f"📅 Календарь на {year} год: {sum(len(v) for v in days.values())} событий")
+
+    def year(self, year):
+        if year not in self.years:
+            self.build_year(year)
+        return self.years[year]
+
+    def events_on(self, day):
+        """События одного дня"""
+        return self.year(day.year).get(day, [])
+
+    def upcoming(self, start, days):
+        """[(дата, событие), ...] с start по start + days включительно"""
+        result = []
+        for offset in range(days + 1):
+            day = start + timedelta(days=offset)
+            result += [(day, event) for event in self.events_on(day)]
+        return result
+
+    def next_occurrence(self, key, start):
+        """Ближайшая дата события key не раньше start (None - события нет)"""
+        for year in (start.year, start.year + 1):
+            self.year(year)
+            dates = self.occurrences[year].get(key, [])
+            position = bisect_left(dates, start)
+            if position < len(dates):
+                return dates[position]
+        return None
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Данные чатов для tracker_bot.py
+Каждый чат из списка разрешённых (TELEGRAM_CHAT_IDS) - отдельный шард:
+своя статистика, агрегаты, состояния сообщений и блокировки сообщений/дней.
+Шард загружается при первом обращении и выгружается после простоя.
+Файловый ввод-вывод шардов идёт через общий поток хранилища (StorageExecutor).
+
+Первый чат списка использует прежние файлы в корне (stats.json/stats.db,
+message_states.json, stats_aggregates.json, stats_archive.json), остальные -
+chats/<chat_id>/.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+
+from metrics import REGISTRY
+from stats_aggregates import StatsAggregates
+from stats_archive import ArchivedStatsBackend
+from stats_store import create_stats_backend
+from state_store import BoundedMessageStates, MessageStateStore
+from storage_io import StorageExecutor
+
+logger = logging.getLogger(__name__)
+
+STORAGE_SECONDS = REGISTRY.histogram(
+    'tracker_storage_seconds', 'Длительность загрузки/сохранения статистики и состояний сообщений', ('store', 'op')
+)
+
+
+def timed(store, op, func, *args):
+    """Вызов в потоке хранилища с замером длительности (без ожидания в очереди)"""
+    with STORAGE_SECONDS.time(store=store, op=op):
+        return func(*args)
+
+
+def chat_ids_from_env():
+    """Разрешённые чаты: TELEGRAM_CHAT_IDS (через запятую) или TELEGRAM_CHAT_ID"""
+    value = os.getenv('TELEGRAM_CHAT_IDS') or os.getenv('TELEGRAM_CHAT_ID', '')
+    return [chat_id.strip() for chat_id in value.split(',') if chat_id.strip()]
+
+
+def chat_paths(chat_id, primary, data_dir='chats'):
+    """Пути к файлам чата"""
+    if primary:
+        return {
+            'stats_json': 'stats.json',
+            'stats_db': os.getenv('STATS_DB_FILE', 'stats.db'),
+            'aggregates': os.getenv('STATS_AGGREGATES_FILE', 'stats_aggregates.json'),
+            'states': 'message_states.json',
+            'archive': os.getenv('STATS_ARCHIVE_FILE', 'stats_archive.json'),
+            'cold': os.getenv('STATS_COLD_FILE', 'stats_cold.jsonl.gz'),
+        }
+    chat_dir = os.path.join(data_dir, str(chat_id))
+    os.makedirs(chat_dir, exist_ok=True)
+    return {
+        'stats_json': os.path.join(chat_dir, 'stats.json'),
+        'stats_db': os.path.join(chat_dir, 'stats.db'),
+        'aggregates': os.path.join(chat_dir, 'stats_aggregates.json'),
+        'states': os.path.join(chat_dir, 'message_states.json'),
+        'archive': os.path.join(chat_dir, 'stats_archive.json'),
+        'cold': os.path.join(chat_dir, 'stats_cold.jsonl.gz'),
+    }
+
+
+def open_stats_backend(paths):
+    """Горячий бэкенд статистики чата вместе с архивом старых месяцев"""
+    # Пустая база при существующем архиве - всё уже в архиве, stats.json повторно не переносим
+    hot = create_stats_backend(paths['stats_json'], paths['stats_db'], migrate=not os.path.exists(paths['archive']))
+    return ArchivedStatsBackend(hot, paths['archive'], paths['cold'])
+
+
+class KeyedLocks:
+    """asyncio-блокировки по ключу; блокировка удаляется, когда её никто не держит и не ждёт"""
+
+    def __init__(self):
+        self.locks = {}  # key -> [asyncio.Lock, число держащих и ждущих]
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[key]
+
+    def __len__(self):
+        return len(self.locks)
+
+
+class ChatShard:
+    """Статистика, агрегаты и состояния сообщений одного чата"""
+
+    def __init__(self, chat_id, paths, io, max_entries=200, max_age_days=7):
+        # Создаётся в потоке хранилища (открытие базы, пересчёт агрегатов, проигрывание журнала)
+        self.chat_id = chat_id
+        self.io = io  # StorageExecutor
+        self.stats = open_stats_backend(paths)
+        # Накопительные итоги недель/месяцев/лет и серии (пересчёт при первом запуске);
+        # меняются только в потоке хранилища, читаются через read_aggregates()
+        self.aggregates = StatsAggregates(paths['aggregates'], self.stats)
+        self.aggregates.ensure()
+        self.state_store = MessageStateStore(paths['states'], max_entries=max_entries, max_age_days=max_age_days)
+        # {message_id: TrackedMessage(tasks, битовые маски выполненных, original_text)}
+        self.message_state = self.load_message_states()
+        # Переходы состояния одного сообщения - по очереди (разные сообщения параллельно),
+        # чтение-изменение-запись статистики дня - под блокировкой дня
+        self.message_locks = KeyedLocks()
+        self.day_locks = KeyedLocks()
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def busy(self):
+        """Кто-то держит или ждёт блокировку сообщения/дня"""
+        return bool(self.message_locks) or bool(self.day_locks)
+
+    # === Статистика ===
+
+    async def load_day_stats(self, day_key):
+        """Загружает статистику за один день (None если данных нет)"""
+        try:
+            return await self.io.run(timed, 'stats', 'load', self.stats.get_day, day_key)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки статистики чата {self.chat_id}: {e}")
+            return None
+
+    async def save_day_stats(self, day_key, day_data, previous=None):
+        """Сохраняет статистику за один день и обновляет агрегаты (previous - прошлая версия дня)"""
+        return await self.io.run(self._save_day_stats, day_key, day_data, previous)
+
+    def _save_day_stats(self, day_key, day_data, previous):
+        try:
+            timed('stats', 'save', self.stats.put_day, day_key, day_data)
+            logger.info("✅ Статистика сохранена")
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения статистики чата {self.chat_id}: {e}")
+            return False
+        try:
+            timed('aggregates', 'save', self.aggregates.update, day_key, previous, day_data)
+        except Exception as e:
+            # День уже сохранён - агрегаты можно пересчитать командой rebuild-aggregates
+            logger.error(f"❌ Ошибка обновления агрегатов: {e}")
+        return True
+
+    async def archive_stats(self, horizon_days, keep_detail=False):
+        """Переносит месяцы старше горизонта в архив; возвращает число перенесённых дней"""
+        try:
+            return await self.io.run(timed, 'stats', 'archive', self.stats.archive, horizon_days, keep_detail)
+        except Exception as e:
+            logger.error(f"❌ Ошибка архивации статистики чата {self.chat_id}: {e}")
+            return 0
+
+    async def read_aggregates(self, day_key):
+        """Согласованная копия агрегатов для итогов на день day_key (после всех поставленных сохранений)"""
+        return await self.io.run(self.aggregates.snapshot, day_key)
+
+    # === Состояния сообщений ===
+
+    def load_message_states(self):
+        """Загружает снимок состояний сообщений и проигрывает журнал изменений"""
+        try:
+            states = timed('states', 'load', self.state_store.load)
+            if self.state_store.pending:
+                # Сразу уплотняем, чтобы журнал не рос между перезапусками
+                self.state_store.compact(states)
+            return states
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки состояний сообщений: {e}")
+            # Пустое хранилище того же типа: вытеснение и метрики ждут BoundedMessageStates
+            return BoundedMessageStates(self.state_store.max_entries, self.state_store.max_age_days)
+
+    async def journal_message_state(self, *records):
+        """Дописывает изменения состояния в журнал (одна запись и fsync на вызов)"""
+        try:
+            await self.io.run(timed, 'states', 'journal', self.state_store.append_many, records)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи журнала состояний: {e}")
+            return False
+
+    async def save_message_states(self):
+        """Уплотняет журнал: пишет полный снимок состояний сообщений"""
+        # Снимок снимается здесь, сериализация и запись - в потоке хранилища
+        snapshot = self.state_store.snapshot(self.message_state)
+        try:
+            await self.io.run(timed, 'states', 'save', self.state_store.compact_snapshot, snapshot)
+            logger.info(f"✅ Состояния сообщений чата {self.chat_id} сохранены")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения состояний сообщений: {e}")
+            return False
+
+    async def evict_message_states(self):
+        """Вытесняет устаревшие и лишние состояния сообщений (с записью в журнал)"""
+        evicted = self.state_store.expire(self.message_state)
+        if evicted:
+            await self.journal_message_state(*({'op': 'evict', 'id': message_id} for message_id in evicted))
+            logger.info(f"🧹 Вытеснено состояний сообщений: {len(evicted)}")
+        return evicted
+
+    async def maintain(self):
+        """Периодическое обслуживание: вытеснение и уплотнение журнала"""
+        await self.evict_message_states()
+        if self.state_store.pending:
+            await self.save_message_states()
+
+    def close(self):
+        """Закрытие (в потоке хранилища, после всех записей шарда)"""
+        if self.state_store.pending:
+            self.state_store.compact(self.message_state)
+            logger.info(f"✅ Состояния сообщений чата {self.chat_id} сохранены")
+        self.state_store.close()
+        self.stats.close()
+
+
+class ChatRegistry:
+    """Шарды разрешённых чатов: ленивая загрузка и выгрузка после простоя"""
+
+    def __init__(self, chat_ids, data_dir='chats', idle_timeout=1800, max_entries=200, max_age_days=7, io=None):
+        self.chat_ids = [str(chat_id) for chat_id in chat_ids]
+        self.allowed = set(self.chat_ids)
+        self.data_dir = data_dir
+        self.idle_timeout = idle_timeout
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.io = io or StorageExecutor()
+        self.shards = {}  # chat_id -> ChatShard (только загруженные)
+        self.loading = {}  # chat_id -> задача загрузки (параллельные get() ждут одну)
+        self.stats = {'loads': 0, 'unloads': 0}
+
+    @property
+    def primary(self):
+        return self.chat_ids[0]
+
+    def is_allowed(self, chat_id):
+        return str(chat_id) in self.allowed
+
+    async def get(self, chat_id):
+        """Шард чата (загружается при первом обращении)"""
+        chat_id = str(chat_id)
+        shard = self.shards.get(chat_id)
+        if shard is None:
+            if chat_id not in self.allowed:
+                raise KeyError(f"Чат {chat_id} не разрешён")
+            task = self.loading.get(chat_id)
+            if task is None:
+                task = self.loading[chat_id] = asyncio.ensure_future(self.io.run(self.load, chat_id))
+                task.add_done_callback(lambda _: self.loading.pop(chat_id, None))
+            shard = await asyncio.shield(task)
+            if chat_id not in self.shards:
+                self.shards[chat_id] = shard
+                self.stats['loads'] += 1
+                logger.info(f"📂 Загружен чат {chat_id} (состояний: {len(shard.message_state)})")
+        shard.touch()
+        return shard
+
+    def load(self, chat_id):
+        paths = chat_paths(chat_id, chat_id == self.primary, self.data_dir)
+        return ChatShard(chat_id, paths, self.io, self.max_entries, self.max_age_days)
+
+    def loaded(self):
+        return list(self.shards.values())
+
+    async def maintain(self, busy=None):
+        """Обслуживает загруженные шарды и выгружает простаивающие (busy(chat_id) - не выгружать)"""
+        for shard in self.loaded():
+            await shard.maintain()
+            idle = time.monotonic() - shard.last_active
+            if idle > self.idle_timeout and not shard.busy() and not (busy and busy(shard.chat_id)):
+                await self.unload(shard.chat_id)
+
+    async def unload(self, chat_id):
+        shard = self.shards.pop(chat_id, None)
+        if shard:
+            await self.io.run(shard.close)
+            self.stats['unloads'] += 1
+            logger.info(f"📤 Чат {chat_id} выгружен после простоя")
+
+    async def close_all(self):
+        for chat_id in list(self.shards):
+            shard = self.shards.pop(chat_id)
+            await self.io.run(shard.close)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Разбор сообщений с задачами для tracker_bot.py
+Грамматика секций описана декларативно (SECTION_GRAMMAR): маркеры ищутся
+один раз по всему тексту, строки без маркеров проверяются только на пункт
+списка, найденные маркеры определяют начало/конец секции.
+Результат разбора кэшируется по хэшу текста сообщения.
+"""
+
+from collections import OrderedDict
+import hashlib
+import re
+
+# Грамматика секций сообщения notifier.py
+# start: секция начинается, если в строке есть ВСЕ маркеры хотя бы одного правила
+# end: любой из маркеров завершает секцию
+# anchor: строка, перед которой вставляется общий прогресс (без учёта регистра);
+#         секцию не завершает - это делает только точный маркер из end
+SECTION_GRAMMAR = {
+    'start': [
+        ('day', [('📋', 'Дневн'), ('☀️', 'Дневн')]),
+        ('cant_do', [('⛔',), ('Нельзя делать',)]),
+        ('evening', [('🌙', 'Вечерн'), ('📋', 'Вечерн'), ('Вечерние задачи',)]),
+    ],
+    'end': ['Мудрость дня', '🙏 Утренняя молитва', '🎉 СЕГОДНЯ', '📅 События', 'Занятия детей'],
+    'anchor': ('мудрость', 'дня'),
+    'bullet': '•',
+    'progress': ('📊', '🎯 Общий прогресс'),
+    'tags': ('<b>', '</b>', '<i>', '</i>'),
+}
+
+SECTIONS = ('morning', 'day', 'cant_do', 'evening')
+
+# Виды токенов
+TEXT = 'text'
+SECTION = 'section'
+END = 'end'
+ANCHOR = 'anchor'
+TASK = 'task'
+PROGRESS = 'progress'
+
+
+class ParsedMessage:
+    """Результат разбора: токены строк и задачи по секциям"""
+
+    __slots__ = ('tokens', 'tasks')
+
+    def __init__(self, tokens, tasks):
+        self.tokens = tokens  # кортеж (kind, section, line, task_text)
+        self.tasks = tasks  # {section: кортеж задач}
+
+    def task_dict(self):
+        return {section: list(self.tasks[section]) for section in SECTIONS}
+
+
+class SectionParser:
+    """Токенизатор секций (маркеры ищутся за один проход по тексту) с ограниченным кэшем разбора"""
+
+    def __init__(self, grammar=SECTION_GRAMMAR, cache_size=64):
+        self.grammar = grammar
+        self.bullet = grammar['bullet']
+        self.progress = tuple(grammar['progress'])
+        self.tag_re = re.compile('|'.join(re.escape(tag) for tag in grammar['tags']))
+
+        # Маркеры: (литерал, без учёта регистра?)
+        markers = set()
+        for _, rules in grammar['start']:
+            for rule in rules:
+                markers.update((m, False) for m in rule)
+        markers.update((m, False) for m in grammar['end'])
+        self.markers = sorted(markers)
+        # Якорь: все слова в одной строке без учёта регистра; ищем по самому длинному
+        self.anchor_words = sorted({m.lower() for m in grammar['anchor']}, key=len, reverse=True)
+
+        self.start_rules = [
+            (section, [frozenset((m, False) for m in rule) for rule in rules])
+            for section, rules in grammar['start']
+        ]
+        self.end_markers = frozenset((m, False) for m in grammar['end'])
+        self.anchor_markers = frozenset((m.lower(), True) for m in grammar['anchor'])
+
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def classify(self, found):
+        """Начало секции / конец секции / якорь прогресса по найденным маркерам"""
+        for section, rules in self.start_rules:
+            if any(rule <= found for rule in rules):
+                return SECTION, section
+        if self.anchor_markers <= found:
+            return ANCHOR, None
+        if found & self.end_markers:
+            return END, None
+        return None, None
+
+    def markers_by_line(self, text):
+        """
+        {номер строки: маркеры} только для строк, где маркеры есть.
+        Теги снимаются один раз для всего текста, каждый маркер ищется
+        str.find по всему тексту; слова якоря проверяются только в строках,
+        где нашлось самое длинное из них. Теги и маркеры не содержат
+        перевода строки, поэтому номера строк совпадают с исходным текстом.
+        """
+        clean = self.tag_re.sub('', text) if '<' in text else text
+        result = {}
+        for marker in self.markers:
+            literal = marker[0]
+            position = clean.find(literal)
+            line_no = 0
+            line_start = 0
+            while position != -1:
+                line_no += clean.count('\n', line_start, position)
+                line_start = position
+                found = result.get(line_no)
+                if found is None:
+                    found = result[line_no] = set()
+                found.add(marker)
+                position = clean.find(literal, position + len(literal))
+
+        if self.anchor_words:
+            folded = clean.lower()  # Длина строк и переводы строк сохраняются
+            first, rest = self.anchor_words[0], self.anchor_words[1:]
+            position = folded.find(first)
+            while position != -1:
+                line_start = folded.rfind('\n', 0, position) + 1
+                line_end = folded.find('\n', position)
+                line = folded[line_start:line_end if line_end != -1 else len(folded)]
+                if all(word in line for word in rest):
+                    line_no = folded.count('\n', 0, line_start)
+                    result.setdefault(line_no, set()).update(self.anchor_markers)
+                if line_end == -1:
+                    break
+                position = folded.find(first, line_end)
+        return result
+
+    def tokenize(self, text):
+        tokens = []
+        append = tokens.append
+        tasks = {section: [] for section in SECTIONS}
+        current_section = None
+        progress = self.progress
+        bullet = self.bullet
+        # Большинство строк (задачи, пустые) маркеров не содержат - для них только проверка пункта
+        markers = self.markers_by_line(text)
+
+        for line_no, line in enumerate(text.split('\n')):
+            stripped = line.strip()
+
+            if stripped.startswith(progress):
+                append((PROGRESS, None, line, None))
+                continue
+
+            if line_no in markers:
+                found = markers[line_no]
+                kind, section = self.classify(found)
+                if kind == SECTION:
+                    current_section = section
+                    append((SECTION, section, line, None))
+                    continue
+                if kind == ANCHOR and not found & self.end_markers:
+                    # Якорь без точного маркера конца ("МУДРОСТЬ ДНЯ") секцию не закрывает
+                    task_text = stripped[1:].strip() if current_section and stripped.startswith(bullet) else ''
+                    if task_text:
+                        tasks[current_section].append(task_text)
+                        append((ANCHOR, current_section, line, task_text))
+                    else:
+                        append((ANCHOR, None, line, None))
+                    continue
+                if kind is not None:
+                    current_section = None
+                    append((kind, None, line, None))
+                    continue
+
+            if current_section and stripped.startswith(bullet):
+                task_text = stripped[1:].strip()
+                if task_text:
+                    tasks[current_section].append(task_text)
+                    append((TASK, current_section, line, task_text))
+                    continue
+            append((TEXT, None, line, None))
+
+        return ParsedMessage(tuple(tokens), {section: tuple(items) for section, items in tasks.items()})
+
+    def parse(self, text):
+        """Разбирает сообщение; повторный разбор того же текста берётся из кэша"""
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        parsed = self.cache.get(key)
+        if parsed is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return parsed
+
+        self.misses += 1
+        parsed = self.tokenize(text)
+        self.cache[key] = parsed
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return parsed
+
+
+# Вид секций чек-листа: (секция, заголовок текста, заголовок клавиатуры, префикс задачи, длина кнопки)
+CHECKLIST_VIEW = (
+    ('day', '\n☀️ <b>ДНЕВНЫЕ:</b>\n', '☀️ ДНЕВНЫЕ ЗАДАЧИ', '', 35),
+    ('cant_do', '\n⛔ <b>НЕЛЬЗЯ ДЕЛАТЬ:</b>\n', '⛔ НЕЛЬЗЯ ДЕЛАТЬ', 'НЕ ', 32),
+    ('evening', '\n🌙 <b>ВЕЧЕРНИЕ:</b>\n', '🌙 ВЕЧЕРНИЕ ЗАДАЧИ', '', 35),
+)
+
+CHECKLIST_CONTROLS = [
+    {'text': '💾 Сохранить', 'callback_data': 'save_progress'},
+    {'text': '❌ Отмена', 'callback_data': 'cancel_update'}
+]
+
+
+class ChecklistRenderer:
+    """
+    Текст и клавиатура чек-листа одного сообщения.
+    Фрагменты задач (строка текста и кнопка) собираются один раз;
+    переключение задачи пересобирает только её фрагменты и счётчики прогресса.
+    """
+
+    __slots__ = ('progress_bar', 'tasks', 'parts', 'rows', 'sections', 'done', 'total_tasks', 'total_done')
+
+    def __init__(self, tasks, completed, progress_bar):
+        self.progress_bar = progress_bar  # get_progress_bar(percentage)
+        self.tasks = tasks  # Не изменяются, пока рендерер жив
+        self.parts = ["✅ <b>Отметь выполненные задачи:</b>\n"]
+        self.rows = []
+        # section -> (позиция первой задачи в parts, в rows, префикс, длина кнопки)
+        self.sections = {}
+        self.done = {}  # section -> множество выполненных индексов
+        self.total_tasks = 0
+        self.total_done = 0
+        parts = self.parts
+        rows = self.rows
+
+        for section, text_header, button_header, prefix, limit in CHECKLIST_VIEW:
+            section_tasks = tasks[section]
+            if not section_tasks:
+                continue
+            section_done = set(completed.get(section, ()))
+            parts.append(text_header)
+            rows.append([{'text': button_header, 'callback_data': 'header'}])
+            self.sections[section] = (len(parts), len(rows), prefix, limit)
+
+            for idx, task in enumerate(section_tasks):
+                mark = '⭐' if idx in section_done else '☆'
+                short_task = task[:limit] + '...' if len(task) > limit else task
+                parts.append(f"{mark} {prefix}{task}\n")
+                rows.append([{'text': f'{mark} {idx+1}. {prefix}{short_task}', 'callback_data': f'toggle_{section}_{idx}'}])
+
+            if section_done and (min(section_done) < 0 or max(section_done) >= len(section_tasks)):
+                # Индексы вне списка задач (старые состояния) не считаем
+                section_done = {idx for idx in section_done if 0 <= idx < len(section_tasks)}
+            self.done[section] = section_done
+            self.total_tasks += len(section_tasks)
+            self.total_done += len(section_done)
+
+        rows.append(CHECKLIST_CONTROLS)
+
+    def set_done(self, section, idx, done):
+        """Меняет фрагменты одной задачи (индексы вне списка задач игнорируются)"""
+        position = self.sections.get(section)
+        if position is None or not 0 <= idx < len(self.tasks[section]):
+            return
+        section_done = self.done[section]
+        if (idx in section_done) == done:
+            return
+        part_start, row_start, prefix, limit = position
+        task = self.tasks[section][idx]
+        mark = '⭐' if done else '☆'
+        short_task = task[:limit] + '...' if len(task) > limit else task
+        self.parts[part_start + idx] = f"{mark} {prefix}{task}\n"
+        self.rows[row_start + idx] = [{'text': f'{mark} {idx+1}. {prefix}{short_task}', 'callback_data': f'toggle_{section}_{idx}'}]
+        if done:
+            section_done.add(idx)
+            self.total_done += 1
+        else:
+            section_done.discard(idx)
+            self.total_done -= 1
+
+    def text(self):
+        percentage = int((self.total_done / self.total_tasks * 100)) if self.total_tasks > 0 else 0
+        bar = self.progress_bar(percentage)
+        return ''.join(self.parts) + f"\n📊 <b>Прогресс:</b> {bar} {self.total_done}/{self.total_tasks} ({percentage}%)\n"
+
+    def keyboard(self):
+        """Клавиатура (строки общие с рендерером - не изменять)"""
+        return {'inline_keyboard': list(self.rows)}
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Дисковый кэш HTTP-ответов для notifier.py
+Каждый ответ источника (погода, ЦБ, CoinGecko, файлы событий) хранится
+отдельным JSON-файлом в HTTP_CACHE_DIR вместе с ETag/Last-Modified и
+временем загрузки. Пока запись моложе TTL источника, сеть не нужна;
+после - запрос уходит с If-None-Match/If-Modified-Since, и 304 лишь
+продлевает запись. Если источник недоступен или ответил ошибкой, отдаётся
+устаревшая запись (не старше max_stale источника).
+
+Каталог кэша в GitHub Actions сохраняется между запусками через
+actions/cache, поэтому и «холодный» запуск начинает с тёплого кэша.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+from atomic_file import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Источник -> (TTL, максимальный возраст устаревшей записи), секунды; None - без ограничения
+DEFAULT_POLICIES = {
+    'weather': (30 * 60, 6 * 3600),
+    'cbr': (6 * 3600, 3 * 86400),       # Курс ЦБ меняется раз в день
+    'coingecko': (5 * 60, 86400),
+    'events': (86400, None),            # Файлы событий почти не меняются
+}
+
+
+class HttpCache:
+    """Кэш ответов на GET-запросы с TTL по источникам и условной перепроверкой"""
+
+    def __init__(self, directory='.cache/http', policies=None):
+        self.directory = directory
+        self.policies = dict(DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.stats = {'fresh': 0, 'revalidated': 0, 'downloaded': 0, 'stale': 0, 'miss': 0}
+
+    @classmethod
+    def from_env(cls):
+        """HTTP_CACHE_DIR и HTTP_CACHE_TTL_<ИСТОЧНИК> (например HTTP_CACHE_TTL_WEATHER=600)"""
+        policies = {}
+        for provider, (ttl, max_stale) in DEFAULT_POLICIES.items():
+            ttl = int(os.getenv(f'HTTP_CACHE_TTL_{provider.upper()}', ttl))
+            policies[provider] = (ttl, max_stale)
+        return cls(os.getenv('HTTP_CACHE_DIR', '.cache/http'), policies)
+
+    def path(self, provider, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"{provider}-{digest}.json")
+
+    def load(self, provider, url):
+        path = self.path(provider, url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            return entry if entry.get('url') == url else None
+        except Exception as e:
+            logger.warning(f"⚠️ Повреждённая запись кэша {path}: {e}")
+            return None
+
+    def store(self, provider, url, entry):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write_json(self.path(provider, url), entry)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи кэша {provider}: {e}")
+
+    def stale(self, provider, url):
+        """Тело последнего ответа без обращения к сети (None - нет записи или она слишком старая)"""
+        entry = self.load(provider, url)
+        if entry is None:
+            return None
+        max_stale = self.policies.get(provider, (0, None))[1]
+        age = time.time() - entry['fetched_at']
+        if max_stale is not None and age > max_stale:
+            logger.warning(f"⚠️ Запись кэша {provider} слишком старая ({age / 3600:.1f} ч), не используем")
+            return None
+        self.stats['stale'] += 1
+        logger.warning(f"⚠️ {provider}: отдаём устаревший ответ из кэша ({age / 60:.0f} мин)")
+        return entry['body']
+
+    async def get_text(self, session, provider, url):
+        """
+        Текст ответа на GET url: из кэша, после перепроверки или из сети.
+        Ошибка сети или HTTP - устаревшая запись, если есть, иначе None.
+        """
+        entry = self.load(provider, url)
+        ttl = self.policies.get(provider, (0, None))[0]
+        if entry is not None and time.time() - entry['fetched_at'] < ttl:
+            self.stats['fresh'] += 1
+            logger.info(f"💾 {provider}: ответ из кэша")
+            return entry['body']
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and entry is not None:
+                    entry['fetched_at'] = time.time()
+                    self.store(provider, url, entry)
+                    self.stats['revalidated'] += 1
+                    logger.info(f"💾 {provider}: не изменился (304)")
+                    return entry['body']
+                if response.status == 200:
+                    body = await response.text()
+                    self.store(provider, url, {
+                        'url': url,
+                        'body': body,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'fetched_at': time.time()
+                    })
+                    self.stats['downloaded'] += 1
+                    return body
+                logger.warning(f"⚠️ {provider} вернул статус {response.status}")
+        except Exception as e:
+            logger.error(f"❌ {provider} недоступен: {e}")
+
+        body = self.stale(provider, url)
+        if body is None:
+            self.stats['miss'] += 1
+        return body
+
+    def get_stats(self):
+        return dict(self.stats)
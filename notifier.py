@@ -2,17 +2,40 @@
 import asyncio
 import aiohttp
 import json
-from datetime import datetime
-from calendar import monthcalendar
+from datetime import datetime, time as dtime, timedelta, timezone
 import logging
 import random
 import sys
 import os
+import time
+from functools import partial
+
+from atomic_file import atomic_write_json
+from calendar_index import CalendarIndex
+from http_cache import HttpCache
+from scheduler import DailyAt, JobScheduler
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+MSK = timezone(timedelta(hours=3), 'MSK')
+
+# Время отправки (МСК) как в .github/workflows/personal-schedule.yml: режим -> (час, минута, дни недели)
+SCHEDULE = {
+    'morning': (7, 30, None),
+    'gratitude': (20, 0, None),
+    'games': (19, 0, [4]),              # Пятница
+    'cleaning': (10, 0, [6]),           # Воскресенье
+    'cleaning_tomorrow': (18, 0, [5]),  # Суббота
+    'this_day': (17, 0, None),
+}
+
 class FamilyScheduleBot:
+    WEATHER_URL = "https://api.open-meteo.com/v1/forecast?latitude=59.9311&longitude=30.3609&current_weather=true&temperature_unit=celsius&timezone=Europe/Moscow"
+    CBR_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
+    BTC_URL = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd&include_24hr_change=true"
+    EVENTS_URL = "https://raw.githubusercontent.com/BRKME/Day/main/{filename}"
+    
     DAY_NAMES_MAP = {
         'monday': 'понедельник',
         'tuesday': 'вторник', 
@@ -32,6 +55,17 @@ class FamilyScheduleBot:
         if not self.chat_id:
             raise ValueError("❌ TELEGRAM_CHAT_ID не найден в переменных окружения!")
         
+        # Бюджет на все внешние загрузки утреннего сообщения (секунды): что не успело - пропускаем
+        self.fetch_budget = float(os.getenv('MORNING_FETCH_BUDGET', 8))
+        self.session = None  # Общая HTTP-сессия (создаётся лениво внутри цикла событий)
+        self.cache = HttpCache.from_env()  # Дисковый кэш ответов внешних источников
+        
+        # Подготовленное заранее утреннее сообщение (рядом с кэшем - переживает запуски в Actions)
+        self.prepared_file = os.getenv('MORNING_PREPARED_FILE', os.path.join(self.cache.directory, 'morning_prepared.json'))
+        self.prepare_lead = int(os.getenv('MORNING_PREPARE_LEAD', 30))  # минут до отправки
+        # При отправке подготовленного сообщения на обновление данных - не больше этого (секунды)
+        self.refresh_budget = float(os.getenv('MORNING_REFRESH_BUDGET', 0.8))
+        
         self.ss_url = "https://brkme.github.io/My_Day_Shedule/ss.html"
         self.new_url = "https://brkme.github.io/My_Day_Shedule/new.html"
         # АРХИВ: self.chronos_url = "https://brkme.github.io/My_Day_Shedule/chronos.html"
@@ -202,6 +236,9 @@ class FamilyScheduleBot:
             'Дима Ельцов': (25, 12),
         }
         
+        # Все даты года (дни рождения и традиции) - строится один раз на год
+        self.calendar = CalendarIndex(self.birthdays, self.recurring_events)
+        
         self.kids_schedule = {
             'понедельник': [
                 {'child': '👧 Марта', 'activity': '🇬🇧 Английский', 'time': '16:00-17:00'},
@@ -260,138 +297,165 @@ class FamilyScheduleBot:
         day_of_week = now.strftime("%A").lower()
         return date_str, day_of_week
 
-    async def get_weather_forecast(self):
+    async def get_session(self):
+        """Общая HTTP-сессия: одно подключение на хост вместо новой сессии на каждый запрос"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        return self.session
+
+    async def http_get(self, provider, url, stale=False):
+        """Текст ответа источника через дисковый кэш; stale=True - только из кэша, без сети"""
+        if stale:
+            return self.cache.stale(provider, url)
+        return await self.cache.get_text(await self.get_session(), provider, url)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def get_weather_forecast(self, stale=False):
         try:
-            url = "https://api.open-meteo.com/v1/forecast?latitude=59.9311&longitude=30.3609&current_weather=true&temperature_unit=celsius&timezone=Europe/Moscow"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        current = data.get('current_weather', {})
-                        
-                        temp = current.get('temperature', 'N/A')
-                        windspeed = current.get('windspeed', 'N/A')
-                        
-                        weather_codes = {
-                            0: 'Ясно', 1: 'Малооблачно', 2: 'Переменная облачность', 3: 'Облачно',
-                            45: 'Туман', 48: 'Изморозь',
-                            51: 'Морось', 53: 'Морось', 55: 'Сильная морось',
-                            61: 'Слабый дождь', 63: 'Дождь', 65: 'Сильный дождь',
-                            71: 'Слабый снег', 73: 'Снег', 75: 'Сильный снег',
-                            95: 'Гроза'
-                        }
-                        
-                        weather_code = current.get('weathercode', 0)
-                        condition = weather_codes.get(weather_code, 'Неизвестно')
-                        
-                        logger.info(f"✅ Погода получена: {temp}°C, {condition}")
-                        
-                        return (
-                            f"🌤️ <b>Погода в Санкт-Петербурге:</b>\n"
-                            f"🌡️ {temp}°C • {condition}\n"
-                            f"💨 Ветер: {windspeed} км/ч\n"
-                        )
-                    else:
-                        logger.warning(f"⚠️ Open-Meteo вернул статус {response.status}")
-                        return ""
-            
+            text = await self.http_get('weather', self.WEATHER_URL, stale)
+            if text:
+                data = json.loads(text)
+                current = data.get('current_weather', {})
+                
+                temp = current.get('temperature', 'N/A')
+                windspeed = current.get('windspeed', 'N/A')
+                
+                weather_codes = {
+                    0: 'Ясно', 1: 'Малооблачно', 2: 'Переменная облачность', 3: 'Облачно',
+                    45: 'Туман', 48: 'Изморозь',
+                    51: 'Морось', 53: 'Морось', 55: 'Сильная морось',
+                    61: 'Слабый дождь', 63: 'Дождь', 65: 'Сильный дождь',
+                    71: 'Слабый снег', 73: 'Снег', 75: 'Сильный снег',
+                    95: 'Гроза'
+                }
+                
+                weather_code = current.get('weathercode', 0)
+                condition = weather_codes.get(weather_code, 'Неизвестно')
+                
+                logger.info(f"✅ Погода получена: {temp}°C, {condition}")
+                
+                return (
+                    f"🌤️ <b>Погода в Санкт-Петербурге:</b>\n"
+                    f"🌡️ {temp}°C • {condition}\n"
+                    f"💨 Ветер: {windspeed} км/ч\n"
+                )
+            return ""
+
         except Exception as e:
             logger.error(f"❌ Ошибка погоды: {e}")
             return ""
 
-    async def get_currency_rates(self):
-        """Получаем курс USD/RUB и BTC/USD с направлением"""
-        result = ""
-        
+    async def get_usd_rate(self, stale=False):
+        """USD/RUB от ЦБ (строка блока курсов или пустая строка)"""
         try:
-            async with aiohttp.ClientSession() as session:
-                # USD/RUB from CBR API
-                try:
-                    cbr_url = "https://www.cbr-xml-daily.ru/daily_json.js"
-                    async with session.get(cbr_url, timeout=10) as response:
-                        if response.status == 200:
-                            text = await response.text()
-                            data = json.loads(text)
-                            usd = data.get('Valute', {}).get('USD', {})
-                            usd_rate = usd.get('Value', 0)
-                            usd_prev = usd.get('Previous', usd_rate)
-                            if usd_rate:
-                                usd_diff = usd_rate - usd_prev
-                                usd_arrow = "↑" if usd_diff > 0 else "↓" if usd_diff < 0 else "→"
-                                result += f"💵 USD: {usd_rate:.2f}₽ {usd_arrow}\n"
-                                logger.info(f"✅ USD: {usd_rate:.2f} {usd_arrow}")
-                        else:
-                            logger.warning(f"CBR API status: {response.status}")
-                except Exception as e:
-                    logger.error(f"❌ USD error: {e}")
-                
-                # BTC/USD from CoinGecko with 24h change
-                try:
-                    btc_url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd&include_24hr_change=true"
-                    async with session.get(btc_url, timeout=10) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            btc = data.get('bitcoin', {})
-                            btc_price = btc.get('usd', 0)
-                            btc_change = btc.get('usd_24h_change', 0)
-                            if btc_price:
-                                btc_arrow = "↑" if btc_change > 0 else "↓" if btc_change < 0 else "→"
-                                btc_formatted = f"{btc_price:,.0f}".replace(",", " ")
-                                result += f"₿ BTC: ${btc_formatted} {btc_arrow}{abs(btc_change):.1f}%\n"
-                                logger.info(f"✅ BTC: ${btc_formatted} {btc_arrow}{abs(btc_change):.1f}%")
-                        else:
-                            logger.warning(f"CoinGecko API status: {response.status}")
-                except Exception as e:
-                    logger.error(f"❌ BTC error: {e}")
-                            
+            text = await self.http_get('cbr', self.CBR_URL, stale)
+            if text:
+                data = json.loads(text)
+                usd = data.get('Valute', {}).get('USD', {})
+                usd_rate = usd.get('Value', 0)
+                usd_prev = usd.get('Previous', usd_rate)
+                if usd_rate:
+                    usd_diff = usd_rate - usd_prev
+                    usd_arrow = "↑" if usd_diff > 0 else "↓" if usd_diff < 0 else "→"
+                    logger.info(f"✅ USD: {usd_rate:.2f} {usd_arrow}")
+                    return f"💵 USD: {usd_rate:.2f}₽ {usd_arrow}\n"
         except Exception as e:
-            logger.error(f"❌ Ошибка курсов: {e}")
-        
+            logger.error(f"❌ USD error: {e}")
+        return ""
+
+    async def get_btc_rate(self, stale=False):
+        """BTC/USD от CoinGecko с изменением за 24 часа (строка блока курсов или пустая строка)"""
+        try:
+            text = await self.http_get('coingecko', self.BTC_URL, stale)
+            if text:
+                data = json.loads(text)
+                btc = data.get('bitcoin', {})
+                btc_price = btc.get('usd', 0)
+                btc_change = btc.get('usd_24h_change', 0)
+                if btc_price:
+                    btc_arrow = "↑" if btc_change > 0 else "↓" if btc_change < 0 else "→"
+                    btc_formatted = f"{btc_price:,.0f}".replace(",", " ")
+                    logger.info(f"✅ BTC: ${btc_formatted} {btc_arrow}{abs(btc_change):.1f}%")
+                    return f"₿ BTC: ${btc_formatted} {btc_arrow}{abs(btc_change):.1f}%\n"
+        except Exception as e:
+            logger.error(f"❌ BTC error: {e}")
+        return ""
+
+    def format_currency_block(self, usd, btc):
+        result = (usd or "") + (btc or "")
         if result:
             result = "\n" + result  # Add newline before currency block
-        
         return result
 
-    def get_last_day_of_month(self, year, month, target_weekday):
-        calendar = monthcalendar(year, month)
-        for week in reversed(calendar):
-            day = week[target_weekday]
-            if day != 0:
-                return day
-        return None
-
-    def get_event_date_by_rule(self, rule, year, month):
-        if rule == 'last_saturday':
-            day = self.get_last_day_of_month(year, month, 5)
-            return (year, month, day) if day else None
-        elif rule == 'third_saturday':
-            calendar = monthcalendar(year, month)
-            saturdays = [week[5] for week in calendar if week[5] != 0]
-            if len(saturdays) >= 3:
-                return (year, month, saturdays[2])
-        elif rule == 'second_saturday':
-            calendar = monthcalendar(year, month)
-            saturdays = [week[5] for week in calendar if week[5] != 0]
-            if len(saturdays) >= 2:
-                return (year, month, saturdays[1])
-        return None
+    async def get_currency_rates(self):
+        """Получаем курс USD/RUB и BTC/USD с направлением"""
+        usd, btc = await asyncio.gather(self.get_usd_rate(), self.get_btc_rate())
+        return self.format_currency_block(usd, btc)
+
+    async def fetch_all(self, fetchers, budget):
+        """
+        Запускает все загрузки одновременно и ждёт их не дольше budget секунд.
+        fetchers: {имя: функция(stale=False) -> корутина}. Не успевшие в бюджет
+        берутся из кэша как есть (stale=True), если там ничего нет - None.
+        Время каждого источника пишется в лог одной строкой.
+        """
+        started = time.perf_counter()
+        # Задача, отменённая до первого шага, не успевает записать своё время
+        timings = {name: {'ms': round(budget * 1000), 'status': 'timeout'} for name in fetchers}
+
+        async def timed(name, coro):
+            begin = time.perf_counter()
+            try:
+                result = await coro
+                timings[name] = {'ms': round((time.perf_counter() - begin) * 1000), 'status': 'ok' if result else 'empty'}
+                return result
+            except asyncio.CancelledError:
+                timings[name] = {'ms': round((time.perf_counter() - begin) * 1000), 'status': 'timeout'}
+                raise
+            except Exception as e:
+                timings[name] = {'ms': round((time.perf_counter() - begin) * 1000), 'status': 'error'}
+                logger.error(f"❌ Ошибка загрузки {name}: {e}")
+                return None
+
+        tasks = {name: asyncio.create_task(timed(name, fetch())) for name, fetch in fetchers.items()}
+        results = {}
+        if tasks:
+            done, pending = await asyncio.wait(tasks.values(), timeout=budget)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for name, task in tasks.items():
+                if task in done:
+                    results[name] = task.result()
+                    continue
+                results[name] = await fetchers[name](stale=True)
+                if results[name]:
+                    timings[name]['status'] = 'stale'
+            if pending:
+                logger.warning(f"⚠️ Не уложились в бюджет {budget}с: {', '.join(n for n, t in tasks.items() if t in pending)}")
+
+        logger.info("⏱️ fetch " + json.dumps({
+            'budget_s': budget,
+            'total_ms': round((time.perf_counter() - started) * 1000),
+            'providers': timings,
+            'cache': self.cache.get_stats()
+        }, ensure_ascii=False, sort_keys=True))
+        return results
 
     def check_recurring_events(self):
-        from datetime import date as dt
-        today = datetime.now()
-        year, month, day = today.year, today.month, today.day
+        today = datetime.now().date()
         reminders = []
         
         for event_key, event in self.recurring_events.items():
-            event_date = self.get_event_date_by_rule(event['rule'], year, month)
-            if not event_date:
+            # Ближайшая дата по индексу - в том числе в следующем месяце/году
+            event_dt = self.calendar.next_occurrence(event_key, today)
+            if not event_dt:
                 continue
-                
-            event_year, event_month, event_day = event_date
-            event_dt = dt(event_year, event_month, event_day)
-            today_dt = dt(year, month, day)
-            days_until = (event_dt - today_dt).days
+            days_until = (event_dt - today).days
             
             if days_until == 7:
                 reminders.append({'key': event_key, 'event': event, 'type': 'week_before'})
@@ -402,31 +466,19 @@ class FamilyScheduleBot:
         
         return reminders
 
-    def check_upcoming_birthdays(self):
-        from datetime import timedelta
-        today = datetime.now()
-        tomorrow = today + timedelta(days=1)
-        
-        upcoming_birthdays = []
-        
-        for name, (day, month) in self.birthdays.items():
-            if tomorrow.day == day and tomorrow.month == month:
-                upcoming_birthdays.append(name)
-        
-        return upcoming_birthdays
+    def check_upcoming_birthdays(self, days_ahead=1):
+        """Дни рождения, памяти и годовщины ровно через days_ahead дней"""
+        day = datetime.now().date() + timedelta(days=days_ahead)
+        return [event['name'] for event in self.calendar.events_on(day) if event['kind'] != 'tradition']
 
-    async def fetch_event_file(self, filename):
+    async def fetch_event_file(self, filename, stale=False):
         try:
-            url = f"https://raw.githubusercontent.com/BRKME/Day/main/{filename}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=10) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        logger.info(f"✅ Файл {filename} загружен")
-                        return content
-                    else:
-                        logger.error(f"❌ Ошибка загрузки {filename}")
-                        return None
+            content = await self.http_get('events', self.EVENTS_URL.format(filename=filename), stale)
+            if content:
+                logger.info(f"✅ Файл {filename} загружен")
+                return content
+            logger.error(f"❌ Ошибка загрузки {filename}")
+            return None
         except Exception as e:
             logger.error(f"❌ Ошибка загрузки {filename}: {e}")
             return None
@@ -489,7 +541,28 @@ class FamilyScheduleBot:
         
         return self.dishes_schedule.get(day_ru)
 
+    def morning_fetchers(self, reminders):
+        """Внешние данные утреннего сообщения: {имя: функция(stale=False)}"""
+        fetchers = {
+            'weather': self.get_weather_forecast,
+            'usd': self.get_usd_rate,
+            'btc': self.get_btc_rate
+        }
+        for reminder in reminders:
+            event = reminder['event']
+            if 'url' not in event:
+                fetchers[f"file:{event['file']}"] = partial(self.fetch_event_file, event['file'])
+        return fetchers
+
     async def format_morning_message(self, date_str, day_of_week):
+        reminders = self.check_recurring_events()
+        wisdom = self.get_random_wisdom()
+        # Все внешние данные грузим одновременно в пределах общего бюджета
+        fetched = await self.fetch_all(self.morning_fetchers(reminders), self.fetch_budget)
+        return self.render_morning_message(date_str, day_of_week, wisdom, reminders, fetched)
+
+    def render_morning_message(self, date_str, day_of_week, wisdom, reminders, fetched):
+        """Текст утреннего сообщения из уже загруженных данных (без сети)"""
         day_names = {
             'monday': 'Понедельник', 
             'tuesday': 'Вторник', 
@@ -500,16 +573,15 @@ class FamilyScheduleBot:
             'sunday': 'Воскресенье'
         }
         day_ru = day_names.get(day_of_week, day_of_week)
-        wisdom = self.get_random_wisdom()
         
         content = f"🌅 <b>Доброе Утро ! Сегодня «{day_ru}» {date_str}</b>\n\n"
         
-        weather = await self.get_weather_forecast()
+        weather = fetched.get('weather')
         if weather:
             content += weather
         
         # Добавляем курсы валют после погоды
-        currency = await self.get_currency_rates()
+        currency = self.format_currency_block(fetched.get('usd'), fetched.get('btc'))
         if currency:
             content += currency
         
@@ -526,7 +598,6 @@ class FamilyScheduleBot:
         # Напоминание про телефон
         content += "<b>📱 Телефон:</b>\n• 👀 Аркаша сдает телефон в 20:00\n\n"
         
-        reminders = self.check_recurring_events()
         if reminders:
             for reminder in reminders:
                 event = reminder['event']
@@ -547,7 +618,7 @@ class FamilyScheduleBot:
                         content += f"🔗 <a href='{event['url']}'>Подробнее</a>\n"
                 else:
                     # Старая логика для событий с файлом
-                    event_content = await self.fetch_event_file(event['file'])
+                    event_content = fetched.get(f"file:{event['file']}")
                     
                     if reminder['type'] == 'week_before':
                         content += f"\n🔔 <b>НАПОМИНАНИЕ (За 7 дней):</b>\n<b>{event['name']}</b>\n"
@@ -581,19 +652,19 @@ class FamilyScheduleBot:
             }
             
             logger.info("📤 Отправка сообщения в Telegram...")
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, timeout=10) as response:
-                    response_data = await response.json()
-                    logger.info(f"📊 Telegram API response: {response_data}")
+            session = await self.get_session()
+            async with session.post(url, json=payload, timeout=10) as response:
+                response_data = await response.json()
+                logger.info(f"📊 Telegram API response: {response_data}")
                     
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"❌ Ошибка API {response.status}: {error_text}")
-                        return False
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"❌ Ошибка API {response.status}: {error_text}")
+                    return False
                     
-                    if not response_data.get('ok', False):
-                        logger.error(f"❌ Telegram API вернул ok=false: {response_data}")
-                        return False
+                if not response_data.get('ok', False):
+                    logger.error(f"❌ Telegram API вернул ok=false: {response_data}")
+                    return False
             
             if send_ss:
                 family_msg = f"<b>📋 Семейный совет:</b>\n\n🔗 <a href='{self.ss_url}'>Открыть структуру Семейного Совета</a>"
@@ -603,22 +674,22 @@ class FamilyScheduleBot:
                     'parse_mode': 'HTML', 
                     'disable_web_page_preview': False
                 }
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, json=payload_council, timeout=10) as response:
-                        response_data = await response.json()
-                        logger.info(f"📊 Telegram API response (семейный совет): {response_data}")
+                session = await self.get_session()
+                async with session.post(url, json=payload_council, timeout=10) as response:
+                    response_data = await response.json()
+                    logger.info(f"📊 Telegram API response (семейный совет): {response_data}")
                         
-                        if response.status != 200:
-                            error_text = await response.text()
-                            logger.error(f"❌ Ошибка отправки семейного совета {response.status}: {error_text}")
-                            return False
+                    if response.status != 200:
+                        error_text = await response.text()
+                        logger.error(f"❌ Ошибка отправки семейного совета {response.status}: {error_text}")
+                        return False
                         
-                        if not response_data.get('ok', False):
-                            logger.error(f"❌ Telegram API вернул ok=false для семейного совета: {response_data}")
-                            return False
+                    if not response_data.get('ok', False):
+                        logger.error(f"❌ Telegram API вернул ok=false для семейного совета: {response_data}")
+                        return False
                         
-                        logger.info("✅ Сообщения отправлены!")
-                        return True
+                    logger.info("✅ Сообщения отправлены!")
+                    return True
             else:
                 logger.info("✅ Сообщение отправлено!")
                 return True
@@ -627,9 +698,70 @@ class FamilyScheduleBot:
             logger.error(f"❌ Ошибка: {e}")
             return False
 
-    async def send_morning_message(self):
+    async def prepare_morning_message(self):
+        """
+        Собирает утреннее сообщение заранее (за MORNING_PREPARE_LEAD минут) и
+        сохраняет его вместе с входными данными: в момент отправки останется
+        лишь освежить то, что успеет за MORNING_REFRESH_BUDGET.
+        """
         date_str, day_of_week = self.get_today_schedule()
-        message = await self.format_morning_message(date_str, day_of_week)
+        reminders = self.check_recurring_events()
+        wisdom = self.get_random_wisdom()
+        fetched = await self.fetch_all(self.morning_fetchers(reminders), self.fetch_budget)
+        prepared = {
+            'day': datetime.now().date().isoformat(),
+            'prepared_at': time.time(),
+            'date_str': date_str,
+            'day_of_week': day_of_week,
+            'wisdom': wisdom,
+            'fetched': fetched,
+            'message': self.render_morning_message(date_str, day_of_week, wisdom, reminders, fetched)
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.prepared_file)), exist_ok=True)
+            atomic_write_json(self.prepared_file, prepared, indent=2)
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения подготовленного сообщения: {e}")
+            return False
+        logger.info(f"📦 Утреннее сообщение подготовлено ({len(prepared['message'])} симв.)")
+        return True
+
+    def load_prepared_morning(self):
+        """Подготовленное сегодня сообщение (None - нет, вчерашнее или не читается)"""
+        try:
+            if not os.path.exists(self.prepared_file):
+                return None
+            with open(self.prepared_file, 'r', encoding='utf-8') as f:
+                prepared = json.load(f)
+            if prepared.get('day') != datetime.now().date().isoformat():
+                return None
+            return prepared
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки подготовленного сообщения: {e}")
+            return None
+
+    async def refresh_prepared_morning(self, prepared):
+        """
+        Освежает подготовленное сообщение: свежие записи кэша и быстрые источники
+        берутся заново, всё, что не успело за refresh_budget, - из подготовленной копии.
+        """
+        reminders = self.check_recurring_events()
+        fetched = await self.fetch_all(self.morning_fetchers(reminders), self.refresh_budget)
+        kept = [name for name, value in prepared['fetched'].items() if value and not fetched.get(name)]
+        for name in kept:
+            fetched[name] = prepared['fetched'][name]
+        age = (time.time() - prepared['prepared_at']) / 60
+        logger.info(f"📦 Отправляем подготовленное сообщение ({age:.0f} мин назад), из копии: {', '.join(kept) or 'ничего'}")
+        return self.render_morning_message(prepared['date_str'], prepared['day_of_week'], prepared['wisdom'], reminders, fetched)
+
+    async def send_morning_message(self):
+        prepared = self.load_prepared_morning()
+        if prepared:
+            day_of_week = prepared['day_of_week']
+            message = await self.refresh_prepared_morning(prepared)
+        else:
+            date_str, day_of_week = self.get_today_schedule()
+            message = await self.format_morning_message(date_str, day_of_week)
         
         send_ss = (day_of_week == 'sunday')
         
@@ -686,50 +818,88 @@ class FamilyScheduleBot:
                 "temperature": 0.9
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=30
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        fact = data['choices'][0]['message']['content'].strip()
+            session = await self.get_session()
+            async with session.post(
+                "https://api.openai.com/v1/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=30
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    fact = data['choices'][0]['message']['content'].strip()
                         
-                        message = f"📅 <b>Этот день в истории</b>\n"
-                        message += f"<i>{day} {month}</i>\n\n"
-                        message += fact
+                    message = f"📅 <b>Этот день в истории</b>\n"
+                    message += f"<i>{day} {month}</i>\n\n"
+                    message += fact
                         
-                        logger.info(f"✅ AI факт получен: {fact[:50]}...")
-                        return await self.send_telegram_message(message)
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"❌ OpenAI ошибка: {response.status} - {error_text[:100]}")
-                        return False
+                    logger.info(f"✅ AI факт получен: {fact[:50]}...")
+                    return await self.send_telegram_message(message)
+                else:
+                    error_text = await response.text()
+                    logger.error(f"❌ OpenAI ошибка: {response.status} - {error_text[:100]}")
+                    return False
                         
         except Exception as e:
             logger.error(f"❌ Ошибка получения факта: {e}")
             return False
 
+    def get_job(self, mode):
+        """Функция отправки для режима (неизвестный режим - утреннее сообщение)"""
+        jobs = {
+            'prepare': self.prepare_morning_message,
+            'morning': self.send_morning_message,
+            'gratitude': self.send_gratitude_reminder,
+            'games': self.send_games_reminder,
+            'cleaning': self.send_cleaning_reminder,
+            'cleaning_tomorrow': self.send_cleaning_tomorrow,
+            'this_day': self.send_this_day_in_history
+        }
+        return jobs.get(mode, self.send_morning_message)
+
+    async def run_scheduled(self, mode, scheduled_at):
+        started = time.perf_counter()
+        success = await self.get_job(mode)()
+        elapsed = time.perf_counter() - started
+        if success:
+            logger.info(f"🎉 {mode}: отправлено за {elapsed:.2f}с (срок {scheduled_at:%H:%M} МСК)")
+        else:
+            logger.error(f"💥 {mode}: ошибка при отправке")
+
+    async def run_daemon(self):
+        """
+        Все напоминания из одного процесса: планировщик по времени МСК,
+        одна HTTP-сессия и кэш на все запуски. Отметки запусков сохраняются
+        в NOTIFIER_STATE_FILE, после перезапуска пропущенное догоняется в
+        пределах NOTIFIER_CATCHUP секунд.
+        """
+        scheduler = JobScheduler(os.getenv('NOTIFIER_STATE_FILE', 'notifier_state.json'), tz=MSK)
+        catchup = int(os.getenv('NOTIFIER_CATCHUP', 1800))
+        for mode, (hour, minute, weekdays) in SCHEDULE.items():
+            rule = DailyAt(hour, minute, weekdays=weekdays, tz=MSK)
+            scheduler.add(mode, rule, lambda at, mode=mode: self.run_scheduled(mode, at), catchup=catchup)
+        # Подготовка утреннего сообщения за prepare_lead минут до отправки
+        hour, minute, weekdays = SCHEDULE['morning']
+        prepare_at = datetime.combine(datetime.now().date(), dtime(hour, minute)) - timedelta(minutes=self.prepare_lead)
+        if self.prepare_lead > 0 and prepare_at.date() == datetime.now().date():
+            rule = DailyAt(prepare_at.hour, prepare_at.minute, weekdays=weekdays, tz=MSK)
+            scheduler.add('prepare', rule, lambda at: self.run_scheduled('prepare', at), catchup=catchup)
+        logger.info(f"🕰️ Режим демона: {len(scheduler.jobs)} задач, ближайшая в {scheduler.next_deadline():%d.%m %H:%M} МСК")
+        await scheduler.run()
+
 async def main():
     logger.info(f"🚀 Запуск семейного бота")
     bot = FamilyScheduleBot()
     
     mode = sys.argv[1] if len(sys.argv) > 1 else 'morning'
     
-    if mode == 'gratitude':
-        success = await bot.send_gratitude_reminder()
-    elif mode == 'games':
-        success = await bot.send_games_reminder()
-    elif mode == 'cleaning':
-        success = await bot.send_cleaning_reminder()
-    elif mode == 'cleaning_tomorrow':
-        success = await bot.send_cleaning_tomorrow()
-    elif mode == 'this_day':
-        success = await bot.send_this_day_in_history()
-    else:
-        success = await bot.send_morning_message()
+    try:
+        if mode == 'daemon':
+            await bot.run_daemon()
+            return
+        success = await bot.get_job(mode)()
+    finally:
+        await bot.close()
     
     if success:
         logger.info("🎉 Успешно завершено!")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Long polling для tracker_bot.py (когда нет публичного адреса для webhook)
+Пачка из getUpdates сразу уходит в пул воркеров (порядок внутри одного
+сообщения сохраняет сам пул), а следующий long poll начинается, не
+дожидаясь обработки пачки.
+
+В файл состояния пишется last_update_id и ещё не обработанные обновления:
+Telegram считает пачку доставленной при следующем getUpdates, поэтому
+после перезапуска незавершённые обновления берутся из файла, а не теряются.
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+from atomic_file import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_UPDATES = ['message', 'channel_post', 'callback_query']
+
+
+class UpdatePoller:
+    """Цикл getUpdates с сохранённой отметкой last_update_id и конвейерной обработкой"""
+
+    def __init__(self, api, pool, state_file, timeout=30, limit=100, io=None):
+        self.api = api
+        self.pool = pool  # UpdateWorkerPool
+        self.io = io  # StorageExecutor (без него состояние пишется прямо из цикла)
+        self.state_file = state_file
+        self.timeout = timeout
+        self.limit = limit
+        self.last_update_id = 0
+        self.inflight = {}  # update_id -> обновление, ещё не обработанное воркерами
+        self.dirty = False
+        self.stats = {'polls': 0, 'updates': 0, 'errors': 0, 'restored': 0}
+        self.load_state()
+
+    def load_state(self):
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.last_update_id = state.get('last_update_id', 0)
+                self.inflight = {update['update_id']: update for update in state.get('pending', [])}
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки состояния polling: {e}")
+
+    def state_snapshot(self):
+        return {
+            'last_update_id': self.last_update_id,
+            'pending': [self.inflight[update_id] for update_id in sorted(self.inflight)]
+        }
+
+    def write_state(self, state):
+        try:
+            atomic_write_json(self.state_file, state, separators=(',', ':'))
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения состояния polling: {e}")
+
+    def save_state(self):
+        """Синхронная запись (при остановке и без потока хранилища)"""
+        self.write_state(self.state_snapshot())
+        self.dirty = False
+
+    async def flush_state(self):
+        """Запись в потоке хранилища; возвращается, когда состояние на диске"""
+        if self.io is None:
+            self.save_state()
+            return
+        self.dirty = False
+        await self.io.run(self.write_state, self.state_snapshot())
+
+    def done(self, update):
+        """Вызывается пулом после обработки обновления"""
+        if self.inflight.pop(update.get('update_id'), None) is not None:
+            self.dirty = True
+            if not self.inflight:
+                # Пачка обработана целиком - фиксируем сразу (не дожидаясь записи)
+                if self.io is None:
+                    self.save_state()
+                else:
+                    self.dirty = False
+                    self.io.submit(self.write_state, self.state_snapshot())
+
+    async def start(self):
+        """Снимает webhook (иначе getUpdates отвечает 409) и дообрабатывает сохранённые обновления"""
+        try:
+            status, data = await self.api.call('deleteWebhook', {'drop_pending_updates': False})
+            if status == 200:
+                logger.info("🔁 Webhook снят, режим long polling")
+            else:
+                logger.error(f"❌ Ошибка снятия webhook: {status} - {data}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка снятия webhook: {e}")
+
+        if self.inflight:
+            logger.info(f"⏪ Дообработка обновлений после перезапуска: {len(self.inflight)}")
+            self.stats['restored'] += len(self.inflight)
+            for update_id in sorted(self.inflight):
+                await self.pool.put(self.inflight[update_id])
+
+    async def fetch(self):
+        """Один long poll; подтверждает Telegram всё до last_update_id"""
+        payload = {
+            'offset': self.last_update_id + 1,
+            'timeout': self.timeout,
+            'limit': self.limit,
+            'allowed_updates': ALLOWED_UPDATES
+        }
+        status, data = await self.api.call('getUpdates', payload)
+        if status != 200 or not isinstance(data, dict):
+            raise RuntimeError(f"getUpdates: {status} - {data}")
+        return data.get('result', [])
+
+    async def run(self):
+        await self.start()
+        backoff = 1
+        while True:
+            try:
+                updates = await self.fetch()
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ Ошибка получения обновлений: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+
+            self.stats['polls'] += 1
+            batch = [update for update in updates if update.get('update_id', 0) > self.last_update_id]
+            if not batch:
+                if self.dirty:
+                    await self.flush_state()
+                continue
+
+            for update in batch:
+                self.inflight[update['update_id']] = update
+            self.last_update_id = max(update['update_id'] for update in batch)
+            self.stats['updates'] += len(batch)
+            # Отметка и необработанные обновления на диске до того, как Telegram их забудет
+            await self.flush_state()
+
+            # Пачка уходит воркерам; следующий getUpdates начинается сразу
+            # (put ждёт только если очередь переполнена)
+            for update in batch:
+                await self.pool.put(update)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['last_update_id'] = self.last_update_id
+        stats['inflight'] = len(self.inflight)
+        return stats
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Выборочный профилировщик обработки обновлений для tracker_bot.py
+Включается через окружение или админский endpoint:
+- PROFILE_SAMPLE_EVERY=N - профилируется каждое N-е обновление (0 - выключено)
+- POST /admin/profile?seconds=60 - профилируются все обновления в течение окна
+Профили (cProfile) пишутся в PROFILE_DIR из потока хранилища, хранятся последние PROFILE_KEEP,
+GET /admin/profile отдаёт сводный топ горячих функций по всем сохранённым.
+
+cProfile меряет поток целиком, поэтому одновременно профилируется только
+одно обновление; в профиль попадает и работа других задач цикла, которая
+выполнялась, пока профилируемое обновление ждало await.
+"""
+
+import cProfile
+import glob
+import io
+import itertools
+import logging
+import os
+import pstats
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class UpdateProfiler:
+    """Профилирует 1 из N обновлений (или все во время окна) и хранит ротацию профилей"""
+
+    def __init__(self, directory='profiles', sample_every=0, keep=50, storage=None):
+        self.directory = directory
+        self.storage = storage  # StorageExecutor: профиль пишется на диск не в цикле событий
+        self.seq = itertools.count()  # Номер профиля в имени файла (задаётся до постановки в очередь)
+        self.sample_every = sample_every
+        self.keep = keep
+        self.window_until = 0.0
+        self.seen = 0
+        self.active = False  # Профиль уже пишется (cProfile один на поток)
+        self.stats = {'profiled': 0, 'skipped_busy': 0, 'errors': 0}
+
+    @classmethod
+    def from_env(cls, storage=None):
+        return cls(
+            directory=os.getenv('PROFILE_DIR', 'profiles'),
+            sample_every=int(os.getenv('PROFILE_SAMPLE_EVERY', 0)),
+            keep=int(os.getenv('PROFILE_KEEP', 50)),
+            storage=storage
+        )
+
+    def enable_window(self, seconds):
+        """Профилировать все обновления ближайшие seconds секунд"""
+        self.window_until = time.monotonic() + seconds
+        logger.info(f"🔬 Профилирование всех обновлений на {seconds}с")
+
+    def window_left(self):
+        return max(0.0, self.window_until - time.monotonic())
+
+    def should_sample(self):
+        self.seen += 1
+        if self.window_left() > 0:
+            return True
+        return self.sample_every > 0 and self.seen % self.sample_every == 0
+
+    async def run(self, coro, label):
+        """Выполняет корутину обработки, при попадании в выборку - под cProfile"""
+        if not self.should_sample():
+            return await coro
+        if self.active:
+            self.stats['skipped_busy'] += 1
+            return await coro
+
+        profile = cProfile.Profile()
+        self.active = True
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            return await coro
+        finally:
+            profile.disable()
+            self.active = False
+            elapsed = time.perf_counter() - started
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self.seq):06d}-{re.sub(r'[^a-z_]', '', label)}-{int(elapsed * 1000)}ms.prof"
+            if self.storage is not None:
+                # Сериализация pstats и запись файла - в потоке хранилища, обработчики не ждут
+                self.storage.submit(self.save, profile, name)
+            else:
+                self.save(profile, name)
+
+    def save(self, profile, name):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, name))
+            self.stats['profiled'] += 1
+            self.rotate()
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Ошибка сохранения профиля: {e}")
+
+    def files(self):
+        """Сохранённые профили, старые первыми"""
+        return sorted(glob.glob(os.path.join(self.directory, '*.prof')), key=os.path.getmtime)
+
+    def rotate(self):
+        files = self.files()
+        for path in files[:max(0, len(files) - self.keep)]:
+            os.remove(path)
+
+    def report(self, top=30, sort='cumulative'):
+        """Сводный топ функций по всем сохранённым профилям (текст)"""
+        files = self.files()
+        if not files:
+            return "Профилей пока нет (PROFILE_SAMPLE_EVERY=0 и окно не включалось)\n"
+        if sort not in SORT_KEYS:
+            sort = 'cumulative'
+
+        out = io.StringIO()
+        stats = None
+        loaded = []
+        for path in files:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(path, stream=out)
+                else:
+                    stats.add(path)
+                loaded.append(path)
+            except Exception as e:
+                logger.warning(f"⚠️ Пропущен повреждённый профиль {path}: {e}")
+        if stats is None:
+            return f"Все профили повреждены ({len(files)}), отчёт не построен\n"
+        out.write(f"Профилей: {len(loaded)} из {len(files)} ({loaded[0]} … {loaded[-1]})\n")
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        return out.getvalue()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['sample_every'] = self.sample_every
+        stats['window_left'] = round(self.window_left(), 1)
+        return stats
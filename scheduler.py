@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Планировщик задач по абсолютным срокам
+Задачи лежат в куче по времени следующего запуска, цикл спит ровно до
+ближайшего срока. Время последнего запуска каждой задачи сохраняется
+в файл, поэтому после перезапуска пропущенные запуски догоняются
+(в пределах окна catchup).
+"""
+
+import asyncio
+from datetime import datetime, time as dtime, timedelta
+import heapq
+import itertools
+import json
+import logging
+import os
+
+from atomic_file import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Максимальный отрезок сна: защита от перевода системных часов
+MAX_SLEEP = 3600
+
+
+class DailyAt:
+    """Правило: каждый день в hour:minute (опционально - только по дням недели / по фильтру дат)"""
+
+    def __init__(self, hour, minute=0, weekdays=None, when=None, tz=None):
+        self.at = dtime(hour, minute)
+        self.weekdays = set(weekdays) if weekdays is not None else None  # 0 = понедельник
+        self.when = when  # when(date) -> bool, например "последний день месяца"
+        self.tz = tz  # None - локальное время сервера
+
+    def matches(self, day):
+        if self.weekdays is not None and day.weekday() not in self.weekdays:
+            return False
+        return self.when is None or self.when(day)
+
+    def at_day(self, day):
+        return datetime.combine(day, self.at, tzinfo=self.tz)
+
+    def next_after(self, moment):
+        """Ближайший запуск строго после moment"""
+        day = moment.date()
+        for _ in range(400):
+            if self.matches(day) and self.at_day(day) > moment:
+                return self.at_day(day)
+            day += timedelta(days=1)
+        return None
+
+    def last_before(self, moment):
+        """Последний запуск не позже moment"""
+        day = moment.date()
+        for _ in range(400):
+            if self.matches(day) and self.at_day(day) <= moment:
+                return self.at_day(day)
+            day -= timedelta(days=1)
+        return None
+
+
+class Job:
+    __slots__ = ('name', 'rule', 'func', 'catchup')
+
+    def __init__(self, name, rule, func, catchup):
+        self.name = name
+        self.rule = rule
+        self.func = func  # async func(scheduled_at)
+        self.catchup = catchup
+
+
+class JobScheduler:
+    """Куча задач с абсолютными сроками, сохранёнными отметками запусков и догоняющим запуском"""
+
+    def __init__(self, state_file, tz=None):
+        self.state_file = state_file
+        self.tz = tz
+        self.jobs = []
+        self.heap = []
+        self.seq = itertools.count()  # Порядок регистрации при одинаковом сроке
+        self.last_run = self.load_state()
+        self.wakeup = asyncio.Event()
+
+    def now(self):
+        return datetime.now(self.tz)
+
+    def load_state(self):
+        """Отметки последних запусков {job_name: ISO-время запланированного запуска}"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return {name: datetime.fromisoformat(value) for name, value in json.load(f).items()}
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки состояния планировщика: {e}")
+        return {}
+
+    def save_state(self):
+        try:
+            atomic_write_json(self.state_file, {name: value.isoformat() for name, value in self.last_run.items()}, indent=2)
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения состояния планировщика: {e}")
+
+    def add(self, name, rule, func, catchup=0):
+        """Регистрирует задачу; catchup - сколько секунд после срока её ещё можно догнать"""
+        job = Job(name, rule, func, catchup)
+        self.jobs.append(job)
+        self.push(job, job.rule.next_after(self.now()))
+        self.wakeup.set()
+        return job
+
+    def push(self, job, deadline):
+        if deadline is not None:
+            heapq.heappush(self.heap, (deadline.timestamp(), next(self.seq), deadline, job))
+
+    def next_deadline(self):
+        return self.heap[0][2] if self.heap else None
+
+    async def run_job(self, job, scheduled_at):
+        logger.info(f"⏰ Запуск задачи {job.name} (срок {scheduled_at:%d.%m %H:%M})")
+        try:
+            await job.func(scheduled_at)
+        except Exception as e:
+            logger.error(f"❌ Ошибка задачи {job.name}: {e}", exc_info=True)
+        self.last_run[job.name] = scheduled_at
+        self.save_state()
+
+    async def catch_up(self):
+        """Запускает задачи, пропущенные пока бот был выключен"""
+        now = self.now()
+        for job in list(self.jobs):
+            missed = job.rule.last_before(now)
+            if missed is None:
+                continue
+            last = self.last_run.get(job.name)
+            if last is None:
+                # Задача ещё ни разу не запускалась - не догоняем, просто запоминаем
+                self.last_run[job.name] = missed
+                continue
+            if last >= missed:
+                continue
+            if (now - missed).total_seconds() <= job.catchup:
+                logger.info(f"⏪ Догоняем пропущенный запуск {job.name} ({missed:%d.%m %H:%M})")
+                await self.run_job(job, missed)
+            else:
+                logger.warning(f"⏭️ Пропущенный запуск {job.name} ({missed:%d.%m %H:%M}) слишком старый")
+        self.save_state()
+
+    async def run(self):
+        """Основной цикл: спит до ближайшего срока и запускает задачу"""
+        await self.catch_up()
+        while True:
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+
+            deadline_ts, _, deadline, job = self.heap[0]
+            delay = deadline_ts - self.now().timestamp()
+            if delay > 0:
+                logger.info(f"💤 Следующая задача {job.name} в {deadline:%d.%m %H:%M} (через {int(delay)}с)")
+                try:
+                    # Просыпаемся раньше, если добавили задачу; длинный сон режем на отрезки
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=min(delay, MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.heap)
+            await self.run_job(job, deadline)
+            self.push(job, job.rule.next_after(max(deadline, self.now())))
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Хранилище состояний сообщений (message_state) для tracker_bot.py
+Снимок message_states.json + журнал изменений message_states.journal:
+- каждое нажатие дописывает в журнал одну короткую запись (с fsync)
+- фоновое уплотнение пишет новый снимок и очищает журнал
+- при запуске снимок загружается и журнал проигрывается поверх него
+Записи журнала абсолютные (done=true/false, а не "переключить"),
+поэтому повторное проигрывание после сбоя даёт то же состояние.
+
+Состояния хранятся компактно (TrackedMessage со __slots__ и битовыми масками
+по секциям) в ограниченном контейнере: не больше max_entries сообщений и
+не старше max_age_days дней. Вытеснение тоже пишется в журнал.
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import os
+import sys
+import time
+
+from atomic_file import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('morning', 'day', 'cant_do', 'evening')
+
+
+class TrackedMessage:
+    """Состояние одного сообщения с чек-листом"""
+
+    __slots__ = ('tasks', 'done', 'clean_original', '_original', 'created', 'view')
+
+    def __init__(self, tasks, completed=None, original_text='', clean_original=None, created=None):
+        # Задачи по секциям: кортеж кортежей в порядке SECTIONS
+        self.tasks = tuple(tuple(tasks.get(section, ())) for section in SECTIONS)
+        # Выполненные задачи: битовая маска на секцию
+        self.done = [0] * len(SECTIONS)
+        self.clean_original = clean_original if clean_original is not None else original_text
+        # Отображаемый текст храним только если он отличается от чистого оригинала
+        self._original = None if original_text == self.clean_original else original_text
+        self.created = created if created is not None else time.time()
+        # Готовый рендерер чек-листа (не сохраняется, обновляется при переключениях)
+        self.view = None
+        if completed:
+            self.set_completed(completed)
+
+    @property
+    def original_text(self):
+        return self.clean_original if self._original is None else self._original
+
+    @original_text.setter
+    def original_text(self, text):
+        self._original = None if text == self.clean_original else text
+
+    def task_dict(self):
+        """Задачи в формате {'day': [...], ...}"""
+        return {section: list(self.tasks[i]) for i, section in enumerate(SECTIONS)}
+
+    def task_view(self):
+        """Задачи {'day': (...), ...} без копирования списков (только для чтения)"""
+        return dict(zip(SECTIONS, self.tasks))
+
+    def is_done(self, section, idx):
+        return bool(self.done[SECTIONS.index(section)] >> idx & 1)
+
+    def set_done(self, section, idx, done):
+        i = SECTIONS.index(section)
+        if done:
+            self.done[i] |= 1 << idx
+        else:
+            self.done[i] &= ~(1 << idx)
+        if self.view is not None:
+            self.view.set_done(section, idx, done)
+
+    def toggle(self, section, idx):
+        """Переключает задачу, возвращает новое состояние"""
+        done = not self.is_done(section, idx)
+        self.set_done(section, idx, done)
+        return done
+
+    def completed_list(self, section):
+        """Индексы выполненных задач секции по возрастанию"""
+        mask = self.done[SECTIONS.index(section)]
+        return [idx for idx in range(mask.bit_length()) if mask >> idx & 1]
+
+    def completed_dict(self):
+        """Выполненные задачи в формате {'day': [0, 2], ...}"""
+        return {
+            section: [idx for idx in range(mask.bit_length()) if mask >> idx & 1] if mask else []
+            for section, mask in zip(SECTIONS, self.done)
+        }
+
+    def set_completed(self, completed):
+        self.view = None
+        for i, section in enumerate(SECTIONS):
+            mask = 0
+            for idx in completed.get(section, []):
+                mask |= 1 << idx
+            self.done[i] = mask
+
+    def to_dict(self):
+        """Компактное представление для снимка и журнала"""
+        return self.frozen_to_dict(self.frozen())
+
+    def frozen(self):
+        """Неизменяемый снимок (для сериализации в другом потоке)"""
+        return self.tasks, tuple(self.done), self.clean_original, self._original, self.created
+
+    @staticmethod
+    def frozen_to_dict(frozen):
+        tasks, done, clean_original, original, created = frozen
+        data = {'t': [list(t) for t in tasks], 'd': list(done), 'c': clean_original, 'ts': int(created)}
+        if original is not None:
+            data['o'] = original
+        return data
+
+    def approx_size(self):
+        """Примерный размер в памяти, байт (без готового рендерера)"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.tasks) + sys.getsizeof(self.done)
+        size += sum(sys.getsizeof(section) + sum(map(sys.getsizeof, section)) for section in self.tasks)
+        size += sys.getsizeof(self.clean_original)
+        if self._original is not None:
+            size += sys.getsizeof(self._original)
+        return size
+
+    @classmethod
+    def from_dict(cls, data):
+        """Читает компактный формат и старый формат message_states.json"""
+        if 't' in data:
+            message = cls({}, clean_original=data['c'], original_text=data.get('o', data['c']), created=data.get('ts'))
+            message.tasks = tuple(tuple(t) for t in data['t'])
+            message.done = list(data['d'])
+            return message
+        return cls(
+            data.get('tasks', {}),
+            data.get('completed', {}),
+            original_text=data.get('original_text', ''),
+            clean_original=data.get('clean_original')
+        )
+
+
+class BoundedMessageStates:
+    """Словарь message_id -> TrackedMessage с LRU-вытеснением и ограничением по возрасту"""
+
+    def __init__(self, max_entries=200, max_age_days=7):
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.items_by_id = OrderedDict()
+
+    def __contains__(self, message_id):
+        return message_id in self.items_by_id
+
+    def __len__(self):
+        return len(self.items_by_id)
+
+    def __getitem__(self, message_id):
+        self.items_by_id.move_to_end(message_id)
+        return self.items_by_id[message_id]
+
+    def __setitem__(self, message_id, message):
+        self.items_by_id[message_id] = message
+        self.items_by_id.move_to_end(message_id)
+
+    def __delitem__(self, message_id):
+        del self.items_by_id[message_id]
+
+    def get(self, message_id, default=None):
+        return self[message_id] if message_id in self.items_by_id else default
+
+    def pop(self, message_id, default=None):
+        return self.items_by_id.pop(message_id, default)
+
+    def items(self):
+        return self.items_by_id.items()
+
+    def approx_size(self):
+        """Примерный размер всех состояний в памяти, байт"""
+        return sys.getsizeof(self.items_by_id) + sum(message.approx_size() for message in self.items_by_id.values())
+
+    def over_limit(self, now=None):
+        """Сообщения, которые нужно вытеснить: устаревшие и лишние (самые давно использованные)"""
+        now = now or time.time()
+        expired = [mid for mid, message in self.items_by_id.items() if now - message.created > self.max_age]
+        extra = len(self.items_by_id) - len(expired) - self.max_entries
+        if extra > 0:
+            expired_set = set(expired)
+            for mid in self.items_by_id:
+                if extra <= 0:
+                    break
+                if mid not in expired_set:
+                    expired.append(mid)
+                    extra -= 1
+        return expired
+
+
+class MessageStateStore:
+    """Снимок + журнал изменений для message_state"""
+
+    def __init__(self, snapshot_path, journal_path=None, max_entries=200, max_age_days=7):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + '.journal'
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.journal = None
+        self.pending = 0  # Записей в журнале после последнего снимка
+
+    def load(self):
+        """Загружает снимок, проигрывает поверх него журнал и вытесняет устаревшее"""
+        states = BoundedMessageStates(self.max_entries, self.max_age_days)
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                # Преобразуем строковые ключи обратно в int
+                for k, v in json.load(f).items():
+                    states[int(k)] = TrackedMessage.from_dict(v)
+
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя запись (сбой во время записи) - не подтверждена
+                        logger.warning(f"⚠️ Пропущена повреждённая запись журнала (строка {line_no})")
+                        continue
+                    self.apply(states, record)
+                    replayed += 1
+
+        self.pending = replayed
+        if replayed:
+            logger.info(f"📜 Проиграно записей журнала: {replayed}")
+
+        for message_id in states.over_limit():
+            states.pop(message_id)
+            self.pending += 1  # Вытеснение попадёт в следующий снимок
+        return states
+
+    @staticmethod
+    def apply(states, record):
+        """Применяет одну запись журнала к контейнеру состояний"""
+        op = record.get('op')
+        message_id = record.get('id')
+
+        if op == 'put':
+            states[message_id] = TrackedMessage.from_dict(record['state'])
+        elif op in ('delete', 'evict'):
+            states.pop(message_id, None)
+        elif message_id not in states:
+            return
+        elif op == 'toggle':
+            states[message_id].set_done(record['period'], record['idx'], record['done'])
+        elif op == 'update':
+            fields = record['fields']
+            if 'completed' in fields:
+                states[message_id].set_completed(fields['completed'])
+            if 'original_text' in fields:
+                states[message_id].original_text = fields['original_text']
+
+    def append(self, record):
+        """Дописывает запись в журнал и сбрасывает её на диск до возврата"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Дописывает несколько записей одной записью и одним fsync"""
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.journal.write(''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in records))
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.pending += len(records)
+
+    @staticmethod
+    def expire(states, now=None):
+        """Убирает устаревшие/лишние сообщения из контейнера (без журнала), возвращает их id"""
+        evicted = states.over_limit(now)
+        for message_id in evicted:
+            states.pop(message_id)
+        return evicted
+
+    def evict(self, states, now=None):
+        """Вытесняет устаревшие/лишние сообщения с записью в журнал, возвращает их id"""
+        evicted = self.expire(states, now)
+        if evicted:
+            self.append_many([{'op': 'evict', 'id': message_id} for message_id in evicted])
+            logger.info(f"🧹 Вытеснено состояний сообщений: {len(evicted)}")
+        return evicted
+
+    @staticmethod
+    def snapshot(states):
+        """Неизменяемый снимок всех состояний: [(message_id, frozen), ...]"""
+        return [(message_id, message.frozen()) for message_id, message in states.items()]
+
+    def compact(self, states):
+        """Пишет полный снимок (через временный файл) и очищает журнал"""
+        self.compact_snapshot(self.snapshot(states))
+
+    def compact_snapshot(self, snapshot):
+        """compact() по готовому снимку - можно вызывать из потока хранилища"""
+        data = {str(k): TrackedMessage.frozen_to_dict(frozen) for k, frozen in snapshot}
+        atomic_write_json(self.snapshot_path, data, separators=(',', ':'))
+
+        # Журнал очищаем только после того, как снимок на месте
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        open(self.journal_path, 'w').close()
+        self.pending = 0
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Накопительные агрегаты статистики для tracker_bot.py
+Обновляются при каждом сохранении дня (разница между старой и новой
+версией дня), поэтому итоги недели/месяца/года и серии 70%+ читаются
+без перебора всей истории. Хранятся в stats_aggregates.json.
+
+Редкие случаи, которые нельзя посчитать по разнице (день перестал быть
+лучшим/худшим в месяце, изменился прошлый день серии), пересчитываются
+по данным одного месяца/года или всей истории.
+"""
+
+import copy
+from datetime import date, timedelta
+import json
+import logging
+import os
+
+from atomic_file import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Порог "хорошего" дня для серий
+STREAK_THRESHOLD = 70
+
+FORMAT_VERSION = 1
+
+
+def day_percentage(day_data):
+    return (day_data or {}).get('percentage', 0)
+
+
+def day_fails(day_data):
+    day_data = day_data or {}
+    if 'fails' in day_data:
+        return day_data['fails']  # Компактная запись из архива
+    return len(day_data.get('cant_do', {}).get('completed', []))
+
+
+def week_key(day_key):
+    """ISO-неделя дня: '2025-W07'"""
+    year, week, _ = date.fromisoformat(day_key).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def previous_day(day_key):
+    return (date.fromisoformat(day_key) - timedelta(days=1)).isoformat()
+
+
+def new_bucket():
+    return {'sum': 0, 'count': 0, 'good': 0, 'fails': 0, 'points': 0, 'max_points': 0, 'best': None, 'worst': None}
+
+
+class StatsAggregates:
+    """Суммы по неделям/месяцам/годам, лучшие/худшие дни и серии 70%+"""
+
+    def __init__(self, path, backend):
+        self.path = path
+        self.backend = backend  # Бэкенд статистики (для пересчётов)
+        self.data = self.load()
+
+    @staticmethod
+    def empty():
+        return {
+            'version': FORMAT_VERSION,
+            'weeks': {},
+            'months': {},
+            'years': {},
+            'streak': {'current': 0, 'last_good': None, 'longest': 0, 'longest_end': None}
+        }
+
+    def load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == FORMAT_VERSION:
+                    return data
+                logger.warning("⚠️ Устаревший формат агрегатов, нужен пересчёт")
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки агрегатов: {e}")
+        return None
+
+    def save(self):
+        try:
+            atomic_write_json(self.path, self.data, separators=(',', ':'))
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения агрегатов: {e}")
+
+    def ensure(self):
+        """Пересчитывает агрегаты из всей истории, если файла ещё нет"""
+        if self.data is None:
+            self.rebuild()
+
+    # === Обновление ===
+
+    def rebuild(self):
+        """Полный пересчёт по всей истории (команда rebuild-aggregates)"""
+        self.data = self.empty()
+        days = self.backend.all_days()
+        for day_key, day_data in days.items():
+            self._apply_buckets(day_key, None, day_data, recompute=False)
+        self._rebuild_streak(days)
+        self.save()
+        logger.info(f"🧮 Агрегаты пересчитаны: {len(days)} дней")
+        return len(days)
+
+    def update(self, day_key, old_data, new_data):
+        """Учитывает новую версию дня (old_data - предыдущая версия или None)"""
+        if self.data is None:
+            # Агрегатов ещё нет - пересчёт уже включит новую версию дня
+            self.rebuild()
+            return
+        self._apply_buckets(day_key, old_data, new_data, recompute=True)
+
+        was_good = old_data is not None and day_percentage(old_data) >= STREAK_THRESHOLD
+        is_good = day_percentage(new_data) >= STREAK_THRESHOLD
+        if was_good != is_good:
+            self._update_streak(day_key, is_good)
+        self.save()
+
+    def _apply_buckets(self, day_key, old_data, new_data, recompute):
+        old_pct = day_percentage(old_data)
+        new_pct = day_percentage(new_data)
+
+        week = self.data['weeks'].setdefault(week_key(day_key), {'sum': 0, 'pct': [None] * 7})
+        week['sum'] += new_pct - (old_pct if old_data is not None else 0)
+        week['pct'][date.fromisoformat(day_key).weekday()] = new_pct
+
+        for kind, key in (('months', day_key[:7]), ('years', day_key[:4])):
+            bucket = self.data[kind].setdefault(key, new_bucket())
+            if old_data is None:
+                bucket['count'] += 1
+            else:
+                bucket['sum'] -= old_pct
+                bucket['good'] -= old_pct >= STREAK_THRESHOLD
+                bucket['fails'] -= day_fails(old_data)
+                bucket['points'] -= old_data.get('points', 0)
+                bucket['max_points'] -= old_data.get('max_points', 0)
+            bucket['sum'] += new_pct
+            bucket['good'] += new_pct >= STREAK_THRESHOLD
+            bucket['fails'] += day_fails(new_data)
+            bucket['points'] += new_data.get('points', 0)
+            bucket['max_points'] += new_data.get('max_points', 0)
+            self._update_extremes(bucket, kind, key, day_key, new_pct, old_pct if old_data is not None else None, recompute)
+
+    def _update_extremes(self, bucket, kind, key, day_key, new_pct, old_pct, recompute):
+        """Лучший/худший день периода (при равенстве - более ранний)"""
+        best, worst = bucket['best'], bucket['worst']
+        stale = False
+
+        if best is None or new_pct > best[1] or (new_pct == best[1] and day_key < best[0]):
+            bucket['best'] = [day_key, new_pct]
+        elif best[0] == day_key:
+            bucket['best'] = [day_key, new_pct]
+            stale = old_pct is not None and new_pct < old_pct
+
+        if worst is None or new_pct < worst[1] or (new_pct == worst[1] and day_key < worst[0]):
+            bucket['worst'] = [day_key, new_pct]
+        elif worst[0] == day_key:
+            bucket['worst'] = [day_key, new_pct]
+            stale = stale or (old_pct is not None and new_pct > old_pct)
+
+        if stale and recompute:
+            # День перестал быть крайним - пересчитываем по данным только этого периода
+            start, end = (f"{key}-01", f"{key}-31") if kind == 'months' else (f"{key}-01-01", f"{key}-12-31")
+            days = self.backend.get_range(start, end)
+            ranked = sorted((day_percentage(v), k) for k, v in days.items())
+            if ranked:
+                bucket['worst'] = [ranked[0][1], ranked[0][0]]
+                top = max(pct for pct, _ in ranked)
+                bucket['best'] = [min(k for pct, k in ranked if pct == top), top]
+
+    def _update_streak(self, day_key, is_good):
+        streak = self.data['streak']
+        last_good = streak['last_good']
+        if is_good and (last_good is None or day_key > last_good):
+            # Обычный случай: хорошим стал сегодняшний (самый новый) день
+            streak['current'] = streak['current'] + 1 if last_good == previous_day(day_key) else 1
+            streak['last_good'] = day_key
+            if streak['current'] > streak['longest']:
+                streak['longest'] = streak['current']
+                streak['longest_end'] = day_key
+        else:
+            # Изменился прошлый день или день перестал быть хорошим - серии могли разорваться/склеиться
+            self._rebuild_streak(self.backend.all_days())
+
+    def _rebuild_streak(self, days):
+        streak = {'current': 0, 'last_good': None, 'longest': 0, 'longest_end': None}
+        for day_key in sorted(days):
+            if day_percentage(days[day_key]) < STREAK_THRESHOLD:
+                continue
+            if streak['last_good'] == previous_day(day_key):
+                streak['current'] += 1
+            else:
+                streak['current'] = 1
+            streak['last_good'] = day_key
+            if streak['current'] > streak['longest']:
+                streak['longest'] = streak['current']
+                streak['longest_end'] = day_key
+        self.data['streak'] = streak
+
+    # === Чтение ===
+
+    def snapshot(self, day_key):
+        """
+        Отвязанная копия только для чтения (обновления идут в потоке хранилища).
+        Копируется только нужное итогам на день day_key: серии, его неделя,
+        его год и месяцы этого года - размер не растёт с историей.
+        """
+        view = StatsAggregates.__new__(StatsAggregates)
+        view.path = self.path
+        view.backend = None
+        view.data = None
+        if self.data is not None:
+            year = day_key[:4]
+            months = (f"{year}-{month:02d}" for month in range(1, 13))
+            view.data = copy.deepcopy({
+                'version': self.data['version'],
+                'weeks': {k: self.data['weeks'][k] for k in (week_key(day_key),) if k in self.data['weeks']},
+                'months': {k: self.data['months'][k] for k in months if k in self.data['months']},
+                'years': {k: self.data['years'][k] for k in (year,) if k in self.data['years']},
+                'streak': self.data['streak']
+            })
+        return view
+
+    def current_streak(self, day_key):
+        """Текущая серия 70%+ на день day_key (серия жива, если вчера или сегодня был хороший день)"""
+        if self.data is None:
+            return 0
+        streak = self.data['streak']
+        last_good = streak['last_good']
+        if last_good and last_good in (day_key, previous_day(day_key)):
+            return streak['current']
+        return 0
+
+    def longest_streak(self):
+        return self.data['streak']['longest'] if self.data else 0
+
+    def week(self, day_key):
+        """Проценты по дням недели (Пн..Вс, None - нет данных) и сумма"""
+        empty = {'sum': 0, 'pct': [None] * 7}
+        return (self.data or {}).get('weeks', {}).get(week_key(day_key), empty)
+
+    def month(self, month_key):
+        return (self.data or {}).get('months', {}).get(month_key)
+
+    def year(self, year_key):
+        return (self.data or {}).get('years', {}).get(year_key)
+
+
+def bucket_average(bucket):
+    """Средний процент за дни с данными"""
+    return int(bucket['sum'] / bucket['count']) if bucket and bucket['count'] else 0
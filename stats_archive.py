@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Архив старой статистики для tracker_bot.py
+Полные записи дней (секции со списками completed) нужны только пока день
+свежий. Задача архивации переносит целые месяцы старше горизонта
+(STATS_ARCHIVE_DAYS) в stats_archive.json: по каждому дню компактная
+запись [процент, баллы, макс. баллы, срывы]. Полные записи по
+желанию (STATS_ARCHIVE_DETAIL=1) дописываются в сжатый холодный файл
+stats_cold.jsonl.gz. В горячем хранилище остаются только свежие дни.
+
+ArchivedStatsBackend - обёртка над горячим бэкендом с тем же интерфейсом:
+чтения объединяют горячие дни и архив (горячая запись дня важнее), поэтому
+агрегаты, серии и итоги работают как раньше. Готовые суммы по месяцам
+не хранятся: недели и серии всё равно считаются по дням.
+"""
+
+from datetime import date, timedelta
+import gzip
+import json
+import logging
+import os
+
+from atomic_file import atomic_write_json
+from stats_aggregates import day_fails, day_percentage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_VERSION = 1
+
+
+def compact_day(day_data):
+    """Компактная запись дня: [процент, баллы, макс. баллы, срывы в НЕЛЬЗЯ]"""
+    return [day_percentage(day_data), day_data.get('points', 0), day_data.get('max_points', 0), day_fails(day_data)]
+
+
+def expand_day(record):
+    """День из архива в виде, понятном агрегатам (без списков completed)"""
+    percentage, points, max_points, fails = record
+    return {'percentage': percentage, 'points': points, 'max_points': max_points, 'fails': fails, 'archived': True}
+
+
+class ArchivedStatsBackend:
+    """Горячий бэкенд (свежие дни) + архив месяцев (+ холодный файл с полными записями)"""
+
+    def __init__(self, hot, archive_path, cold_path=None):
+        self.hot = hot
+        self.archive_path = archive_path
+        self.cold_path = cold_path
+        self.broken = False  # Архив не прочитался - работаем с горячими днями, не архивируем
+        self.months = self._read()  # 'YYYY-MM' -> {'days': {day_key: [...]}}
+
+    def _read(self):
+        if not os.path.exists(self.archive_path):
+            return {}
+        try:
+            with open(self.archive_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == ARCHIVE_VERSION:
+                return data.get('months', {})
+            logger.error(f"❌ Неизвестная версия архива статистики: {data.get('version')}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки архива статистики: {e}")
+        # Повреждённый архив не перезаписываем, пока его не починят
+        self.broken = True
+        return {}
+
+    def _write(self):
+        atomic_write_json(self.archive_path, {'version': ARCHIVE_VERSION, 'months': self.months}, separators=(',', ':'))
+
+    def _archived(self, start_key, end_key):
+        days = {}
+        for month_key in sorted(self.months):
+            if month_key < start_key[:7] or month_key > end_key[:7]:
+                continue
+            for day_key, record in self.months[month_key]['days'].items():
+                if start_key <= day_key <= end_key:
+                    days[day_key] = expand_day(record)
+        return days
+
+    # === Интерфейс бэкенда ===
+
+    def get_day(self, day_key):
+        day_data = self.hot.get_day(day_key)
+        if day_data is None:
+            record = self.months.get(day_key[:7], {}).get('days', {}).get(day_key)
+            if record is not None:
+                return expand_day(record)
+        return day_data
+
+    def put_day(self, day_key, data):
+        # Правка архивного дня попадёт в горячее хранилище и перекроет архив до следующей архивации
+        self.hot.put_day(day_key, data)
+
+    def get_range(self, start_key, end_key, detail=False):
+        """
+        Дни в диапазоне [start_key, end_key] по возрастанию даты (архив + горячие).
+        detail=True - архивные дни полными записями из холодного файла, где они есть.
+        """
+        days = self._archived(start_key, end_key)
+        if detail and days:
+            days.update(self.load_detail(start_key, end_key))
+        days.update(self.hot.get_range(start_key, end_key))
+        return {k: days[k] for k in sorted(days)}
+
+    def all_days(self):
+        days = self._archived('0000-00-00', '9999-99-99')
+        days.update(self.hot.all_days())
+        return {k: days[k] for k in sorted(days)}
+
+    def count(self):
+        archived = sum(len(month['days']) for month in self.months.values())
+        return archived + self.hot.count()
+
+    def close(self):
+        self.hot.close()
+
+    # === Архивация ===
+
+    def archive(self, horizon_days, keep_detail=False, today=None):
+        """
+        Переносит в архив целые месяцы, закончившиеся раньше чем horizon_days дней назад.
+        Возвращает количество перенесённых дней.
+        """
+        if self.broken:
+            logger.error("❌ Архив статистики не прочитан при запуске, архивация пропущена")
+            return 0
+        cutoff = (today or date.today()) - timedelta(days=horizon_days)
+        # Последний месяц, целиком лежащий до границы
+        last_month = (cutoff.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+        old_days = self.hot.get_range('0000-00-00', f"{last_month}-31")
+        if not old_days:
+            return 0
+
+        if keep_detail and self.cold_path:
+            # Полные записи - в сжатый файл (новый gzip-член в конце, читается как один поток)
+            with gzip.open(self.cold_path, 'at', encoding='utf-8') as f:
+                for day_key, day_data in old_days.items():
+                    f.write(json.dumps({'day': day_key, 'data': day_data}, ensure_ascii=False, separators=(',', ':')) + '\n')
+                f.flush()
+            with open(self.cold_path, 'rb+') as f:
+                os.fsync(f.fileno())
+
+        for day_key, day_data in old_days.items():
+            month = self.months.setdefault(day_key[:7], {'days': {}})
+            month['days'][day_key] = compact_day(day_data)
+        for month_key in {day_key[:7] for day_key in old_days}:
+            days = self.months[month_key]['days']
+            # Сводку месяца из прежних версий архива не переносим - её никто не читает
+            self.months[month_key] = {'days': {k: days[k] for k in sorted(days)}}
+
+        # Сначала архив на диске, потом удаление из горячего хранилища:
+        # при сбое между шагами день просто окажется в обоих местах
+        self._write()
+        self.hot.delete_days(list(old_days))
+        logger.info(f"🗄️ В архив перенесено дней: {len(old_days)} (до {last_month} включительно)")
+        return len(old_days)
+
+    def load_detail(self, start_key, end_key):
+        """Полные записи архивных дней из холодного файла (медленно: читается весь файл)"""
+        if not self.cold_path or not os.path.exists(self.cold_path):
+            return {}
+        days = {}
+        try:
+            with gzip.open(self.cold_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Оборванная запись после сбоя
+                    if start_key <= record['day'] <= end_key:
+                        days[record['day']] = record['data']  # Повторная архивация - последняя запись важнее
+        except (EOFError, OSError) as e:
+            # Недописанный gzip-член в конце файла - всё прочитанное до него верно
+            logger.warning(f"⚠️ Холодный архив прочитан не полностью: {e}")
+        return {k: days[k] for k in sorted(days)}
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Хранилище статистики выполнения задач для tracker_bot.py
+Бэкенды:
+- sqlite (по умолчанию) - одна строка на день, индекс по дате, точечные чтения/записи
+- json - старый формат stats.json (весь файл целиком, атомарная перезапись), для совместимости
+"""
+
+import json
+import logging
+import os
+import sqlite3
+
+from atomic_file import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Служебные ключи stats.json, которые не являются датами
+META_KEYS = ('_info', '_format')
+
+
+def is_day_key(key):
+    """Ключ дня имеет вид YYYY-MM-DD"""
+    return key not in META_KEYS and '-' in key
+
+
+class JSONStatsBackend:
+    """Совместимый бэкенд: весь stats.json в памяти, перезапись файла при сохранении"""
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = {}
+        self.days = self._read()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки статистики: {e}")
+            return {}
+        self.meta = {k: v for k, v in data.items() if k in META_KEYS}
+        return {k: v for k, v in data.items() if is_day_key(k)}
+
+    def _write(self):
+        data = dict(self.meta)
+        data.update(self.days)
+        # Временный файл + fsync + rename: сбой посреди записи не обрезает историю
+        atomic_write_json(self.path, data, indent=2)
+
+    def get_day(self, day_key):
+        return self.days.get(day_key)
+
+    def put_day(self, day_key, data):
+        self.days[day_key] = data
+        self._write()
+
+    def delete_days(self, day_keys):
+        for day_key in day_keys:
+            self.days.pop(day_key, None)
+        self._write()
+
+    def get_range(self, start_key, end_key):
+        """Дни в диапазоне [start_key, end_key] по возрастанию даты"""
+        return {k: self.days[k] for k in sorted(self.days) if start_key <= k <= end_key}
+
+    def all_days(self):
+        return {k: self.days[k] for k in sorted(self.days)}
+
+    def count(self):
+        return len(self.days)
+
+    def close(self):
+        pass
+
+
+class SQLiteStatsBackend:
+    """Бэкенд на SQLite: таблица days с первичным ключом по дате"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS days ('
+            'day TEXT PRIMARY KEY, '
+            'data TEXT NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        self.conn.commit()
+
+    def get_day(self, day_key):
+        row = self.conn.execute('SELECT data FROM days WHERE day = ?', (day_key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_day(self, day_key, data):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO days (day, data) VALUES (?, ?)',
+                (day_key, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+            )
+
+    def put_days(self, days):
+        """Пакетная запись {day_key: data} одной транзакцией"""
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO days (day, data) VALUES (?, ?)',
+                [(k, json.dumps(v, ensure_ascii=False, separators=(',', ':'))) for k, v in days.items()]
+            )
+
+    def delete_days(self, day_keys):
+        """Удаление дней одной транзакцией (после переноса в архив)"""
+        with self.conn:
+            self.conn.executemany('DELETE FROM days WHERE day = ?', [(k,) for k in day_keys])
+
+    def get_range(self, start_key, end_key):
+        """Дни в диапазоне [start_key, end_key] по возрастанию даты"""
+        rows = self.conn.execute(
+            'SELECT day, data FROM days WHERE day BETWEEN ? AND ? ORDER BY day',
+            (start_key, end_key)
+        )
+        return {day: json.loads(data) for day, data in rows}
+
+    def all_days(self):
+        rows = self.conn.execute('SELECT day, data FROM days ORDER BY day')
+        return {day: json.loads(data) for day, data in rows}
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM days').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def migrate_json_stats(json_path, backend):
+    """
+    Одноразовый перенос stats.json в другой бэкенд.
+    Ключи _info/_format и прочие не-даты пропускаются.
+    Возвращает количество перенесённых дней.
+    """
+    if not os.path.exists(json_path):
+        logger.info(f"📭 {json_path} не найден, переносить нечего")
+        return 0
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    days = {k: v for k, v in data.items() if is_day_key(k) and isinstance(v, dict)}
+    skipped = [k for k in data if k not in days]
+
+    if hasattr(backend, 'put_days'):
+        backend.put_days(days)
+    else:
+        for day_key, day_data in days.items():
+            backend.put_day(day_key, day_data)
+
+    logger.info(f"📦 Перенесено дней из {json_path}: {len(days)} (пропущено ключей: {len(skipped)})")
+    return len(days)
+
+
+def create_stats_backend(json_path='stats.json', db_path=None, kind=None, migrate=True):
+    """
+    Создаёт бэкенд по STATS_BACKEND (sqlite|json).
+    При первом запуске sqlite автоматически переносит данные из stats.json
+    (migrate=False - не переносить: пустая база после архивации не первый запуск).
+    """
+    kind = (kind or os.getenv('STATS_BACKEND', 'sqlite')).lower()
+
+    if kind == 'json':
+        logger.info(f"🗂️ Статистика: JSON ({json_path})")
+        return JSONStatsBackend(json_path)
+
+    if kind != 'sqlite':
+        raise ValueError(f"❌ Неизвестный STATS_BACKEND: {kind}")
+
+    db_path = db_path or os.getenv('STATS_DB_FILE', 'stats.db')
+    backend = SQLiteStatsBackend(db_path)
+    logger.info(f"🗂️ Статистика: SQLite ({db_path})")
+
+    if migrate and backend.count() == 0 and os.path.exists(json_path):
+        migrate_json_stats(json_path, backend)
+
+    return backend
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Асинхронный слой файлового ввода-вывода для tracker_bot.py
+Все чтения и записи статистики, агрегатов и состояний сообщений идут
+через один выделенный поток: цикл событий не ждёт диск и fsync, а записи
+выполняются строго в порядке постановки (снимок не обгонит журнал,
+закрытие шарда не обгонит его последние записи). Сериализация тоже
+выполняется в потоке - на неизменяемых снимках, снятых в цикле.
+
+LoopLagMonitor меряет, насколько цикл событий опаздывает просыпаться.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'tracker_loop_lag_seconds', 'Опоздание цикла событий относительно запланированного пробуждения',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+
+class StorageExecutor:
+    """Выделенный поток для файлов и SQLite"""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+        self.pending = 0  # Поставлено и ещё не выполнено
+        self.lock = threading.Lock()
+        self.stats = {'jobs': 0, 'errors': 0, 'busy_ms': 0.0}
+
+    def _call(self, func, args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        finally:
+            with self.lock:
+                self.pending -= 1
+                self.stats['jobs'] += 1
+                self.stats['busy_ms'] += (time.perf_counter() - started) * 1000
+
+    async def run(self, func, *args):
+        """Выполняет func(*args) в потоке хранилища и возвращает результат"""
+        with self.lock:
+            self.pending += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._call, func, args)
+
+    def submit(self, func, *args):
+        """Ставит запись в очередь без ожидания (ошибки func должна логировать сама)"""
+        with self.lock:
+            self.pending += 1
+        return self.executor.submit(self._call, func, args)
+
+    def shutdown(self):
+        """Дожидается всех поставленных записей"""
+        self.executor.shutdown(wait=True)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['busy_ms'] = round(stats['busy_ms'], 1)
+        stats['pending'] = self.pending
+        return stats
+
+
+class LoopLagMonitor:
+    """Периодически засыпает на interval и меряет, насколько позже цикл его разбудил"""
+
+    def __init__(self, interval=0.1, stall_threshold=0.05):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.stats = {'samples': 0, 'stalls': 0, 'last_ms': 0.0, 'max_ms': 0.0, 'total_ms': 0.0}
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            LOOP_LAG_SECONDS.observe(lag)
+            lag_ms = lag * 1000
+            self.stats['samples'] += 1
+            self.stats['last_ms'] = lag_ms
+            self.stats['max_ms'] = max(self.stats['max_ms'], lag_ms)
+            self.stats['total_ms'] += lag_ms
+            if lag >= self.stall_threshold:
+                self.stats['stalls'] += 1
+                logger.warning(f"🐢 Цикл событий задержан на {lag_ms:.0f} мс")
+
+    def get_stats(self):
+        stats = {key: round(value, 1) if isinstance(value, float) else value for key, value in self.stats.items()}
+        stats['avg_ms'] = round(self.stats['total_ms'] / self.stats['samples'], 2) if self.stats['samples'] else 0.0
+        return stats
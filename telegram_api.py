@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Клиент Telegram Bot API для tracker_bot.py
+Одна долгоживущая aiohttp-сессия на всё время работы бота:
+keep-alive пул соединений, кэш DNS, таймауты по методам и счётчики задержек.
+Исходящие сообщения идут через OutboundDispatcher: лимиты Telegram,
+приоритеты и повтор после 429.
+"""
+
+import asyncio
+import aiohttp
+from collections import OrderedDict
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+API_SECONDS = REGISTRY.histogram(
+    'tracker_telegram_api_seconds', 'Длительность вызовов Telegram Bot API', ('method', 'status')
+)
+
+
+def parse_timeouts(value):
+    """Разбирает строку вида 'getUpdates=40,editMessageText=5' в словарь"""
+    timeouts = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        method, seconds = item.split('=', 1)
+        try:
+            timeouts[method.strip()] = float(seconds)
+        except ValueError:
+            logger.warning(f"⚠️ Неверный таймаут для {method.strip()}: {seconds}")
+    return timeouts
+
+
+class TelegramClient:
+    """Пул соединений к api.telegram.org, общий для всех вызовов бота"""
+
+    DEFAULT_TIMEOUTS = {
+        'default': 10,
+        'answerCallbackQuery': 5,
+        'editMessageText': 10,
+        'sendMessage': 10,
+        'setWebhook': 15,
+        'getUpdates': 40,  # Должен быть больше timeout long polling (30 сек)
+    }
+
+    def __init__(self, token, timeouts=None):
+        self.base_url = f"https://api.telegram.org/bot{token}"
+
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS)
+        self.timeouts.update(parse_timeouts(os.getenv('TELEGRAM_TIMEOUTS', '')))
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        self.pool_size = int(os.getenv('TELEGRAM_POOL_SIZE', 20))
+        self.dns_ttl = int(os.getenv('TELEGRAM_DNS_TTL', 300))
+        self.keepalive = float(os.getenv('TELEGRAM_KEEPALIVE', 60))
+
+        self.session = None
+
+        # Счётчики по методам: {method: {'calls': 0, 'errors': 0, 'total_ms': 0.0, ...}}
+        self.latency = {}
+
+    async def start(self):
+        """Создаёт сессию с пулом соединений (повторный вызов ничего не делает)"""
+        if self.session and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive
+        )
+        self.session = aiohttp.ClientSession(connector=connector)
+        logger.info(f"🔌 Telegram клиент запущен (пул={self.pool_size}, DNS TTL={self.dns_ttl}с)")
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+            logger.info("🔌 Telegram клиент остановлен")
+        self.session = None
+
+    def get_timeout(self, method):
+        return self.timeouts.get(method, self.timeouts['default'])
+
+    def record(self, method, elapsed, ok):
+        """Обновляет счётчики задержек для метода"""
+        stats = self.latency.setdefault(method, {
+            'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0
+        })
+        elapsed_ms = elapsed * 1000
+        stats['calls'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['last_ms'] = elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if not ok:
+            stats['errors'] += 1
+
+    def get_stats(self):
+        """Возвращает копию счётчиков со средней задержкой"""
+        result = {}
+        for method, stats in self.latency.items():
+            result[method] = dict(stats)
+            result[method]['avg_ms'] = round(stats['total_ms'] / stats['calls'], 1) if stats['calls'] else 0.0
+        return result
+
+    async def call(self, method, payload=None, timeout=None):
+        """
+        Вызывает метод Bot API. Возвращает (status, data), где data -
+        разобранный JSON ответа или текст, если ответ не JSON.
+        Сетевые ошибки пробрасываются вызывающему коду.
+        """
+        if not self.session or self.session.closed:
+            await self.start()
+
+        url = f"{self.base_url}/{method}"
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.get_timeout(method))
+
+        started = time.monotonic()
+        status = 'error'  # Сетевая ошибка или таймаут
+        try:
+            async with self.session.post(url, json=payload or {}, timeout=client_timeout) as response:
+                status = response.status
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = await response.text()
+                return response.status, data
+        finally:
+            elapsed = time.monotonic() - started
+            self.record(method, elapsed, status == 200)
+            API_SECONDS.observe(elapsed, method=method, status=status)
+
+
+class EditFingerprintCache:
+    """
+    Отпечатки последней показанной версии сообщений: (chat_id, message_id) ->
+    хэш текста и клавиатуры. Правка, совпадающая с отпечатком, не отправляется -
+    Telegram всё равно ответил бы "message is not modified".
+    Хранятся последние max_entries сообщений.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0  # Правка пропущена (API-вызов сэкономлен)
+        self.misses = 0  # Правка отправлена
+
+    @staticmethod
+    def fingerprint(text, reply_markup=None):
+        data = json.dumps([text, reply_markup], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.blake2b(data.encode('utf-8'), digest_size=16).digest()
+
+    def unchanged(self, key, fingerprint):
+        """Совпадает ли правка с последней показанной версией (учитывается в hits/misses)"""
+        if self.entries.get(key) == fingerprint:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def remember(self, key, fingerprint):
+        self.entries[key] = fingerprint
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def forget(self, key):
+        self.entries.pop(key, None)
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'size': len(self.entries)
+        }
+
+
+class EditCoalescer:
+    """
+    Склеивает частые правки одного сообщения в один editMessageText.
+    schedule() запоминает функцию отрисовки и откладывает отправку на window секунд:
+    все нажатия за это время дают одну правку с последним состоянием.
+    Правки без изменений отсекает уже send() (EditFingerprintCache).
+    """
+
+    def __init__(self, send, window=0.4):
+        self.send = send  # async send(message_id, text, reply_markup) -> bool
+        self.window = window
+        self.pending = {}  # message_id -> render() -> (text, reply_markup)
+        self.timers = {}  # message_id -> asyncio.Task
+        self.stats = {'scheduled': 0, 'coalesced': 0, 'sent': 0, 'failed': 0}
+
+    def schedule(self, message_id, render):
+        """Ставит правку в очередь; повторные вызовы в пределах окна склеиваются"""
+        self.stats['scheduled'] += 1
+        if message_id in self.pending:
+            self.stats['coalesced'] += 1
+        self.pending[message_id] = render
+        if message_id not in self.timers:
+            self.timers[message_id] = asyncio.create_task(self._flush_later(message_id))
+
+    async def _flush_later(self, message_id):
+        try:
+            await asyncio.sleep(self.window)
+            await self.flush(message_id)
+        finally:
+            if self.timers.get(message_id) is asyncio.current_task():
+                del self.timers[message_id]
+                # Нажатия, пришедшие во время отправки, уходят следующей правкой
+                if message_id in self.pending:
+                    self.timers[message_id] = asyncio.create_task(self._flush_later(message_id))
+
+    async def flush(self, message_id):
+        """Немедленно отправляет отложенную правку (если она есть и что-то изменилось)"""
+        render = self.pending.pop(message_id, None)
+        if render is None:
+            return
+        text, reply_markup = render()
+        if await self.send(message_id, text, reply_markup):
+            self.stats['sent'] += 1
+        else:
+            self.stats['failed'] += 1
+
+    def cancel(self, message_id):
+        """Отменяет отложенную правку: сообщение сейчас перерисует другой обработчик"""
+        self.pending.pop(message_id, None)
+        timer = self.timers.pop(message_id, None)
+        if timer:
+            timer.cancel()
+
+    async def flush_all(self):
+        """Отправляет все отложенные правки (при остановке бота)"""
+        for message_id in list(self.pending):
+            timer = self.timers.pop(message_id, None)
+            if timer:
+                timer.cancel()
+            await self.flush(message_id)
+
+
+# Приоритеты исходящих вызовов (меньше - важнее)
+PRIORITY_CALLBACK = 0  # answerCallbackQuery: пользователь ждёт реакцию на кнопку
+PRIORITY_EDIT = 1  # правки чек-листа
+PRIORITY_SEND = 2  # обычные сообщения
+PRIORITY_BULK = 3  # итоги дня/недели/месяца
+
+
+class TokenBucket:
+    """Ведро токенов: rate вызовов в секунду, всплеск до capacity"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # Пауза после 429 (retry_after)
+
+    def wait_time(self, now):
+        """Сколько секунд ждать до следующего вызова (0 - можно сейчас)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, now, seconds):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class OutboundCall:
+    __slots__ = ('method', 'payload', 'chat_id', 'priority', 'seq', 'future', 'attempts', 'throttled')
+
+    def __init__(self, method, payload, chat_id, priority, seq, future):
+        self.method = method
+        self.payload = payload
+        self.chat_id = chat_id
+        self.priority = priority
+        self.seq = seq  # Порядок постановки: повтор после 429 не обгоняют более поздние вызовы
+        self.future = future
+        self.attempts = 0
+        self.throttled = False
+
+
+class OutboundDispatcher:
+    """
+    Единая очередь исходящих вызовов Bot API.
+    Общее ведро токенов (лимит бота) и ведро на каждый чат; очередь
+    с приоритетами (ответы на кнопки и правки раньше итогов). На 429
+    вызов откладывается на parameters.retry_after и повторяется.
+    """
+
+    def __init__(self, client, global_rate=None, chat_rate=None, chat_burst=None, max_retries=None, maxsize=None):
+        self.client = client
+        self.global_rate = global_rate or float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+        self.chat_rate = chat_rate or float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+        self.chat_burst = chat_burst or int(os.getenv('TELEGRAM_CHAT_BURST', 3))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('TELEGRAM_MAX_RETRIES', 3))
+        self.maxsize = maxsize or int(os.getenv('TELEGRAM_OUTBOUND_QUEUE', 1000))
+
+        self.global_bucket = TokenBucket(self.global_rate, self.global_rate)
+        self.chat_buckets = {}  # chat_id -> TokenBucket
+        self.ready = []  # куча (priority, seq, OutboundCall)
+        self.delayed = []  # куча (время повтора, seq, OutboundCall)
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.inflight = set()
+        self.stats = {'queued': 0, 'sent': 0, 'throttled': 0, 'retried': 0, 'dropped': 0, 'failed': 0}
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10):
+        """Дожидается отправки очереди (не дольше timeout) и останавливает диспетчер"""
+        deadline = time.monotonic() + timeout
+        while (self.ready or self.delayed or self.inflight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        for _, _, item in self.ready + self.delayed:
+            self._drop(item, 'остановка бота')
+        self.ready, self.delayed = [], []
+
+    def depth(self):
+        return len(self.ready) + len(self.delayed)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['depth'] = self.depth()
+        stats['inflight'] = len(self.inflight)
+        return stats
+
+    async def call(self, method, payload=None, priority=PRIORITY_SEND, chat_id=None):
+        """Ставит вызов в очередь и ждёт ответ: (status, data) как у TelegramClient.call"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        item = OutboundCall(method, payload or {}, chat_id, priority, next(self.seq), future)
+        if self.depth() >= self.maxsize:
+            self._drop(item, 'очередь переполнена')
+        else:
+            self.stats['queued'] += 1
+            heapq.heappush(self.ready, (priority, item.seq, item))
+            self.wakeup.set()
+        return await future
+
+    def _drop(self, item, reason):
+        self.stats['dropped'] += 1
+        logger.error(f"❌ Вызов {item.method} отброшен: {reason}")
+        if not item.future.done():
+            item.future.set_result((0, {'ok': False, 'description': reason}))
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_ready(self, now):
+        """Самый приоритетный вызов, который можно отправить сейчас, или время ожидания"""
+        skipped = []
+        chosen = None
+        wait = None
+        global_wait = self.global_bucket.wait_time(now)
+        while self.ready:
+            entry = heapq.heappop(self.ready)
+            item = entry[2]
+            item_wait = global_wait
+            if item.chat_id is not None:
+                item_wait = max(item_wait, self._chat_bucket(item.chat_id).wait_time(now))
+            if item_wait <= 0:
+                chosen = item
+                break
+            # Этот чат ещё на паузе - не задерживаем вызовы в другие чаты
+            if not item.throttled:
+                item.throttled = True
+                self.stats['throttled'] += 1
+            skipped.append(entry)
+            wait = item_wait if wait is None else min(wait, item_wait)
+            if global_wait > 0:
+                break
+        for entry in skipped:
+            heapq.heappush(self.ready, entry)
+        return chosen, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self.delayed and self.delayed[0][0] <= now:
+                _, _, item = heapq.heappop(self.delayed)
+                heapq.heappush(self.ready, (item.priority, item.seq, item))
+
+            item, wait = self._next_ready(now) if self.ready else (None, None)
+            if item is None:
+                if self.delayed:
+                    delayed_wait = self.delayed[0][0] - now
+                    wait = delayed_wait if wait is None else min(wait, delayed_wait)
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.global_bucket.take()
+            if item.chat_id is not None:
+                self._chat_bucket(item.chat_id).take()
+            task = asyncio.create_task(self._send(item))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+
+    async def _send(self, item):
+        item.attempts += 1
+        try:
+            status, data = await self.client.call(item.method, item.payload)
+        except Exception as e:
+            self.stats['failed'] += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+
+        if status == 429 and item.attempts <= self.max_retries:
+            retry_after = 1
+            if isinstance(data, dict):
+                retry_after = (data.get('parameters') or {}).get('retry_after', 1)
+            now = time.monotonic()
+            # Пауза касается всего чата (или всего бота для вызовов без чата)
+            bucket = self._chat_bucket(item.chat_id) if item.chat_id is not None else self.global_bucket
+            bucket.block(now, retry_after)
+            self.stats['retried'] += 1
+            logger.warning(f"⏳ 429 на {item.method}, повтор через {retry_after}с (попытка {item.attempts})")
+            heapq.heappush(self.delayed, (now + retry_after, item.seq, item))
+            self.wakeup.set()
+            return
+
+        if status == 429:
+            self._drop(item, f"429 после {item.attempts} попыток")
+            return
+
+        self.stats['sent' if status == 200 else 'failed'] += 1
+        if not item.future.done():
+            item.future.set_result((status, data))
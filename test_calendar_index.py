@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""CalendarIndex против прежнего линейного перебора из notifier.py"""
+
+from calendar import monthcalendar
+from datetime import date, timedelta
+
+from calendar_index import CalendarIndex
+
+BIRTHDAYS = {
+    'дедушка Коля (день памяти)': (1, 1),
+    'Илюша': (31, 12),
+    'Високосный Вася': (29, 2),
+    'Годовщина свадьбы': (28, 2),
+    'Марта': (1, 3),
+}
+
+RECURRING_EVENTS = {
+    'tarelka': {'name': 'Путешествие на тарелке', 'rule': 'last_saturday'},
+    'chronos': {'name': 'Вечер воспоминаний', 'rule': 'third_saturday'},
+    'games': {'name': 'Игры', 'rule': 'second_saturday'},
+}
+
+
+# === Прежняя реализация (перебор по каждому запросу) ===
+
+def old_last_day_of_month(year, month, target_weekday):
+    for week in reversed(monthcalendar(year, month)):
+        if week[target_weekday] != 0:
+            return week[target_weekday]
+    return None
+
+
+def old_event_date_by_rule(rule, year, month):
+    if rule == 'last_saturday':
+        day = old_last_day_of_month(year, month, 5)
+        return date(year, month, day) if day else None
+    saturdays = [week[5] for week in monthcalendar(year, month) if week[5] != 0]
+    if rule == 'third_saturday' and len(saturdays) >= 3:
+        return date(year, month, saturdays[2])
+    if rule == 'second_saturday' and len(saturdays) >= 2:
+        return date(year, month, saturdays[1])
+    return None
+
+
+def old_birthdays_on(day):
+    return sorted(name for name, (d, m) in BIRTHDAYS.items() if day.day == d and day.month == m)
+
+
+def old_traditions_on(day):
+    return sorted(key for key, event in RECURRING_EVENTS.items()
+                  if old_event_date_by_rule(event['rule'], day.year, day.month) == day)
+
+
+def every_day(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def test_events_on_matches_linear_scan():
+    index = CalendarIndex(BIRTHDAYS, RECURRING_EVENTS)
+    for day in every_day(date(2023, 1, 1), date(2029, 1, 1)):
+        events = index.events_on(day)
+        birthdays = sorted(e['name'] for e in events if e['kind'] != 'tradition')
+        traditions = sorted(e['key'] for e in events if e['kind'] == 'tradition')
+
+        expected = old_birthdays_on(day)
+        if day.month == 2 and day.day == 28 and day.year % 4:
+            # 29 февраля в невисокосный год переносится на 28-е
+            expected = sorted(expected + ['Високосный Вася'])
+        assert birthdays == expected, day
+        assert traditions == old_traditions_on(day), day
+
+
+def test_leap_day_birthday():
+    index = CalendarIndex(BIRTHDAYS, {})
+    assert [e['name'] for e in index.events_on(date(2024, 2, 29))] == ['Високосный Вася']
+    assert 'Високосный Вася' not in [e['name'] for e in index.events_on(date(2024, 2, 28))]
+    assert sorted(e['name'] for e in index.events_on(date(2025, 2, 28))) == ['Високосный Вася', 'Годовщина свадьбы']
+    assert index.next_occurrence('Високосный Вася', date(2024, 3, 1)) == date(2025, 2, 28)
+    assert index.next_occurrence('Високосный Вася', date(2027, 3, 1)) == date(2028, 2, 29)
+
+
+def test_year_boundary():
+    index = CalendarIndex(BIRTHDAYS, RECURRING_EVENTS)
+    window = index.upcoming(date(2024, 12, 30), 3)
+    assert [(day, event['name']) for day, event in window] == [
+        (date(2024, 12, 31), 'Илюша'),
+        (date(2025, 1, 1), 'дедушка Коля (день памяти)'),
+    ]
+    assert index.events_on(date(2025, 1, 1))[0]['kind'] == 'memorial'
+    assert index.next_occurrence('Илюша', date(2025, 1, 1)) == date(2025, 12, 31)
+    # Последняя суббота декабря 2024 - 28-е; дальше только январь следующего года
+    assert index.next_occurrence('tarelka', date(2024, 12, 29)) == date(2025, 1, 25)
+
+
+def test_next_occurrence_matches_linear_scan():
+    index = CalendarIndex(BIRTHDAYS, RECURRING_EVENTS)
+    for start in every_day(date(2024, 1, 1), date(2026, 12, 31)):
+        for key, event in RECURRING_EVENTS.items():
+            # Перебор по месяцам вперёд от start
+            expected = None
+            year, month = start.year, start.month
+            while expected is None:
+                candidate = old_event_date_by_rule(event['rule'], year, month)
+                if candidate and candidate >= start:
+                    expected = candidate
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            assert index.next_occurrence(key, start) == expected, (key, start)
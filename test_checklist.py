@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""SectionParser: якорь «мудрость дня» и конец секций"""
+
+from checklist import ANCHOR, END, TASK, SectionParser
+
+
+def test_exact_wisdom_marker_ends_section():
+    parsed = SectionParser().tokenize('☀️ <b>Дневные задачи:</b>\n• Зарядка\n\n💡 <b>Мудрость дня</b>\n• Цитата')
+
+    assert parsed.tasks['day'] == ('Зарядка',)
+    assert [kind for kind, _, _, _ in parsed.tokens][3] == ANCHOR
+
+
+def test_anchor_in_other_case_keeps_section_open():
+    # Как в старом parse_tasks: секцию закрывает только точное 'Мудрость дня'
+    text = '☀️ Дневные задачи:\n• Зарядка\nМУДРОСТЬ ДНЯ\n• Чтение\n• мудрость дня - выучить\n🙏 Утренняя молитва\n• Не задача'
+    parsed = SectionParser().tokenize(text)
+
+    assert parsed.tasks['day'] == ('Зарядка', 'Чтение', 'мудрость дня - выучить')
+    kinds = [(kind, section) for kind, section, _, _ in parsed.tokens]
+    assert kinds == [
+        ('section', 'day'), (TASK, 'day'), (ANCHOR, None), (TASK, 'day'),
+        (ANCHOR, 'day'),  # Якорь на строке задачи: и место прогресса, и задача
+        (END, None), ('text', None),
+    ]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""JobScheduler с подменёнными часами: сроки, порядок в куче, догоняющий запуск"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import heapq
+
+from scheduler import DailyAt, JobScheduler
+
+MSK = timezone(timedelta(hours=3), 'MSK')
+
+
+class FakeClockScheduler(JobScheduler):
+    def __init__(self, state_file, clock):
+        self.clock = clock
+        super().__init__(state_file, tz=MSK)
+
+    def now(self):
+        return self.clock[0]
+
+
+def at(day, hour, minute=0):
+    return datetime(2025, 3, day, hour, minute, tzinfo=MSK)
+
+
+def recorder(calls, name):
+    async def func(scheduled_at):
+        calls.append((name, scheduled_at))
+    return func
+
+
+def test_next_after_and_last_before():
+    rule = DailyAt(7, 30, tz=MSK)
+    assert rule.next_after(at(3, 7, 29)) == at(3, 7, 30)
+    assert rule.next_after(at(3, 7, 30)) == at(4, 7, 30)  # Строго после
+    assert rule.last_before(at(3, 7, 30)) == at(3, 7, 30)
+    assert rule.last_before(at(3, 7, 29)) == at(2, 7, 30)
+
+    # 3 марта 2025 - понедельник; игры по пятницам, уборка по воскресеньям
+    assert DailyAt(19, 0, weekdays=[4], tz=MSK).next_after(at(3, 12)) == at(7, 19)
+    assert DailyAt(10, 0, weekdays=[6], tz=MSK).last_before(at(3, 12)) == at(2, 10)
+    assert DailyAt(9, 0, when=lambda day: day.day == 1, tz=MSK).next_after(at(3, 12)) == datetime(2025, 4, 1, 9, 0, tzinfo=MSK)
+
+
+def test_heap_orders_by_deadline_then_registration(tmp_path):
+    clock = [at(3, 12)]
+    scheduler = FakeClockScheduler(str(tmp_path / 'state.json'), clock)
+    calls = []
+    scheduler.add('evening', DailyAt(20, 0, tz=MSK), recorder(calls, 'evening'))
+    scheduler.add('games', DailyAt(19, 0, weekdays=[4], tz=MSK), recorder(calls, 'games'))
+    scheduler.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'))
+    scheduler.add('gratitude', DailyAt(20, 0, tz=MSK), recorder(calls, 'gratitude'))
+
+    order = [heapq.heappop(scheduler.heap)[3].name for _ in range(4)]
+    assert order == ['evening', 'gratitude', 'morning', 'games']
+
+
+def test_missed_run_is_caught_up_once(tmp_path):
+    state_file = str(tmp_path / 'state.json')
+    clock = [at(3, 7, 0)]
+    scheduler = FakeClockScheduler(state_file, clock)
+    calls = []
+    scheduler.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'), catchup=3600)
+    asyncio.run(scheduler.catch_up())  # Первый запуск: только запоминаем прошлый срок
+    assert calls == []
+    assert scheduler.last_run['morning'] == at(2, 7, 30)
+
+    # Бот был выключен в 7:30 и поднялся в 7:50
+    clock[0] = at(3, 7, 50)
+    restarted = FakeClockScheduler(state_file, clock)
+    restarted.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'), catchup=3600)
+    asyncio.run(restarted.catch_up())
+    asyncio.run(restarted.catch_up())
+    assert calls == [('morning', at(3, 7, 30))]
+
+    # Ещё один перезапуск - запуск уже отмечен в файле состояния
+    again = FakeClockScheduler(state_file, clock)
+    again.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'), catchup=3600)
+    asyncio.run(again.catch_up())
+    assert calls == [('morning', at(3, 7, 30))]
+    assert again.next_deadline() == at(4, 7, 30)
+
+
+def test_too_old_missed_run_is_skipped(tmp_path):
+    state_file = str(tmp_path / 'state.json')
+    clock = [at(2, 8, 0)]
+    scheduler = FakeClockScheduler(state_file, clock)
+    calls = []
+    scheduler.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'), catchup=3600)
+    asyncio.run(scheduler.catch_up())
+
+    clock[0] = at(3, 9, 0)
+    restarted = FakeClockScheduler(state_file, clock)
+    restarted.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'), catchup=3600)
+    asyncio.run(restarted.catch_up())
+    assert calls == []
+
+
+def test_run_loop_does_not_repeat_caught_up_run(tmp_path):
+    state_file = str(tmp_path / 'state.json')
+    clock = [at(2, 8, 0)]
+    scheduler = FakeClockScheduler(state_file, clock)
+    scheduler.add('morning', DailyAt(7, 30, tz=MSK), recorder([], 'morning'), catchup=3600)
+    asyncio.run(scheduler.catch_up())
+
+    clock[0] = at(3, 7, 45)
+    calls = []
+
+    async def scenario():
+        restarted = FakeClockScheduler(state_file, clock)
+        restarted.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'), catchup=3600)
+        restarted.add('reminder', DailyAt(7, 40, tz=MSK), recorder(calls, 'reminder'))
+        task = asyncio.create_task(restarted.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return restarted
+
+    restarted = asyncio.run(scenario())
+    # Утро догнали один раз; 7:40 новой задачи уже прошло до её регистрации - не запускаем
+    assert calls == [('morning', at(3, 7, 30))]
+    assert restarted.next_deadline() == at(4, 7, 30)
+
+
+def test_run_loop_fires_due_job_once_and_reschedules(tmp_path):
+    clock = [at(3, 7, 29)]
+    calls = []
+
+    async def scenario():
+        scheduler = FakeClockScheduler(str(tmp_path / 'state.json'), clock)
+        scheduler.add('morning', DailyAt(7, 30, tz=MSK), recorder(calls, 'morning'))
+        clock[0] = at(3, 7, 31)  # Срок наступил
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert calls == [('morning', at(3, 7, 30))]
+    assert scheduler.next_deadline() == at(4, 7, 30)
+    assert FakeClockScheduler(scheduler.state_file, clock).last_run == {'morning': at(3, 7, 30)}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Проигрывание журнала MessageStateStore поверх снимка"""
+
+import json
+import time
+
+from state_store import BoundedMessageStates, MessageStateStore, TrackedMessage
+
+TASKS = {'morning': ['Зарядка', 'Завтрак'], 'day': ['Работа', 'Спорт', 'Чтение']}
+
+
+def make_store(tmp_path):
+    return MessageStateStore(str(tmp_path / 'message_states.json'))
+
+
+def write_journal(store, records, tail=''):
+    with open(store.journal_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.write(tail)
+
+
+def dump(states):
+    return {message_id: (message.task_dict(), message.completed_dict(), message.original_text)
+            for message_id, message in states.items()}
+
+
+def test_snapshot_and_journal_with_truncated_last_line(tmp_path):
+    store = make_store(tmp_path)
+    states = BoundedMessageStates()
+    states[1] = TrackedMessage(TASKS, {'day': [1]}, original_text='1')
+    store.compact(states)
+
+    write_journal(store, [
+        {'op': 'toggle', 'id': 1, 'period': 'morning', 'idx': 0, 'done': True},
+        {'op': 'put', 'id': 2, 'state': TrackedMessage(TASKS, original_text='2').to_dict()},
+        {'op': 'toggle', 'id': 2, 'period': 'day', 'idx': 2, 'done': True},
+    ], tail='{"op":"toggle","id":1,"period":"day","idx":1,"do')
+
+    loaded = make_store(tmp_path).load()
+
+    assert sorted(loaded.items_by_id) == [1, 2]
+    assert loaded[1].completed_dict() == {'morning': [0], 'day': [1], 'cant_do': [], 'evening': []}
+    assert loaded[2].completed_list('day') == [2]
+    assert loaded[2].task_dict() == dict(TASKS, cant_do=[], evening=[])
+
+
+def test_replaying_journal_twice_gives_same_state(tmp_path):
+    store = make_store(tmp_path)
+    states = BoundedMessageStates()
+    states[1] = TrackedMessage(TASKS, original_text='1')
+    store.compact(states)
+
+    records = [
+        {'op': 'toggle', 'id': 1, 'period': 'day', 'idx': 0, 'done': True},
+        {'op': 'toggle', 'id': 1, 'period': 'day', 'idx': 1, 'done': True},
+        {'op': 'toggle', 'id': 1, 'period': 'day', 'idx': 0, 'done': False},
+        {'op': 'update', 'id': 1, 'fields': {'original_text': '1 (изменено)'}},
+        {'op': 'toggle', 'id': 404, 'period': 'day', 'idx': 0, 'done': True},  # Неизвестное сообщение
+    ]
+    write_journal(store, records)
+    once = make_store(tmp_path).load()
+
+    # Сбой между записью снимка и очисткой журнала: журнал проигрывается ещё раз
+    store.compact(once)
+    write_journal(store, records)
+    twice = make_store(tmp_path).load()
+
+    assert dump(twice) == dump(once)
+    assert once[1].completed_list('day') == [1]
+    assert once[1].original_text == '1 (изменено)'
+
+
+def test_evict_records_are_replayed(tmp_path):
+    store = make_store(tmp_path)
+    states = BoundedMessageStates(max_entries=2)
+    for message_id in (1, 2, 3):
+        states[message_id] = TrackedMessage(TASKS, original_text=str(message_id))
+        store.append({'op': 'put', 'id': message_id, 'state': states[message_id].to_dict()})
+
+    assert store.evict(states) == [1]
+    store.close()
+
+    loaded = MessageStateStore(store.snapshot_path, max_entries=10).load()
+    assert sorted(loaded.items_by_id) == [2, 3]
+
+
+def test_load_expires_old_states(tmp_path):
+    store = make_store(tmp_path)
+    states = BoundedMessageStates()
+    states[1] = TrackedMessage(TASKS, original_text='1', created=time.time() - 30 * 86400)
+    states[2] = TrackedMessage(TASKS, original_text='2')
+    store.compact(states)
+
+    loaded = make_store(tmp_path).load()
+    assert sorted(loaded.items_by_id) == [2]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Инкрементальные StatsAggregates.update против полного rebuild()"""
+
+from datetime import date, timedelta
+import random
+
+from stats_aggregates import StatsAggregates
+from stats_store import JSONStatsBackend
+
+
+class MemoryStatsBackend:
+    """Бэкенд в памяти: в случайном прогоне проверяется арифметика, а не запись на диск"""
+
+    def __init__(self):
+        self.days = {}
+
+    def get_day(self, day_key):
+        return self.days.get(day_key)
+
+    def put_day(self, day_key, data):
+        self.days[day_key] = data
+
+    def get_range(self, start_key, end_key):
+        return {k: self.days[k] for k in sorted(self.days) if start_key <= k <= end_key}
+
+    def all_days(self):
+        return {k: self.days[k] for k in sorted(self.days)}
+
+
+class MemoryAggregates(StatsAggregates):
+    def save(self):
+        pass  # Без атомарной записи с fsync на каждое обновление
+
+
+def random_day(rng):
+    percentage = rng.choice([0, 35, 69, 70, 71, 100, rng.randint(0, 100)])
+    return {
+        'percentage': percentage,
+        'points': percentage // 10,
+        'max_points': 10,
+        'cant_do': {'completed': list(range(rng.randint(0, 3)))}
+    }
+
+
+def check_against_rebuild(tmp_path, seed, operations):
+    rng = random.Random(seed)
+    backend = MemoryStatsBackend()
+    aggregates = MemoryAggregates(str(tmp_path / f'aggregates-{seed}.json'), backend)
+    aggregates.ensure()
+
+    # Конец декабря - начало марта: границы недели, месяца, года и февраль
+    start = date(2024, 12, 20)
+    pool = [(start + timedelta(days=offset)).isoformat() for offset in range(75)]
+    for step in range(operations):
+        # Чаще пишем последние дни (как в жизни), иногда переписываем старые
+        day_key = pool[min(len(pool) - 1, step // 6 + rng.randint(-3, 1))] if rng.random() < 0.8 else rng.choice(pool)
+        previous = backend.get_day(day_key)
+        day_data = random_day(rng)
+        backend.put_day(day_key, day_data)
+        aggregates.update(day_key, previous, day_data)
+
+    rebuilt = MemoryAggregates(str(tmp_path / f'rebuilt-{seed}.json'), backend)
+    rebuilt.rebuild()
+    assert aggregates.data == rebuilt.data
+
+
+def test_update_matches_rebuild(tmp_path):
+    for seed in range(2):
+        check_against_rebuild(tmp_path, seed, 300)
+
+
+def test_overwriting_extremes_and_streak_matches_rebuild(tmp_path):
+    backend = JSONStatsBackend(str(tmp_path / 'stats.json'))
+    aggregates = StatsAggregates(str(tmp_path / 'aggregates.json'), backend)
+    aggregates.ensure()
+
+    saves = [
+        ('2025-01-30', 80), ('2025-01-31', 90), ('2025-02-01', 75),
+        ('2025-01-31', 10),  # Лучший день месяца стал худшим, серия разорвана
+        ('2025-01-31', 70),  # Серия снова склеена
+        ('2025-01-30', 50),
+    ]
+    for day_key, percentage in saves:
+        previous = backend.get_day(day_key)
+        day_data = {'percentage': percentage, 'points': 0, 'max_points': 0}
+        backend.put_day(day_key, day_data)
+        aggregates.update(day_key, previous, day_data)
+
+    rebuilt = StatsAggregates(str(tmp_path / 'rebuilt.json'), backend)
+    rebuilt.rebuild()
+    assert aggregates.data == rebuilt.data
+    assert aggregates.month('2025-01')['best'] == ['2025-01-31', 70]
+    assert aggregates.current_streak('2025-02-01') == 2
+
+
+def test_snapshot_copies_only_the_day_slice(tmp_path):
+    backend = JSONStatsBackend(str(tmp_path / 'stats.json'))
+    aggregates = StatsAggregates(str(tmp_path / 'aggregates.json'), backend)
+    aggregates.ensure()
+    for day_key in ('2023-06-01', '2024-12-30', '2024-12-31', '2025-01-01', '2025-01-02'):
+        day_data = {'percentage': 80, 'points': 1, 'max_points': 1}
+        backend.put_day(day_key, day_data)
+        aggregates.update(day_key, None, day_data)
+
+    view = aggregates.snapshot('2024-12-31')
+    assert view.week('2024-12-31') == aggregates.week('2024-12-31')  # Неделя 2025-W01
+    assert view.month('2024-12') == aggregates.month('2024-12')
+    assert view.year('2024') == aggregates.year('2024')
+    assert view.current_streak('2024-12-31') == aggregates.current_streak('2024-12-31')
+    assert view.longest_streak() == 4
+    assert view.month('2023-06') is None and view.year('2025') is None
+
+    view.month('2024-12')['sum'] = -1  # Копия отвязана от живых агрегатов
+    assert aggregates.month('2024-12')['sum'] == 160
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""ArchivedStatsBackend поверх JSONStatsBackend: архивация, чтения, холодный файл"""
+
+from datetime import date
+import gzip
+import json
+
+from stats_aggregates import StatsAggregates, day_fails
+from stats_archive import ArchivedStatsBackend
+from stats_store import JSONStatsBackend
+
+TODAY = date(2025, 3, 15)  # Горизонт 30 дней: в архив уходят месяцы до января включительно
+
+
+def full_day(percentage, fails=0):
+    return {
+        'percentage': percentage,
+        'points': percentage // 10,
+        'max_points': 10,
+        'day': {'completed': [0, 1], 'total': 3},
+        'cant_do': {'completed': list(range(fails)), 'total': 2}
+    }
+
+
+DAYS = {
+    '2024-12-31': full_day(90, fails=1),
+    '2025-01-01': full_day(40),
+    '2025-01-31': full_day(75, fails=2),
+    '2025-02-01': full_day(80),
+    '2025-03-14': full_day(100),
+}
+
+
+def make_backend(tmp_path, cold=True):
+    hot = JSONStatsBackend(str(tmp_path / 'stats.json'))
+    for day_key, day_data in DAYS.items():
+        hot.put_day(day_key, day_data)
+    cold_path = str(tmp_path / 'stats_cold.jsonl.gz') if cold else None
+    return ArchivedStatsBackend(hot, str(tmp_path / 'stats_archive.json'), cold_path)
+
+
+def test_archive_moves_old_months_then_deletes_hot_days(tmp_path):
+    backend = make_backend(tmp_path)
+    assert backend.archive(30, today=TODAY) == 3
+
+    assert sorted(backend.hot.all_days()) == ['2025-02-01', '2025-03-14']
+    with open(tmp_path / 'stats_archive.json', encoding='utf-8') as f:
+        archived = json.load(f)['months']
+    assert sorted(archived) == ['2024-12', '2025-01']
+    assert archived['2025-01']['days'] == {'2025-01-01': [40, 4, 10, 0], '2025-01-31': [75, 7, 10, 2]}
+
+    # Перезапуск: архив читается с диска, повторная архивация ничего не переносит
+    reopened = ArchivedStatsBackend(backend.hot, str(tmp_path / 'stats_archive.json'))
+    assert reopened.count() == len(DAYS)
+    assert sorted(reopened.all_days()) == sorted(DAYS)
+    assert reopened.archive(30, today=TODAY) == 0
+
+
+def test_broken_archive_is_not_overwritten(tmp_path):
+    (tmp_path / 'stats_archive.json').write_text('{"version": 1, "months": {', encoding='utf-8')
+    backend = make_backend(tmp_path)
+
+    assert backend.broken
+    assert backend.archive(30, today=TODAY) == 0
+    assert (tmp_path / 'stats_archive.json').read_text(encoding='utf-8') == '{"version": 1, "months": {'
+    assert sorted(backend.all_days()) == sorted(DAYS)  # Горячие дни на месте
+
+
+def test_hot_day_overrides_archived_day(tmp_path):
+    backend = make_backend(tmp_path)
+    backend.archive(30, today=TODAY)
+    assert backend.get_day('2025-01-01')['archived']
+
+    # Правка архивного дня ложится в горячее хранилище и перекрывает архив
+    backend.put_day('2025-01-01', full_day(95))
+    assert backend.get_day('2025-01-01')['percentage'] == 95
+    assert 'archived' not in backend.get_day('2025-01-01')
+
+    days = backend.get_range('2024-12-31', '2025-02-01')
+    assert list(days) == ['2024-12-31', '2025-01-01', '2025-01-31', '2025-02-01']
+    assert [day['percentage'] for day in days.values()] == [90, 95, 75, 80]
+    assert days['2024-12-31']['archived'] and 'archived' not in days['2025-02-01']
+    assert backend.get_day('2025-01-15') is None
+
+
+def test_archived_days_keep_fails_for_aggregates(tmp_path):
+    backend = make_backend(tmp_path)
+    plain = StatsAggregates(str(tmp_path / 'plain.json'), backend.hot)
+    plain.rebuild()
+
+    backend.archive(30, today=TODAY)
+    archived = backend.get_day('2025-01-31')
+    assert 'cant_do' not in archived and day_fails(archived) == 2
+
+    rebuilt = StatsAggregates(str(tmp_path / 'archived.json'), backend)
+    rebuilt.rebuild()
+    assert rebuilt.data == plain.data
+    assert rebuilt.month('2025-01')['fails'] == 2
+
+
+def test_get_range_detail_reads_cold_file(tmp_path):
+    backend = make_backend(tmp_path)
+    backend.archive(30, keep_detail=True, today=TODAY)
+    # Вторая архивация - новый gzip-член в том же файле
+    backend.put_day('2025-02-10', full_day(60, fails=1))
+    assert backend.archive(30, keep_detail=True, today=date(2025, 4, 15)) == 2
+
+    compact = backend.get_range('2025-01-01', '2025-02-28')
+    assert all(day['archived'] for day in compact.values())
+    detailed = backend.get_range('2025-01-01', '2025-02-28', detail=True)
+    assert detailed == {k: DAYS.get(k, full_day(60, fails=1)) for k in ('2025-01-01', '2025-01-31', '2025-02-01', '2025-02-10')}
+
+    # Оборванный хвост холодного файла: прочитанное до него остаётся верным
+    with open(tmp_path / 'stats_cold.jsonl.gz', 'ab') as f:
+        f.write(gzip.compress(b'{"day":"2025-02-11","data":{}}\n')[:15])
+    assert backend.get_range('2025-01-01', '2025-01-31', detail=True) == {k: DAYS[k] for k in ('2025-01-01', '2025-01-31')}
+
+
+def test_detail_without_cold_file_falls_back_to_compact(tmp_path):
+    backend = make_backend(tmp_path, cold=False)
+    backend.archive(30, keep_detail=True, today=TODAY)
+    days = backend.get_range('2025-01-01', '2025-01-31', detail=True)
+    assert [day['percentage'] for day in days.values()] == [40, 75]
+    assert all(day['archived'] for day in days.values())
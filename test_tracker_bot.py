@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""TaskTrackerBot.process_update: ответ чек-листом на сообщение с задачами"""
+
+import asyncio
+
+import tracker_bot
+
+TASKS_MESSAGE = '☀️ <b>Дневные задачи:</b>\n• Зарядка\n• Чтение\n\n⛔ <b>Нельзя делать:</b>\n• Сладкое'
+
+
+def test_task_message_gets_checklist_in_the_same_chat(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('TELEGRAM_TOKEN', 'test')
+    monkeypatch.setenv('TELEGRAM_CHAT_IDS', '100,200')
+    calls = []
+
+    async def fake_call(method, payload, priority, chat_id=None):
+        calls.append((method, payload))
+        return 200, {'ok': True}
+
+    async def scenario():
+        bot = tracker_bot.TaskTrackerBot()
+        bot.outbound.call = fake_call
+        try:
+            await bot.process_update({'update_id': 1, 'channel_post': {
+                'message_id': 7, 'chat': {'id': 200, 'type': 'channel'}, 'text': TASKS_MESSAGE
+            }})
+        finally:
+            bot.storage.shutdown()
+
+    asyncio.run(scenario())
+
+    assert len(calls) == 1
+    method, payload = calls[0]
+    assert method == 'sendMessage'
+    assert payload['chat_id'] == '200'
+    assert '☆ Зарядка' in payload['text'] and '☆ НЕ Сладкое' in payload['text']
+    callbacks = [row[0]['callback_data'] for row in payload['reply_markup']['inline_keyboard']]
+    assert 'toggle_day_1' in callbacks and 'toggle_cant_do_0' in callbacks
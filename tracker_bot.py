@@ -9,230 +9,150 @@ Telegram бот для отслеживания выполнения задач
 """
 
 import asyncio
-import aiohttp
 from aiohttp import web
 import json
 import logging
 from datetime import datetime, timedelta
 import os
 import re
+import sys
+import time
+
+from stats_store import SQLiteStatsBackend, migrate_json_stats
+from stats_aggregates import STREAK_THRESHOLD, StatsAggregates, bucket_average
+from chat_shards import ChatRegistry, chat_ids_from_env, chat_paths, open_stats_backend
+from checklist import ANCHOR, PROGRESS, ChecklistRenderer, SectionParser
+from state_store import TrackedMessage
+from telegram_api import (PRIORITY_BULK, PRIORITY_CALLBACK, PRIORITY_EDIT, PRIORITY_SEND,
+                          EditCoalescer, EditFingerprintCache, OutboundDispatcher, TelegramClient)
+from scheduler import DailyAt, JobScheduler
+from update_queue import UpdateWorkerPool, update_type
+from polling import UpdatePoller
+from metrics import CONTENT_TYPE, REGISTRY
+from profiler import UpdateProfiler
+from storage_io import LoopLagMonitor, StorageExecutor
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    'tracker_webhook_seconds', 'Длительность ответа на webhook (проверка и постановка в очередь)', ('update_type',)
+)
+
 class TaskTrackerBot:
     def __init__(self):
         self.telegram_token = os.getenv('TELEGRAM_TOKEN', '')
         if not self.telegram_token:
             raise ValueError("❌ TELEGRAM_TOKEN не найден в переменных окружения!")
         
-        self.chat_id = os.getenv('TELEGRAM_CHAT_ID', '')
-        if not self.chat_id:
-            raise ValueError("❌ TELEGRAM_CHAT_ID не найден в переменных окружения!")
+        chat_ids = chat_ids_from_env()
+        if not chat_ids:
+            raise ValueError("❌ TELEGRAM_CHAT_ID (или TELEGRAM_CHAT_IDS) не найден в переменных окружения!")
+        
+        # Файлы и SQLite - в отдельном потоке, цикл событий не ждёт диск
+        self.storage = StorageExecutor()
+        self.loop_lag = LoopLagMonitor(interval=float(os.getenv('LOOP_LAG_INTERVAL', 0.1)))
+        
+        # Данные каждого чата - отдельный шард: статистика, агрегаты, состояния сообщений
+        # {chat_id: ChatShard}, загружаются при первом обращении, выгружаются после простоя
+        self.chats = ChatRegistry(
+            chat_ids,
+            data_dir=os.getenv('CHAT_DATA_DIR', 'chats'),
+            idle_timeout=int(os.getenv('CHAT_IDLE_TIMEOUT', 1800)),
+            max_entries=int(os.getenv('STATE_MAX_ENTRIES', 200)),
+            max_age_days=int(os.getenv('STATE_MAX_AGE_DAYS', 7)),
+            io=self.storage
+        )
+        self.chat_id = self.chats.primary
+        # Итоги по чатам рассылаются параллельно, но не больше SUMMARY_CONCURRENCY одновременно
+        self.summary_concurrency = int(os.getenv('SUMMARY_CONCURRENCY', 4))
+        self.state_compact_interval = int(os.getenv('STATE_COMPACT_INTERVAL', 300))
+        # Месяцы старше STATS_ARCHIVE_DAYS дней уходят в архив (0 - не архивировать)
+        self.archive_days = int(os.getenv('STATS_ARCHIVE_DAYS', 180))
+        self.archive_detail = os.getenv('STATS_ARCHIVE_DETAIL', '0') == '1'
+        
+        # Парсер секций с кэшем разбора (одно утреннее сообщение не парсится дважды)
+        self.parser = SectionParser(cache_size=int(os.getenv('PARSE_CACHE_SIZE', 64)))
+        
+        # Общий клиент Telegram API (сессия создаётся в run())
+        self.api = TelegramClient(self.telegram_token)
+        # Исходящие сообщения: лимиты Telegram, приоритеты и повтор после 429
+        self.outbound = OutboundDispatcher(self.api)
+        
+        # Очередь входящих обновлений: webhook отвечает сразу, обработка - в воркерах
+        self.webhook_secret = os.getenv('WEBHOOK_SECRET', '')
+        self.updates = UpdateWorkerPool(
+            self.handle_update,
+            workers=int(os.getenv('UPDATE_WORKERS', 16)),
+            maxsize=int(os.getenv('UPDATE_QUEUE_SIZE', 1000))
+        )
+        
+        # Режим получения обновлений: webhook при публичном адресе, иначе long polling
+        self.update_mode = self.select_update_mode()
+        self.poller = None
+        if self.update_mode == 'polling':
+            self.poller = UpdatePoller(
+                self.api,
+                self.updates,
+                os.getenv('UPDATE_OFFSET_FILE', 'update_offset.json'),
+                timeout=int(os.getenv('POLLING_TIMEOUT', 30)),
+                io=self.storage
+            )
+            self.updates.on_done = self.poller.done
         
-        self.stats_file = "stats.json"
-        self.message_state_file = "message_states.json"
-        self.last_update_id = 0
+        # Планировщик итогов (сроки и отметки запусков в scheduler_state.json)
+        self.scheduler = JobScheduler(os.getenv('SCHEDULER_STATE_FILE', 'scheduler_state.json'))
         
-        # Хранилище текущего состояния для каждого сообщения
-        # {message_id: {'morning': [0,1,2], 'day': [0], 'evening': [], 'original_text': '...'}}
-        self.message_state = self.load_message_states()
+        # Отпечатки показанных версий сообщений: правка без изменений не отправляется
+        self.edit_cache = EditFingerprintCache(max_entries=int(os.getenv('EDIT_CACHE_SIZE', 1000)))
+        
+        # Быстрые нажатия на звёздочки склеиваются в одну правку сообщения (ключ - (chat_id, message_id))
+        self.edits = EditCoalescer(
+            lambda key, text, reply_markup: self.edit_message(key[0], key[1], text, reply_markup),
+            window=int(os.getenv('EDIT_DEBOUNCE_MS', 400)) / 1000
+        )
+        
+        # Выборочное профилирование обработки обновлений (PROFILE_SAMPLE_EVERY или окно через /admin/profile)
+        self.profiler = UpdateProfiler.from_env(self.storage)
+        self.admin_token = os.getenv('ADMIN_TOKEN', '')
+        
+        # Очереди, состояния и счётчики снимаются в момент опроса /metrics
+        REGISTRY.add_collector(self.collect_metrics)
         
     def parse_tasks(self, message_text):
         """Парсит задачи из сообщения notifier.py"""
-        tasks = {
-            'morning': [],  # Оставляем для обратной совместимости, но не используем
-            'day': [],
-            'cant_do': [],  # Новая секция "Нельзя делать"
-            'evening': []
-        }
-        
-        lines = message_text.split('\n')
-        current_section = None
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Определяем секцию (убираем HTML теги для проверки)
-            clean_line = line.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '')
-            
-            # НАЧАЛО СЕКЦИЙ (включаем парсинг)
-            if ('📋' in clean_line or '☀️' in clean_line) and 'Дневн' in clean_line:
-                current_section = 'day'
-                continue
-            elif any(marker in clean_line for marker in ['⛔', '⛔️', 'Нельзя делать']):
-                current_section = 'cant_do'
-                continue
-            elif ('🌙' in clean_line and 'Вечерн' in clean_line) or ('📋' in clean_line and 'Вечерн' in clean_line) or 'Вечерние задачи' in clean_line:
-                current_section = 'evening'
-                continue
-            
-            # КОНЕЦ СЕКЦИЙ (выключаем парсинг)
-            elif any(marker in clean_line for marker in [
-                'Мудрость дня',
-                '🙏 Утренняя молитва',
-                '🎉 СЕГОДНЯ',
-                '📅 События',
-                'Занятия детей'  # НОВОЕ: пропускаем расписание детей
-            ]):
-                current_section = None
-                continue
-            
-            # Собираем задачи
-            if current_section and line.startswith('•'):
-                task_text = line[1:].strip()  # Убираем •
-                if task_text:
-                    tasks[current_section].append(task_text)
-        
+        tasks = self.parser.parse(message_text).task_dict()
         logger.info(f"📋 Распарсено задач: день={len(tasks['day'])}, нельзя={len(tasks['cant_do'])}, вечер={len(tasks['evening'])}")
         return tasks
     
     def create_checklist_keyboard(self, tasks, completed):
         """Создаёт inline-клавиатуру с задачами"""
-        keyboard = []
-        
-        # Дневные задачи
-        if tasks['day']:
-            keyboard.append([{'text': '☀️ ДНЕВНЫЕ ЗАДАЧИ', 'callback_data': 'header'}])
-            for idx, task in enumerate(tasks['day']):
-                is_done = idx in completed.get('day', [])
-                emoji = '⭐' if is_done else '☆'
-                # Обрезаем длинный текст для кнопки
-                short_task = task[:35] + '...' if len(task) > 35 else task
-                keyboard.append([{
-                    'text': f'{emoji} {idx+1}. {short_task}',
-                    'callback_data': f'toggle_day_{idx}'
-                }])
-        
-        # Нельзя делать
-        if tasks['cant_do']:
-            keyboard.append([{'text': '⛔ НЕЛЬЗЯ ДЕЛАТЬ', 'callback_data': 'header'}])
-            for idx, task in enumerate(tasks['cant_do']):
-                is_done = idx in completed.get('cant_do', [])
-                emoji = '⭐' if is_done else '☆'
-                short_task = task[:32] + '...' if len(task) > 32 else task
-                keyboard.append([{
-                    'text': f'{emoji} {idx+1}. НЕ {short_task}',
-                    'callback_data': f'toggle_cant_do_{idx}'
-                }])
-        
-        # Вечерние задачи  
-        if tasks['evening']:
-            keyboard.append([{'text': '🌙 ВЕЧЕРНИЕ ЗАДАЧИ', 'callback_data': 'header'}])
-            for idx, task in enumerate(tasks['evening']):
-                is_done = idx in completed.get('evening', [])
-                emoji = '⭐' if is_done else '☆'
-                short_task = task[:35] + '...' if len(task) > 35 else task
-                keyboard.append([{
-                    'text': f'{emoji} {idx+1}. {short_task}',
-                    'callback_data': f'toggle_evening_{idx}'
-                }])
-        
-        # Кнопки управления
-        keyboard.append([
-            {'text': '💾 Сохранить', 'callback_data': 'save_progress'},
-            {'text': '❌ Отмена', 'callback_data': 'cancel_update'}
-        ])
-        
-        return {'inline_keyboard': keyboard}
+        return ChecklistRenderer(tasks, completed, self.get_progress_bar).keyboard()
     
     def format_checklist_message(self, tasks, completed):
         """Форматирует текст сообщения с чек-листом"""
-        msg = "✅ <b>Отметь выполненные задачи:</b>\n"
-        
-        total_tasks = 0
-        total_done = 0
-        
-        if tasks['day']:
-            msg += "\n☀️ <b>ДНЕВНЫЕ:</b>\n"
-            for idx, task in enumerate(tasks['day']):
-                emoji = '⭐' if idx in completed.get('day', []) else '☆'
-                msg += f"{emoji} {task}\n"
-                total_tasks += 1
-                if idx in completed.get('day', []):
-                    total_done += 1
-        
-        if tasks['cant_do']:
-            msg += "\n⛔ <b>НЕЛЬЗЯ ДЕЛАТЬ:</b>\n"
-            for idx, task in enumerate(tasks['cant_do']):
-                emoji = '⭐' if idx in completed.get('cant_do', []) else '☆'
-                msg += f"{emoji} НЕ {task}\n"
-                total_tasks += 1
-                if idx in completed.get('cant_do', []):
-                    total_done += 1
-        
-        if tasks['evening']:
-            msg += "\n🌙 <b>ВЕЧЕРНИЕ:</b>\n"
-            for idx, task in enumerate(tasks['evening']):
-                emoji = '⭐' if idx in completed.get('evening', []) else '☆'
-                msg += f"{emoji} {task}\n"
-                total_tasks += 1
-                if idx in completed.get('evening', []):
-                    total_done += 1
-        
-        # Прогресс
-        percentage = int((total_done / total_tasks * 100)) if total_tasks > 0 else 0
-        bar = self.get_progress_bar(percentage)
-        msg += f"\n📊 <b>Прогресс:</b> {bar} {total_done}/{total_tasks} ({percentage}%)\n"
-        
-        return msg
+        return ChecklistRenderer(tasks, completed, self.get_progress_bar).text()
     
     def update_original_message_with_progress(self, original_text, tasks, completed):
         """ЭТАП 3: Обновляет исходное сообщение с прогресс-барами"""
-        lines = original_text.split('\n')
-        
-        # ШАГ 1: ОЧИСТКА - удаляем ВСЕ старые прогресс-бары и галочки
-        cleaned_lines = []
-        for line in lines:
-            stripped = line.strip()
-            
-            # Пропускаем старые прогресс-бары
-            if stripped.startswith('📊') or stripped.startswith('🎯 Общий прогресс'):
-                continue
-            
-            # Убираем старые звёздочки из задач
-            if line.startswith('•') and '⭐' in line:
-                # Удаляем все звёздочки и восстанавливаем оригинал
-                cleaned = line.replace('⭐ ', '').replace(' ⭐', '')
-                # Убираем лишние пробелы
-                parts = cleaned.split('•', 1)
-                if len(parts) == 2:
-                    cleaned = '• ' + parts[1].strip()
-                cleaned_lines.append(cleaned)
-            else:
-                cleaned_lines.append(line)
-        
-        # ШАГ 2: ДОБАВЛЕНИЕ - добавляем новые прогресс-бары и галочки
         updated_lines = []
-        current_section = None
         task_counters = {'morning': 0, 'day': 0, 'cant_do': 0, 'evening': 0}
         
-        for line in cleaned_lines:
-            clean_line = line.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '')
-            
-            # Определяем секцию
-            if ('📋' in clean_line or '☀️' in clean_line) and 'Дневн' in clean_line:
-                current_section = 'day'
-                updated_lines.append(line)
-                continue
-            elif 'Вечерние задачи' in clean_line or ('🌙' in clean_line and 'Вечерн' in clean_line) or ('📋' in clean_line and 'Вечерн' in clean_line):
-                current_section = 'evening'
-                updated_lines.append(line)
-                continue
-            elif any(marker in clean_line for marker in ['⛔', '⛔️', 'Нельзя делать']):
-                current_section = 'cant_do'
-                updated_lines.append(line)
+        # Один проход по токенам разбора (берётся из кэша парсера)
+        for kind, section, line, task_text in self.parser.parse(original_text).tokens:
+            # Пропускаем старые прогресс-бары
+            if kind == PROGRESS:
                 continue
-            elif 'мудрость' in clean_line.lower() and 'дня' in clean_line.lower():
-                current_section = None
-                
+            
+            if kind == ANCHOR:
+                # Перед "Мудростью дня" вставляем общий прогресс
                 total_done = 0
                 total_tasks = 0
                 
-                for section in ['morning', 'day', 'evening']:
-                    if len(tasks[section]) > 0:
-                        total_done += len(completed.get(section, []))
-                        total_tasks += len(tasks[section])
+                for period in ['morning', 'day', 'evening']:
+                    if len(tasks[period]) > 0:
+                        total_done += len(completed.get(period, []))
+                        total_tasks += len(tasks[period])
                 
                 if total_tasks > 0:
                     total_perc = int((total_done / total_tasks * 100))
@@ -240,85 +160,44 @@ class TaskTrackerBot:
                     updated_lines.append(f"🎯 <b>Общий прогресс:</b> {total_bar} {total_done}/{total_tasks} ({total_perc}%)")
                 
                 updated_lines.append("")
-                updated_lines.append(line)
-                continue
+                if task_text is None:
+                    updated_lines.append(line)
+                    continue
             
-            # Обрабатываем задачи
-            if current_section and line.startswith('•'):
-                idx = task_counters[current_section]
-                is_done = idx in completed.get(current_section, [])
-                
-                # Получаем чистый текст задачи (без • и звёздочек)
-                task_text = line[1:].strip()  # Убираем •
-                task_text = task_text.replace('⭐ ', '').replace(' ⭐', '').replace('⭐', '')  # Убираем ВСЕ звёздочки
-                task_text = task_text.replace('☆ ', '').replace(' ☆', '').replace('☆', '')  # И пустые тоже
-                task_text = task_text.strip()  # Убираем лишние пробелы
+            if task_text is not None:
+                # Задача (в том числе на строке якоря внутри открытой секции)
+                idx = task_counters[section]
+                is_done = idx in completed.get(section, [])
                 
-                if is_done:
-                    # Только жёлтая звёздочка, без •
-                    updated_lines.append(f"⭐ {task_text}")
-                else:
-                    # Пустая звёздочка, без •
-                    updated_lines.append(f"☆ {task_text}")
+                # Чистый текст задачи (без звёздочек)
+                clean_task = task_text.replace('⭐ ', '').replace(' ⭐', '').replace('⭐', '')
+                clean_task = clean_task.replace('☆ ', '').replace(' ☆', '').replace('☆', '')
+                clean_task = clean_task.strip()
                 
-                task_counters[current_section] += 1
+                # Жёлтая или пустая звёздочка, без •
+                updated_lines.append(f"{'⭐' if is_done else '☆'} {clean_task}")
+                task_counters[section] += 1
+            
+            elif line.startswith('•') and '⭐' in line:
+                # Убираем старые звёздочки из строк вне секций
+                cleaned = line.replace('⭐ ', '').replace(' ⭐', '')
+                parts = cleaned.split('•', 1)
+                updated_lines.append('• ' + parts[1].strip())
+            
             else:
                 updated_lines.append(line)
         
         return '\n'.join(updated_lines)
     
-    def load_stats(self):
-        """Загружает статистику из файла"""
-        try:
-            if os.path.exists(self.stats_file):
-                with open(self.stats_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Убираем _info и _format если они есть
-                    data = json.loads(content)
-                    # Фильтруем только реальные даты
-                    stats = {k: v for k, v in data.items() if k not in ['_info', '_format'] and '-' in k}
-                    return stats
-            return {}
-        except Exception as e:
-            logger.error(f"❌ Ошибка загрузки статистики: {e}")
-            return {}
-    
-    def save_stats(self, stats):
-        """Сохраняет статистику в файл"""
-        try:
-            with open(self.stats_file, 'w', encoding='utf-8') as f:
-                json.dump(stats, f, ensure_ascii=False, indent=2)
-            logger.info("✅ Статистика сохранена")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения статистики: {e}")
-            return False
-    
-    def load_message_states(self):
-        """Загружает состояния сообщений из файла"""
-        try:
-            if os.path.exists(self.message_state_file):
-                with open(self.message_state_file, 'r', encoding='utf-8') as f:
-                    # Преобразуем строковые ключи обратно в int
-                    data = json.load(f)
-                    return {int(k): v for k, v in data.items()}
-            return {}
-        except Exception as e:
-            logger.error(f"❌ Ошибка загрузки состояний сообщений: {e}")
-            return {}
+    async def compact_message_states_loop(self):
+        """Фоновое вытеснение устаревших состояний, уплотнение журналов и выгрузка простаивающих чатов"""
+        while True:
+            await asyncio.sleep(self.state_compact_interval)
+            await self.chats.maintain(busy=self.chat_has_pending_edits)
     
-    def save_message_states(self):
-        """Сохраняет состояния сообщений в файл"""
-        try:
-            # Преобразуем int ключи в строки для JSON
-            data = {str(k): v for k, v in self.message_state.items()}
-            with open(self.message_state_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.info("✅ Состояния сообщений сохранены")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения состояний сообщений: {e}")
-            return False
+    def chat_has_pending_edits(self, chat_id):
+        """Есть ли у чата отложенные правки (такой чат не выгружаем)"""
+        return any(key[0] == chat_id for key in list(self.edits.pending) + list(self.edits.timers))
     
     def get_today_key(self):
         """Возвращает ключ для сегодняшнего дня"""
@@ -378,7 +257,7 @@ class TaskTrackerBot:
         else:
             return "🔥"  # Слабовато
     
-    async def send_penalty_message(self, cant_do_count, failed_tasks):
+    async def send_penalty_message(self, chat, cant_do_count, failed_tasks):
         """НОВОЕ: Отправляет штрафное сообщение сразу после сохранения"""
         try:
             pushups = cant_do_count * 30
@@ -397,39 +276,27 @@ class TaskTrackerBot:
             penalty_msg += f"🏋️ Отжимания {pushups} раз <i>(Штраф за {cant_do_count} срыв{'а' if cant_do_count > 1 else ''})</i>\n\n"
             penalty_msg += f"Держись крепче! 💪"
             
-            await self.send_telegram_message(penalty_msg)
+            await self.send_telegram_message(penalty_msg, chat_id=chat.chat_id)
             logger.info(f"⚠️ Отправлено штрафное сообщение: {pushups} отжиманий")
             
         except Exception as e:
             logger.error(f"❌ Ошибка отправки штрафного сообщения: {e}")
     
-    async def send_daily_summary(self):
+    async def send_daily_summary(self, chat, at=None):
         """ЭТАП 4: Отправляет итоги дня в 23:00 - НОВЫЙ ДИЗАЙН"""
-        stats = self.load_stats()
-        today_key = self.get_today_key()
+        at = at or datetime.now()
+        today_key = at.strftime("%Y-%m-%d")
+        today_data = await chat.load_day_stats(today_key)
         
-        if today_key not in stats:
+        if not today_data:
             logger.info("📊 Нет данных за сегодня для итогов")
             return
         
-        today_data = stats[today_key]
-        
-        # ОТЛАДКА: Логируем что приходит в today_data
-        logger.info(f"📊 DEBUG today_data: {today_data}")
-        logger.info(f"📊 DEBUG points={today_data.get('points')}, max_points={today_data.get('max_points')}")
-        
         # Получаем данные по секциям
-        morning = today_data.get('morning', {})
         day = today_data.get('day', {})
         evening = today_data.get('evening', {})
         cant_do = today_data.get('cant_do', {})
         
-        # ОТЛАДКА: Логируем каждую секцию
-        logger.info(f"📊 DEBUG morning: completed={morning.get('completed', [])}, total={morning.get('total', 0)}")
-        logger.info(f"📊 DEBUG day: completed={day.get('completed', [])}, total={day.get('total', 0)}")
-        logger.info(f"📊 DEBUG evening: completed={evening.get('completed', [])}, total={evening.get('total', 0)}")
-        logger.info(f"📊 DEBUG cant_do: completed={cant_do.get('completed', [])}, total={cant_do.get('total', 0)}")
-        
         # НОВАЯ ЛОГИКА: Считаем ТОЛЬКО полезные задачи (без НЕЛЬЗЯ)
         day_done = len(day.get('completed', []))
         day_total = day.get('total', 0)
@@ -448,7 +315,7 @@ class TaskTrackerBot:
         logger.info(f"📊 CALCULATED: day={day_done}/{day_total}, evening={evening_done}/{evening_total}, total={overall_done}/{overall_total} ({overall_perc}%)")
         
         # === ФОРМИРУЕМ СООБЩЕНИЕ ===
-        message = f"📊 <b>ИТОГИ ДНЯ — {datetime.now().strftime('%d.%m.%Y')}</b>\n\n"
+        message = f"📊 <b>ИТОГИ ДНЯ — {at.strftime('%d.%m.%Y')}</b>\n\n"
         
         # ДЕНЬ
         if day_total > 0:
@@ -474,73 +341,51 @@ class TaskTrackerBot:
         else:
             message += f"⛔ Срывов в НЕЛЬЗЯ: 0 ✅\n"
         
+        # Серия дней 70%+ (из агрегатов, по всей истории)
+        aggregates = await chat.read_aggregates(today_key)
+        streak = aggregates.current_streak(today_key)
+        if streak > 0:
+            message += f"🔥 Дней подряд {STREAK_THRESHOLD}%+: {streak}\n"
+        
         message += "\n━━━━━━━━━━━━━━━━━━━━━\n\n"
         
         # МОТИВАЦИЯ (с детальной градацией)
         message += self.get_motivation(overall_perc)
         
         # Отправляем
-        await self.send_telegram_message(message)
+        await self.send_telegram_message(message, priority=PRIORITY_BULK, chat_id=chat.chat_id)
         logger.info(f"📊 Итоги дня отправлены: {overall_perc}% (day={day_done}/{day_total}, evening={evening_done}/{evening_total})")
     
-    async def send_weekly_summary(self):
+    async def send_weekly_summary(self, chat, at=None):
         """ЭТАП 4: Отправляет итоги недели в воскресенье 23:00"""
-        stats = self.load_stats()
-        
-        # Получаем последние 7 дней
-        today = datetime.now()
-        week_data = []
-        
-        for i in range(6, -1, -1):
-            day = today - timedelta(days=i)
-            day_key = day.strftime("%Y-%m-%d")
-            day_name = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'][day.weekday()]
-            
-            if day_key in stats:
-                percentage = stats[day_key].get('percentage', 0)
-                week_data.append({
-                    'name': day_name,
-                    'percentage': percentage,
-                    'date': day.strftime('%d.%m')
-                })
-            else:
-                week_data.append({
-                    'name': day_name,
-                    'percentage': 0,
-                    'date': day.strftime('%d.%m')
-                })
+        # Проценты по дням недели берём из агрегатов (без чтения статистики)
+        today = at or datetime.now()
+        today_key = today.strftime("%Y-%m-%d")
+        aggregates = await chat.read_aggregates(today_key)
+        week = aggregates.week(today_key)
+        week_start_day = today - timedelta(days=today.weekday())
         
         # Формируем сообщение
-        week_start = (today - timedelta(days=6)).strftime('%d.%m')
-        week_end = today.strftime('%d.%m')
+        week_start = week_start_day.strftime('%d.%m')
+        week_end = (week_start_day + timedelta(days=6)).strftime('%d.%m')
         
         message = f"📈 <b>ИТОГИ НЕДЕЛИ</b>\n"
         message += f"{week_start} - {week_end}.{today.year}\n\n"
         message += "━━━━━━━━━━━━━━━━━━\n\n"
         
-        total_percentage = 0
-        streak = 0
-        current_streak = 0
-        
-        for day_data in week_data:
-            perc = day_data['percentage']
+        for day_name, perc in zip(['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'], week['pct']):
+            perc = perc or 0
             bar = self.get_progress_bar(perc)
-            message += f"{day_data['name']}: {bar} {perc}%\n"
-            
-            total_percentage += perc
-            
-            # Считаем streak (дни подряд с 70%+)
-            if perc >= 70:
-                current_streak += 1
-                streak = max(streak, current_streak)
-            else:
-                current_streak = 0
+            message += f"{day_name}: {bar} {perc}%\n"
         
-        avg_percentage = int(total_percentage / 7) if week_data else 0
+        # Дни без данных считаются как 0%
+        avg_percentage = int(week['sum'] / 7)
+        streak = aggregates.current_streak(today_key)
         
         message += "\n━━━━━━━━━━━━━━━━━━\n"
         message += f"📊 Средний результат: {avg_percentage}%\n"
-        message += f"🔥 Дней подряд 70%+: {streak}\n\n"
+        message += f"🔥 Дней подряд {STREAK_THRESHOLD}%+: {streak}\n"
+        message += f"🏆 Рекорд серии: {aggregates.longest_streak()}\n\n"
         
         if avg_percentage >= 80:
             message += "🏆 Отличная неделя!\nТак держать! 💪"
@@ -551,52 +396,146 @@ class TaskTrackerBot:
         else:
             message += "📈 Есть над чем работать!\nСледующая неделя будет лучше! 💪"
         
-        await self.send_telegram_message(message)
+        await self.send_telegram_message(message, priority=PRIORITY_BULK, chat_id=chat.chat_id)
         logger.info(f"📊 Итоги недели отправлены: средний {avg_percentage}%")
     
-    async def check_schedule(self):
-        """Проверяет расписание для отправки итогов"""
-        now = datetime.now()
-        
-        # Итоги дня в 23:00
-        if now.hour == 23 and now.minute == 0:
-            logger.info("⏰ Время для итогов дня")
-            await self.send_daily_summary()
-            
-            # Итоги недели в воскресенье
-            if now.weekday() == 6:  # Воскресенье
-                logger.info("⏰ Время для итогов недели")
-                await asyncio.sleep(60)  # Подождём минуту после итогов дня
-                await self.send_weekly_summary()
+    def format_period_summary(self, aggregates, title, bucket, days_in_period):
+        """Общая часть итогов месяца/года из агрегатов"""
+        avg_percentage = bucket_average(bucket)
+        message = f"{title}\n\n"
+        message += "━━━━━━━━━━━━━━━━━━\n\n"
+        message += f"📊 Средний результат: {self.get_progress_bar(avg_percentage)} {avg_percentage}%\n"
+        message += f"📅 Дней с отметками: {bucket['count']} из {days_in_period}\n"
+        message += f"✅ Дней {STREAK_THRESHOLD}%+: {bucket['good']}\n"
+        message += f"🎯 Задач выполнено: {bucket['points']} из {bucket['max_points']}\n"
+        message += f"⛔ Срывов в НЕЛЬЗЯ: {bucket['fails']}\n"
+        if bucket['best']:
+            best_day, best_perc = bucket['best']
+            message += f"🌟 Лучший день: {datetime.strptime(best_day, '%Y-%m-%d').strftime('%d.%m')} — {best_perc}%\n"
+        if bucket['worst']:
+            worst_day, worst_perc = bucket['worst']
+            message += f"🌧 Худший день: {datetime.strptime(worst_day, '%Y-%m-%d').strftime('%d.%m')} — {worst_perc}%\n"
+        message += f"🏆 Рекорд серии {STREAK_THRESHOLD}%+: {aggregates.longest_streak()}\n"
+        return message, avg_percentage
+    
+    async def send_monthly_summary(self, chat, at=None):
+        """Отправляет итоги месяца в последний день месяца 23:00"""
+        today = at or datetime.now()
+        aggregates = await chat.read_aggregates(today.strftime('%Y-%m-%d'))
+        bucket = aggregates.month(today.strftime('%Y-%m'))
+        if not bucket or not bucket['count']:
+            logger.info("📊 Нет данных за месяц для итогов")
+            return
+        
+        month_name = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь', 'Июль',
+                      'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'][today.month - 1]
+        days_in_month = (today.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        message, avg_percentage = self.format_period_summary(
+            aggregates, f"🗓 <b>ИТОГИ МЕСЯЦА — {month_name} {today.year}</b>", bucket, days_in_month.day
+        )
+        
+        await self.send_telegram_message(message, priority=PRIORITY_BULK, chat_id=chat.chat_id)
+        logger.info(f"📊 Итоги месяца отправлены: средний {avg_percentage}%")
+    
+    async def send_yearly_summary(self, chat, at=None):
+        """Отправляет итоги года 31 декабря в 23:00"""
+        today = at or datetime.now()
+        aggregates = await chat.read_aggregates(today.strftime('%Y-%m-%d'))
+        bucket = aggregates.year(str(today.year))
+        if not bucket or not bucket['count']:
+            logger.info("📊 Нет данных за год для итогов")
+            return
+        
+        days_in_year = 366 if (today.year % 4 == 0 and today.year % 100 != 0) or today.year % 400 == 0 else 365
+        message, avg_percentage = self.format_period_summary(
+            aggregates, f"🎆 <b>ИТОГИ ГОДА — {today.year}</b>", bucket, days_in_year
+        )
+        
+        # Средний результат по месяцам
+        message += "\n"
+        for month in range(1, 13):
+            month_bucket = aggregates.month(f"{today.year}-{month:02d}")
+            if month_bucket and month_bucket['count']:
+                perc = bucket_average(month_bucket)
+                message += f"{month:02d}: {self.get_progress_bar(perc)} {perc}%\n"
+        
+        await self.send_telegram_message(message, priority=PRIORITY_BULK, chat_id=chat.chat_id)
+        logger.info(f"📊 Итоги года отправлены: средний {avg_percentage}%")
     
-    async def send_telegram_message(self, message):
-        """Отправляет сообщение в Telegram"""
+    async def fan_out(self, summary, at):
+        """Отправляет итоги во все разрешённые чаты (не больше summary_concurrency одновременно)"""
+        semaphore = asyncio.Semaphore(self.summary_concurrency)
+        
+        async def run_for_chat(chat_id):
+            async with semaphore:
+                try:
+                    await summary(await self.chats.get(chat_id), at)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка итогов для чата {chat_id}: {e}", exc_info=True)
+        
+        await asyncio.gather(*(run_for_chat(chat_id) for chat_id in self.chats.chat_ids))
+    
+    def register_jobs(self):
+        """Регистрирует итоги в планировщике (при одном сроке: день, неделя, месяц, год)"""
+        catchup = int(os.getenv('SUMMARY_CATCHUP_HOURS', 12)) * 3600
+        jobs = [
+            # Итоги дня в 23:00
+            ('daily_summary', DailyAt(23, 0), self.send_daily_summary),
+            # Итоги недели в воскресенье 23:00
+            ('weekly_summary', DailyAt(23, 0, weekdays=[6]), self.send_weekly_summary),
+            # Итоги месяца в последний день месяца 23:00
+            ('monthly_summary', DailyAt(23, 0, when=lambda d: (d + timedelta(days=1)).day == 1), self.send_monthly_summary),
+            # Итоги года 31 декабря 23:00
+            ('yearly_summary', DailyAt(23, 0, when=lambda d: d.month == 12 and d.day == 31), self.send_yearly_summary),
+        ]
+        for name, rule, summary in jobs:
+            self.scheduler.add(name, rule, lambda at, summary=summary: self.fan_out(summary, at), catchup=catchup)
+        
+        if self.archive_days > 0:
+            # Архивация старой статистики ночью, когда отметок нет
+            self.scheduler.add('archive_stats', DailyAt(4, 0), lambda at: self.fan_out(self.archive_stats, at), catchup=catchup)
+    
+    async def archive_stats(self, chat, at=None):
+        """Переносит старые месяцы статистики чата в архив"""
+        archived = await chat.archive_stats(self.archive_days, self.archive_detail)
+        if archived:
+            logger.info(f"🗄️ Чат {chat.chat_id}: в архив перенесено дней: {archived}")
+    
+    async def send_telegram_message(self, message, priority=PRIORITY_SEND, chat_id=None, reply_markup=None):
+        """Отправляет сообщение в Telegram (через очередь исходящих; по умолчанию - в основной чат)"""
+        chat_id = chat_id or self.chat_id
         try:
-            url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
             payload = {
-                'chat_id': self.chat_id,
+                'chat_id': chat_id,
                 'text': message,
                 'parse_mode': 'HTML'
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info("✅ Сообщение отправлено")
-                        return True
-                    else:
-                        logger.error(f"❌ Ошибка отправки: {response.status}")
-                        return False
+            if reply_markup:
+                payload['reply_markup'] = reply_markup
+            
+            status, data = await self.outbound.call('sendMessage', payload, priority, chat_id=chat_id)
+            if status == 200:
+                logger.info("✅ Сообщение отправлено")
+                return True
+            else:
+                logger.error(f"❌ Ошибка отправки: {status} - {data}")
+                return False
         except Exception as e:
             logger.error(f"❌ Ошибка: {e}")
             return False
     
-    async def edit_message(self, message_id, text, reply_markup=None):
-        """Редактирует сообщение"""
+    async def edit_message(self, chat_id, message_id, text, reply_markup=None):
+        """Редактирует сообщение (если текст или клавиатура отличаются от показанных)"""
+        key = (str(chat_id), message_id)
+        fingerprint = self.edit_cache.fingerprint(text, reply_markup)
+        if self.edit_cache.unchanged(key, fingerprint):
+            logger.info("⏭️ Сообщение не изменилось, правка пропущена")
+            return True
+        
         try:
-            url = f"https://api.telegram.org/bot{self.telegram_token}/editMessageText"
             payload = {
-                'chat_id': self.chat_id,
+                'chat_id': chat_id,
                 'message_id': message_id,
                 'text': text,
                 'parse_mode': 'HTML'
@@ -605,42 +544,46 @@ class TaskTrackerBot:
             if reply_markup:
                 payload['reply_markup'] = reply_markup
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info("✅ Сообщение обновлено")
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"❌ Ошибка обновления: {response.status} - {error_text}")
-                        return False
+            status, data = await self.outbound.call('editMessageText', payload, PRIORITY_EDIT, chat_id=chat_id)
+            if status == 200:
+                self.edit_cache.remember(key, fingerprint)
+                logger.info("✅ Сообщение обновлено")
+                return True
+            elif status == 400 and 'message is not modified' in str(data):
+                # Сообщение уже в этом виде (например, после перезапуска) - запоминаем и не считаем ошибкой
+                self.edit_cache.remember(key, fingerprint)
+                return True
+            else:
+                self.edit_cache.forget(key)
+                logger.error(f"❌ Ошибка обновления: {status} - {data}")
+                return False
         except Exception as e:
+            # Неизвестно, дошла ли правка - следующую отправляем без сравнения
+            self.edit_cache.forget(key)
             logger.error(f"❌ Ошибка: {e}")
             return False
     
     async def answer_callback_query(self, callback_query_id, text=None):
         """Отвечает на callback query"""
         try:
-            url = f"https://api.telegram.org/bot{self.telegram_token}/answerCallbackQuery"
             payload = {'callback_query_id': callback_query_id}
             
             if text:
                 payload['text'] = text
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, timeout=10) as response:
-                    return response.status == 200
+            status, data = await self.outbound.call('answerCallbackQuery', payload, PRIORITY_CALLBACK)
+            return status == 200
         except Exception as e:
             logger.error(f"❌ Ошибка: {e}")
             return False
     
-    async def process_callback(self, callback_data, callback_query_id, message_id, message_text):
+    async def process_callback(self, chat, callback_data, callback_query_id, message_id, message_text):
         """Обрабатывает callback от кнопок"""
         logger.info(f"📞 Получен callback: {callback_data}")
         
         if callback_data == 'update_progress':
             # Показываем чек-лист
-            await self.show_checklist(message_id, message_text)
+            await self.show_checklist(chat, message_id, message_text)
             await self.answer_callback_query(callback_query_id, "Отметь выполненные задачи ✅")
         
         elif callback_data.startswith('toggle_'):
@@ -656,33 +599,32 @@ class TaskTrackerBot:
                 period = parts[1]  # day/evening
                 task_idx = int(parts[2])
             
-            await self.toggle_task(message_id, period, task_idx)
+            await self.toggle_task(chat, message_id, period, task_idx)
             await self.answer_callback_query(callback_query_id)
         
         elif callback_data == 'save_progress':
             # Сохраняем прогресс
-            await self.save_progress(message_id)
+            await self.save_progress(chat, message_id)
             await self.answer_callback_query(callback_query_id, "✅ Прогресс сохранён!")
         
         elif callback_data == 'cancel_update':
             # Отменяем обновление
-            await self.cancel_update(message_id)
+            await self.cancel_update(chat, message_id)
             await self.answer_callback_query(callback_query_id, "❌ Отменено")
         
         elif callback_data == 'header':
             # Заголовки не кликабельны
             await self.answer_callback_query(callback_query_id)
     
-    async def show_checklist(self, message_id, original_message):
+    async def show_checklist(self, chat, message_id, original_message):
         """Показывает чек-лист для отметки задач"""
         
         # Если состояние уже существует, используем сохранённый оригинал
-        if message_id in self.message_state:
+        if message_id in chat.message_state:
             # Используем уже сохранённые данные
-            state = self.message_state[message_id]
-            text = self.format_checklist_message(state['tasks'], state['completed'])
-            keyboard = self.create_checklist_keyboard(state['tasks'], state['completed'])
-            await self.edit_message(message_id, text, keyboard)
+            self.edits.cancel((chat.chat_id, message_id))
+            text, keyboard = self.render_checklist(chat.message_state[message_id])
+            await self.edit_message(chat.chat_id, message_id, text, keyboard)
             return
         
         # Первый вызов - парсим задачи из оригинального сообщения
@@ -701,17 +643,16 @@ class TaskTrackerBot:
                     [{'text': '❌ Закрыть', 'callback_data': 'cancel_update'}]
                 ]
             }
-            await self.edit_message(message_id, error_text, keyboard)
+            await self.edit_message(chat.chat_id, message_id, error_text, keyboard)
             return
         
         # Загружаем существующий прогресс за сегодня
         today_key = self.get_today_key()
-        stats = self.load_stats()
+        existing = await chat.load_day_stats(today_key)
         
         # Проверяем есть ли уже данные за сегодня
-        if today_key in stats:
+        if existing:
             # Загружаем существующие выполненные задачи
-            existing = stats[today_key]
             completed = {
                 'morning': existing.get('morning', {}).get('completed', []),
                 'day': existing.get('day', {}).get('completed', []),
@@ -723,145 +664,152 @@ class TaskTrackerBot:
             # Новый день, начинаем с нуля
             completed = {'morning': [], 'day': [], 'cant_do': [], 'evening': []}
         
-        # Сохраняем состояние
-        self.message_state[message_id] = {
-            'tasks': tasks,
-            'completed': completed,
-            'original_text': original_message,  # Сохраняем ЧИСТЫЙ оригинал
-            'clean_original': original_message  # Дублируем для безопасности
-        }
+        # Сохраняем состояние (ЧИСТЫЙ оригинал хранится один раз)
+        state = TrackedMessage(tasks, completed, original_text=original_message)
+        chat.message_state[message_id] = state
+        
+        # Записываем в журнал
+        await chat.journal_message_state({'op': 'put', 'id': message_id, 'state': state.to_dict()})
         
-        # Сохраняем в файл
-        self.save_message_states()
+        # Не даём хранилищу расти бесконечно
+        await chat.evict_message_states()
         
-        # Формируем сообщение и клавиатуру
-        text = self.format_checklist_message(tasks, completed)
-        keyboard = self.create_checklist_keyboard(tasks, completed)
+        # Формируем сообщение и клавиатуру (рендерер остаётся в состоянии для переключений)
+        text, keyboard = self.render_checklist(state)
         
-        await self.edit_message(message_id, text, keyboard)
+        await self.edit_message(chat.chat_id, message_id, text, keyboard)
+    
+    def render_checklist(self, state):
+        """Текст и клавиатура чек-листа; рендерер создаётся один раз на сообщение"""
+        if state.view is None:
+            state.view = ChecklistRenderer(state.task_view(), state.completed_dict(), self.get_progress_bar)
+        return state.view.text(), state.view.keyboard()
     
-    async def toggle_task(self, message_id, period, task_idx):
+    async def toggle_task(self, chat, message_id, period, task_idx):
         """Переключает статус задачи"""
-        if message_id not in self.message_state:
+        if message_id not in chat.message_state:
             logger.error(f"❌ Состояние для сообщения {message_id} не найдено")
             return
         
-        state = self.message_state[message_id]
-        completed = state['completed'][period]
+        state = chat.message_state[message_id]
         
         # Переключаем
-        if task_idx in completed:
-            completed.remove(task_idx)
-            logger.info(f"☐ Задача {period}[{task_idx}] снята")
-        else:
-            completed.append(task_idx)
+        done = state.toggle(period, task_idx)
+        if done:
             logger.info(f"☑ Задача {period}[{task_idx}] отмечена")
+        else:
+            logger.info(f"☐ Задача {period}[{task_idx}] снята")
         
-        # Сохраняем в файл
-        self.save_message_states()
+        # Записываем в журнал (до ответа пользователю)
+        await chat.journal_message_state({'op': 'toggle', 'id': message_id, 'period': period, 'idx': task_idx, 'done': done})
         
-        # Обновляем сообщение
-        text = self.format_checklist_message(state['tasks'], state['completed'])
-        keyboard = self.create_checklist_keyboard(state['tasks'], state['completed'])
-        await self.edit_message(message_id, text, keyboard)
+        # Обновляем сообщение: правка отложена и склеивается с соседними нажатиями
+        self.edits.schedule((chat.chat_id, message_id), lambda: self.render_checklist(state))
     
-    async def save_progress(self, message_id):
-        """Сохраняет прогресс в stats.json"""
-        if message_id not in self.message_state:
+    async def save_progress(self, chat, message_id):
+        """Сохраняет прогресс в статистику чата"""
+        if message_id not in chat.message_state:
             logger.error(f"❌ Состояние для сообщения {message_id} не найдено")
             return
         
-        state = self.message_state[message_id]
-        today_key = self.get_today_key()
-        
-        # Загружаем статистику
-        stats = self.load_stats()
+        # Отложенная правка чек-листа больше не нужна - сообщение перерисуется ниже
+        self.edits.cancel((chat.chat_id, message_id))
         
-        # ЗАПОМИНАЕМ старое количество срывов ДО объединения (для проверки дублирования штрафов)
-        previous_cant_do_count = 0
-        if today_key in stats and 'cant_do' in stats[today_key]:
-            previous_cant_do_count = len(stats[today_key]['cant_do'].get('completed', []))
+        state = chat.message_state[message_id]
+        tasks = state.task_dict()
+        completed = state.completed_dict()
+        today_key = self.get_today_key()
         
-        # ВАЖНО: Объединяем с существующими данными за сегодня!
-        if today_key in stats:
-            # Уже есть данные за сегодня - объединяем
-            existing = stats[today_key]
+        # Чтение-изменение-запись статистики дня под блокировкой дня:
+        # два сохранения разных сообщений за один день не теряют отметки друг друга
+        async with chat.day_locks.hold(today_key):
+            # Загружаем статистику за сегодня
+            existing = await chat.load_day_stats(today_key)
             
-            # Объединяем выполненные задачи (убираем дубликаты)
-            for period in ['morning', 'day', 'cant_do', 'evening']:
-                existing_completed = set(existing.get(period, {}).get('completed', []))
-                new_completed = set(state['completed'][period])
-                # Объединяем множества
-                combined_completed = list(existing_completed | new_completed)
-                
-                # Обновляем
-                state['completed'][period] = combined_completed
-                
-            logger.info(f"📊 Объединены данные за {today_key}")
-        
-        # Считаем общие показатели (ТОЛЬКО день + вечер, БЕЗ morning и cant_do!)
-        total_completed = (
-            len(state['completed']['day']) +
-            len(state['completed']['evening'])
-        )
-        total_tasks = (
-            len(state['tasks']['day']) +
-            len(state['tasks']['evening'])
-        )
-        
-        percentage = int((total_completed / total_tasks * 100)) if total_tasks > 0 else 0
-        
-        logger.info(f"📊 ПОДСЧЁТ: day={len(state['completed']['day'])}/{len(state['tasks']['day'])}, evening={len(state['completed']['evening'])}/{len(state['tasks']['evening'])}, total={total_completed}/{total_tasks} ({percentage}%)")
-        
-        stats[today_key] = {
-            'morning': {
-                'completed': state['completed']['morning'],
-                'total': len(state['tasks']['morning'])
-            },
-            'day': {
-                'completed': state['completed']['day'],
-                'total': len(state['tasks']['day'])
-            },
-            'cant_do': {
-                'completed': state['completed']['cant_do'],
-                'total': len(state['tasks']['cant_do'])
-            },
-            'evening': {
-                'completed': state['completed']['evening'],
-                'total': len(state['tasks']['evening'])
-            },
-            'percentage': percentage,
-            'points': total_completed,
-            'max_points': total_tasks,
-            'penalty': len(state['completed']['cant_do']) > 0,
-            'penalty_pushups': len(state['completed']['cant_do']) * 30  # НОВОЕ: количество отжиманий для утра
-        }
-        
-        # Сохраняем в файл
-        save_success = self.save_stats(stats)
-        logger.info(f"💾 Save stats result: {save_success}")
+            # ЗАПОМИНАЕМ старое количество срывов ДО объединения (для проверки дублирования штрафов)
+            previous_cant_do_count = 0
+            if existing and 'cant_do' in existing:
+                previous_cant_do_count = len(existing['cant_do'].get('completed', []))
+            
+            # ВАЖНО: Объединяем с существующими данными за сегодня!
+            if existing:
+                # Уже есть данные за сегодня - объединяем
+                # Объединяем выполненные задачи (убираем дубликаты)
+                for period in ['morning', 'day', 'cant_do', 'evening']:
+                    existing_completed = set(existing.get(period, {}).get('completed', []))
+                    new_completed = set(completed[period])
+                    # Объединяем множества
+                    combined_completed = sorted(existing_completed | new_completed)
+            
+                    # Обновляем
+                    completed[period] = combined_completed
+            
+                state.set_completed(completed)
+                logger.info(f"📊 Объединены данные за {today_key}")
+            
+            # Считаем общие показатели (ТОЛЬКО день + вечер, БЕЗ morning и cant_do!)
+            total_completed = (
+                len(completed['day']) +
+                len(completed['evening'])
+            )
+            total_tasks = (
+                len(tasks['day']) +
+                len(tasks['evening'])
+            )
+            
+            percentage = int((total_completed / total_tasks * 100)) if total_tasks > 0 else 0
+            
+            logger.info(f"📊 ПОДСЧЁТ: day={len(completed['day'])}/{len(tasks['day'])}, evening={len(completed['evening'])}/{len(tasks['evening'])}, total={total_completed}/{total_tasks} ({percentage}%)")
+            
+            day_stats = {
+                'morning': {
+                    'completed': completed['morning'],
+                    'total': len(tasks['morning'])
+                },
+                'day': {
+                    'completed': completed['day'],
+                    'total': len(tasks['day'])
+                },
+                'cant_do': {
+                    'completed': completed['cant_do'],
+                    'total': len(tasks['cant_do'])
+                },
+                'evening': {
+                    'completed': completed['evening'],
+                    'total': len(tasks['evening'])
+                },
+                'percentage': percentage,
+                'points': total_completed,
+                'max_points': total_tasks,
+                'penalty': len(completed['cant_do']) > 0,
+                'penalty_pushups': len(completed['cant_do']) * 30  # НОВОЕ: количество отжиманий для утра
+            }
+            
+            # Сохраняем в файл
+            save_success = await chat.save_day_stats(today_key, day_stats, previous=existing)
+            logger.info(f"💾 Save stats result: {save_success}")
         
         if save_success:
             # НОВОЕ: Отправляем штрафное сообщение ТОЛЬКО если количество срывов УВЕЛИЧИЛОСЬ
-            current_cant_do_count = len(state['completed']['cant_do'])
+            current_cant_do_count = len(completed['cant_do'])
             
             logger.info(f"⚠️ Штрафы: было={previous_cant_do_count}, стало={current_cant_do_count}")
             
             # Отправляем штраф ТОЛЬКО если количество УВЕЛИЧИЛОСЬ
             if current_cant_do_count > previous_cant_do_count:
                 # Получаем названия задач НЕЛЬЗЯ
-                cant_do_tasks = state['tasks']['cant_do']
-                failed_tasks = [cant_do_tasks[i] for i in state['completed']['cant_do']]
+                cant_do_tasks = tasks['cant_do']
+                failed_tasks = [cant_do_tasks[i] for i in completed['cant_do']]
                 
                 # Отправляем штрафное сообщение
-                await self.send_penalty_message(current_cant_do_count, failed_tasks)
+                await self.send_penalty_message(chat, current_cant_do_count, failed_tasks)
                 logger.info(f"📤 Отправлен штраф: {current_cant_do_count} срывов (увеличилось с {previous_cant_do_count})")
             elif current_cant_do_count > 0:
                 logger.info(f"⏭️ Штраф уже отправлен ранее ({current_cant_do_count} срывов = {previous_cant_do_count}), пропускаем")
             
             # ЭТАП 3: Обновляем исходное сообщение с прогресс-барами
             # ВАЖНО: используем clean_original, а НЕ original_text!
-            clean_text = state.get('clean_original', state['original_text'])
+            clean_text = state.clean_original
             
             # КРИТИЧНО: парсим задачи ИЗ ТЕКУЩЕГО СООБЩЕНИЯ (не из state!)
             # Потому что вечернее сообщение содержит только вечерние задачи
@@ -869,8 +817,8 @@ class TaskTrackerBot:
             
             updated_text = self.update_original_message_with_progress(
                 clean_text,
-                current_tasks,  # Используем текущие, а не state['tasks']
-                state['completed']
+                current_tasks,  # Используем текущие, а не state.tasks
+                completed
             )
             
             # Создаём клавиатуру с ОБЕИМИ кнопками
@@ -882,22 +830,27 @@ class TaskTrackerBot:
                 ]
             }
             
-            await self.edit_message(message_id, updated_text, keyboard)
+            await self.edit_message(chat.chat_id, message_id, updated_text, keyboard)
             
             # НЕ перезаписываем clean_original - он остаётся чистым!
             # Обновляем только original_text для отображения
-            self.message_state[message_id]['original_text'] = updated_text
+            state.original_text = updated_text
             
-            # Сохраняем в файл
-            self.save_message_states()
+            # Записываем в журнал (completed мог измениться после объединения со статистикой)
+            await chat.journal_message_state({
+                'op': 'update',
+                'id': message_id,
+                'fields': {'completed': completed, 'original_text': updated_text}
+            })
             
             # Логируем (без отправки нового сообщения)
             logger.info(f"💾 Прогресс сохранён: {percentage}%")
     
-    async def cancel_update(self, message_id):
+    async def cancel_update(self, chat, message_id):
         """Отменяет обновление, возвращает исходное сообщение"""
-        if message_id in self.message_state:
-            original_text = self.message_state[message_id]['original_text']
+        if message_id in chat.message_state:
+            self.edits.cancel((chat.chat_id, message_id))
+            original_text = chat.message_state[message_id].original_text
             
             # Создаём клавиатуру с ОБЕИМИ кнопками
             keyboard = {
@@ -908,109 +861,228 @@ class TaskTrackerBot:
                 ]
             }
             
-            await self.edit_message(message_id, original_text, keyboard)
+            await self.edit_message(chat.chat_id, message_id, original_text, keyboard)
             
             # При отмене - очищаем состояние
-            if message_id in self.message_state:
-                del self.message_state[message_id]
-                # Сохраняем в файл
-                self.save_message_states()
+            if message_id in chat.message_state:
+                del chat.message_state[message_id]
+                # Записываем в журнал
+                await chat.journal_message_state({'op': 'delete', 'id': message_id})
     
-    async def get_updates(self):
-        """Получает обновления от Telegram (long polling)"""
-        try:
-            url = f"https://api.telegram.org/bot{self.telegram_token}/getUpdates"
-            params = {
-                'offset': self.last_update_id + 1,
-                'timeout': 30
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, timeout=40) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get('result', [])
-                    return []
-        except Exception as e:
-            logger.error(f"❌ Ошибка получения обновлений: {e}")
-            return []
+    @staticmethod
+    def select_update_mode():
+        """UPDATE_MODE=webhook|polling|auto (auto: webhook, если задан RAILWAY_PUBLIC_DOMAIN)"""
+        mode = os.getenv('UPDATE_MODE', 'auto').lower()
+        if mode == 'auto':
+            mode = 'webhook' if os.environ.get('RAILWAY_PUBLIC_DOMAIN') else 'polling'
+        if mode not in ('webhook', 'polling'):
+            raise ValueError(f"❌ Неизвестный UPDATE_MODE: {mode}")
+        return mode
     
     async def health_check(self, request):
         """HTTP endpoint для Railway health check"""
         return web.Response(text="OK", status=200)
     
+    async def status_handler(self, request):
+        """Внутренние счётчики: очередь обновлений, задержки Telegram API, склейка правок"""
+        return web.json_response({
+            'updates': self.updates.get_stats(),
+            'update_mode': self.update_mode,
+            'polling': self.poller.get_stats() if self.poller else None,
+            'telegram_api': self.api.get_stats(),
+            'outbound': self.outbound.get_stats(),
+            'edits': self.edits.stats,
+            'edit_cache': self.edit_cache.get_stats(),
+            'profiler': self.profiler.get_stats(),
+            'storage': self.storage.get_stats(),
+            'loop_lag': self.loop_lag.get_stats(),
+            'parse_cache': {'hits': self.parser.hits, 'misses': self.parser.misses, 'size': len(self.parser.cache)},
+            'chats': {
+                'allowed': len(self.chats.chat_ids),
+                'loaded': len(self.chats.shards),
+                'message_states': {shard.chat_id: len(shard.message_state) for shard in self.chats.loaded()},
+                **self.chats.stats
+            }
+        })
+    
+    def collect_metrics(self):
+        """Значения для /metrics, которые берутся из счётчиков компонентов"""
+        updates = self.updates.get_stats()
+        outbound = self.outbound.get_stats()
+        loaded = self.chats.loaded()
+        return [
+            ('tracker_update_queue_depth', 'gauge', 'Обновлений в очереди воркеров', [({}, updates['depth'])]),
+            ('tracker_updates_total', 'counter', 'Обработанные обновления по результату',
+             [({'result': 'processed'}, updates['processed']), ({'result': 'failed'}, updates['failed'])]),
+            ('tracker_outbound_queue_depth', 'gauge', 'Исходящих вызовов в очереди диспетчера', [({}, outbound['depth'])]),
+            ('tracker_outbound_inflight', 'gauge', 'Исходящих вызовов в полёте', [({}, outbound['inflight'])]),
+            ('tracker_outbound_total', 'counter', 'Исходящие вызовы по исходу',
+             [({'result': name}, outbound[name]) for name in ('sent', 'throttled', 'retried', 'dropped', 'failed')]),
+            ('tracker_edits_total', 'counter', 'Правки сообщений по исходу',
+             [({'result': name}, value) for name, value in self.edits.stats.items()]),
+            ('tracker_edit_cache_total', 'counter', 'Правки: пропущенные без изменений (hit) и отправленные (miss)',
+             [({'result': 'hit'}, self.edit_cache.hits), ({'result': 'miss'}, self.edit_cache.misses)]),
+            ('tracker_parse_cache_total', 'counter', 'Обращения к кэшу разбора сообщений',
+             [({'result': 'hit'}, self.parser.hits), ({'result': 'miss'}, self.parser.misses)]),
+            ('tracker_storage_pending', 'gauge', 'Операций в очереди потока хранилища',
+             [({}, self.storage.get_stats()['pending'])]),
+            ('tracker_chats_loaded', 'gauge', 'Загруженные шарды чатов', [({}, len(loaded))]),
+            ('tracker_message_states', 'gauge', 'Состояний сообщений в памяти',
+             [({'chat_id': shard.chat_id}, len(shard.message_state)) for shard in loaded]),
+            ('tracker_message_states_bytes', 'gauge', 'Примерный размер состояний сообщений в памяти',
+             [({'chat_id': shard.chat_id}, shard.message_state.approx_size()) for shard in loaded]),
+        ]
+    
+    async def metrics_handler(self, request):
+        """Метрики в текстовом формате Prometheus"""
+        return web.Response(body=REGISTRY.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+    
+    def is_admin(self, request):
+        """Админские endpoint'ы доступны только при заданном ADMIN_TOKEN"""
+        token = request.headers.get('X-Admin-Token') or request.query.get('token')
+        return bool(self.admin_token) and token == self.admin_token
+    
+    async def profile_report_handler(self, request):
+        """GET /admin/profile?top=30&sort=cumulative|tottime|ncalls - сводный топ горячих функций"""
+        if not self.is_admin(request):
+            return web.Response(status=403)
+        try:
+            top = int(request.query.get('top', 30))
+        except ValueError:
+            return web.Response(status=400, text='top должен быть числом')
+        sort = request.query.get('sort', 'cumulative')
+        # Чтение и свёртка профилей - в потоке хранилища (по очереди с записью и ротацией профилей)
+        report = await self.storage.run(self.profiler.report, top, sort)
+        return web.Response(text=report)
+    
+    async def profile_window_handler(self, request):
+        """POST /admin/profile?seconds=60 - профилировать все обновления в течение окна"""
+        if not self.is_admin(request):
+            return web.Response(status=403)
+        try:
+            seconds = min(float(request.query.get('seconds', 60)), 3600)
+        except ValueError:
+            return web.Response(status=400, text='seconds должен быть числом')
+        self.profiler.enable_window(seconds)
+        return web.json_response(self.profiler.get_stats())
+    
     async def webhook_handler(self, request):
-        """Обработчик webhook от Telegram"""
+        """Обработчик webhook от Telegram: проверяет, ставит в очередь и сразу отвечает"""
+        started = time.perf_counter()
+        response, kind = await self.handle_webhook(request)
+        WEBHOOK_SECONDS.observe(time.perf_counter() - started, update_type=kind)
+        return response
+    
+    async def handle_webhook(self, request):
+        """Возвращает (ответ, тип обновления)"""
+        if self.webhook_secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.webhook_secret:
+            logger.warning("⚠️ Webhook с неверным секретом отклонён")
+            return web.Response(status=403), 'forbidden'
+        
         try:
             update = await request.json()
+        except Exception as e:
+            logger.error(f"❌ Некорректный JSON в webhook: {e}")
+            return web.Response(status=400), 'invalid'
+        
+        if not isinstance(update, dict) or 'update_id' not in update:
+            logger.warning(f"⚠️ Webhook без update_id отклонён")
+            return web.Response(status=400), 'invalid'
+        
+        # ЛОГИРУЕМ ВСЕ WEBHOOK ДЛЯ ОТЛАДКИ
+        logger.info(f"🔔 Webhook получен: {list(update.keys())}")
+        
+        if not self.updates.submit(update):
+            # Очередь переполнена - Telegram повторит доставку позже
+            return web.Response(status=503), update_type(update)
+        
+        return web.Response(text='OK'), update_type(update)
+    
+    async def handle_update(self, update):
+        """Обработка обновления воркером (1 из N - под профилировщиком)"""
+        return await self.profiler.run(self.process_update(update), update_type(update))
+    
+    async def process_update(self, update):
+        """Обрабатывает одно обновление Telegram (вызывается воркером очереди)"""
+        # Обрабатываем обычное сообщение или channel_post
+        message = update.get('message') or update.get('channel_post')
+        
+        if message:
+            chat_id = str(message.get('chat', {}).get('id', ''))
+            chat_title = message.get('chat', {}).get('title', 'Private')
+            chat_type = message.get('chat', {}).get('type', 'unknown')
             
-            # ЛОГИРУЕМ ВСЕ WEBHOOK ДЛЯ ОТЛАДКИ
-            logger.info(f"🔔 Webhook получен: {list(update.keys())}")
-            
-            # Обрабатываем обычное сообщение или channel_post
-            message = update.get('message') or update.get('channel_post')
+            logger.info(f"📩 Сообщение из чата: ID={chat_id}, Title={chat_title}, Type={chat_type}")
             
-            if message:
-                chat_id = str(message.get('chat', {}).get('id', ''))
-                chat_title = message.get('chat', {}).get('title', 'Private')
-                chat_type = message.get('chat', {}).get('type', 'unknown')
+            # Проверяем что это разрешённый чат
+            if self.chats.is_allowed(chat_id) and 'text' in message:
+                message_text = message['text']
                 
-                logger.info(f"📩 Сообщение из чата: ID={chat_id}, Title={chat_title}, Type={chat_type}")
-                logger.info(f"🔑 Ожидаемый chat_id: {self.chat_id}")
+                logger.info(f"✅ Chat ID совпал! Проверяю текст...")
                 
-                # Проверяем что это наш чат
-                if chat_id == self.chat_id and 'text' in message:
-                    message_text = message['text']
+                # Проверяем что в сообщении есть задачи
+                if any(keyword in message_text for keyword in ['☀️', '📋', '⛔', '🌙', 'Дневн', 'Нельзя', 'Вечерн']):
+                    logger.info("📨 Получено сообщение с задачами")
                     
-                    logger.info(f"✅ Chat ID совпал! Проверяю текст...")
+                    # Парсим задачи
+                    tasks = self.parse_tasks(message_text)
                     
-                    # Проверяем что в сообщении есть задачи
-                    if any(keyword in message_text for keyword in ['☀️', '📋', '⛔', '🌙', 'Дневн', 'Нельзя', 'Вечерн']):
-                        logger.info("📨 Получено сообщение с задачами")
-                        
-                        # Парсим задачи
-                        tasks = self.parse_tasks(message_text)
-                        
-                        # Создаём клавиатуру
-                        keyboard = self.create_checklist_keyboard(tasks, {})
-                        
-                        # Формируем текст
-                        response_text = self.format_checklist_message(tasks, {})
-                        
-                        # Отправляем ответ с кнопками
-                        await self.send_message(response_text, keyboard)
-                    else:
-                        logger.warning(f"⚠️ Нет ключевых слов в сообщении: {message_text[:50]}...")
+                    # Текст и клавиатура одним рендерером
+                    response_text, keyboard = self.render_checklist(TrackedMessage(tasks))
+                    
+                    # Отправляем ответ с кнопками в тот же чат
+                    await self.send_telegram_message(response_text, chat_id=chat_id, reply_markup=keyboard)
                 else:
-                    logger.warning(f"⚠️ Чат не совпадает или нет текста. chat_id={chat_id}, expected={self.chat_id}, has_text={'text' in message}")
+                    logger.warning(f"⚠️ Нет ключевых слов в сообщении: {message_text[:50]}...")
+            else:
+                logger.warning(f"⚠️ Чат не разрешён или нет текста. chat_id={chat_id}, has_text={'text' in message}")
+        
+        # Обрабатываем callback_query
+        elif 'callback_query' in update:
+            callback_query = update['callback_query']
+            callback_data = callback_query.get('data', '')
+            callback_query_id = callback_query.get('id', '')
+            message = callback_query.get('message', {})
+            message_id = message.get('message_id', 0)
+            message_text = message.get('text', '')
+            chat_id = str(message.get('chat', {}).get('id', self.chat_id))
             
-            # Обрабатываем callback_query
-            elif 'callback_query' in update:
-                callback_query = update['callback_query']
-                callback_data = callback_query.get('data', '')
-                callback_query_id = callback_query.get('id', '')
-                message = callback_query.get('message', {})
-                message_id = message.get('message_id', 0)
-                message_text = message.get('text', '')
-                
-                logger.info(f"📞 Получен callback: {callback_data}")
-                await self.process_callback(callback_data, callback_query_id, message_id, message_text)
+            if not self.chats.is_allowed(chat_id):
+                logger.warning(f"⚠️ Callback из неразрешённого чата {chat_id}")
+                await self.answer_callback_query(callback_query_id)
+                return
             
-            return web.Response(text='OK')
-        except Exception as e:
-            logger.error(f"❌ Ошибка webhook: {e}", exc_info=True)
-            return web.Response(status=500)
+            logger.info(f"📞 Получен callback: {callback_data} (чат {chat_id})")
+            chat = await self.chats.get(chat_id)
+            # Нажатия в одном сообщении - по очереди, разные сообщения и чаты не ждут друг друга
+            async with chat.message_locks.hold(message_id):
+                await self.process_callback(chat, callback_data, callback_query_id, message_id, message_text)
     
     async def run(self):
         """Основной цикл бота"""
         logger.info("🤖 Tracker Bot запущен!")
-        logger.info("📊 Слушаю обновления...")
+        logger.info(f"📊 Слушаю обновления ({self.update_mode})...")
+        
+        # Открываем общий пул соединений к Telegram API
+        await self.api.start()
+        self.outbound.start()
+        
+        # Воркеры очереди обновлений
+        self.updates.start()
+        
+        # Фоновое уплотнение журнала состояний и замер задержек цикла событий
+        compaction_task = asyncio.create_task(self.compact_message_states_loop())
+        loop_lag_task = asyncio.create_task(self.loop_lag.run())
         
         # Запускаем HTTP сервер для Railway
         app = web.Application()
         app.router.add_get('/', self.health_check)
         app.router.add_get('/health', self.health_check)
         app.router.add_post('/webhook', self.webhook_handler)  # ← WEBHOOK!
+        app.router.add_get('/status', self.status_handler)
+        app.router.add_get('/metrics', self.metrics_handler)
+        app.router.add_get('/admin/profile', self.profile_report_handler)
+        app.router.add_post('/admin/profile', self.profile_window_handler)
         
         port = int(os.environ.get('PORT', 8080))
         runner = web.AppRunner(app)
@@ -1019,37 +1091,85 @@ class TaskTrackerBot:
         await site.start()
         logger.info(f"🌐 HTTP сервер запущен на порту {port}")
         
-        # Устанавливаем webhook
-        railway_domain = os.environ.get('RAILWAY_PUBLIC_DOMAIN')
-        if railway_domain:
-            webhook_url = f"https://{railway_domain}/webhook"
-            async with aiohttp.ClientSession() as session:
-                url = f"https://api.telegram.org/bot{self.telegram_token}/setWebhook"
-                payload = {'url': webhook_url}
-                async with session.post(url, json=payload) as response:
-                    result = await response.json()
-                    if result.get('ok'):
+        polling_task = None
+        try:
+            # Устанавливаем webhook
+            railway_domain = os.environ.get('RAILWAY_PUBLIC_DOMAIN')
+            if self.update_mode == 'webhook' and railway_domain:
+                webhook_url = f"https://{railway_domain}/webhook"
+                try:
+                    payload = {'url': webhook_url}
+                    if self.webhook_secret:
+                        payload['secret_token'] = self.webhook_secret
+                    status, result = await self.api.call('setWebhook', payload)
+                    if isinstance(result, dict) and result.get('ok'):
                         logger.info(f"✅ Webhook установлен: {webhook_url}")
                     else:
                         logger.error(f"❌ Ошибка webhook: {result}")
-        
-        last_schedule_check = datetime.now()
-        
-        # Основной цикл - только для проверки расписания
-        while True:
-            try:
-                # Проверяем расписание каждую минуту
-                now = datetime.now()
-                if (now - last_schedule_check).seconds >= 60:
-                    await self.check_schedule()
-                    last_schedule_check = now
-                
-                await asyncio.sleep(60)  # Спим минуту
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка в главном цикле: {e}")
-                await asyncio.sleep(5)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка установки webhook: {e}")
+            
+            if self.poller:
+                # Нет публичного адреса - забираем обновления сами
+                polling_task = asyncio.create_task(self.poller.run())
+            
+            # Основной цикл - планировщик спит до ближайшего срока
+            self.register_jobs()
+            await self.scheduler.run()
+        finally:
+            compaction_task.cancel()
+            loop_lag_task.cancel()
+            if polling_task:
+                polling_task.cancel()
+            await runner.cleanup()
+            await self.updates.stop()
+            if self.poller:
+                await self.poller.flush_state()
+            await self.edits.flush_all()
+            await self.outbound.stop()
+            await self.api.close()
+            await self.chats.close_all()
+            self.storage.shutdown()
 
-if __name__ == "__main__":
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    
+    if command == 'migrate-stats':
+        # Одноразовый перенос stats.json в SQLite: python tracker_bot.py migrate-stats [stats.json]
+        source = sys.argv[2] if len(sys.argv) > 2 else 'stats.json'
+        backend = SQLiteStatsBackend(os.getenv('STATS_DB_FILE', 'stats.db'))
+        migrate_json_stats(source, backend)
+        logger.info(f"✅ Дней в базе: {backend.count()}")
+        backend.close()
+        return
+    
+    if command == 'rebuild-aggregates':
+        # Пересчёт агрегатов по всей истории всех чатов: python tracker_bot.py rebuild-aggregates
+        chat_ids = chat_ids_from_env() or ['']
+        for chat_id in chat_ids:
+            paths = chat_paths(chat_id, chat_id == chat_ids[0], os.getenv('CHAT_DATA_DIR', 'chats'))
+            backend = open_stats_backend(paths)
+            aggregates = StatsAggregates(paths['aggregates'], backend)
+            aggregates.rebuild()
+            logger.info(f"🔥 Чат {chat_id or '-'}: рекорд серии {STREAK_THRESHOLD}%+: {aggregates.longest_streak()}")
+            backend.close()
+        return
+    
+    if command == 'archive-stats':
+        # Перенос старых месяцев в архив: python tracker_bot.py archive-stats [дней]
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.getenv('STATS_ARCHIVE_DAYS', 180))
+        detail = os.getenv('STATS_ARCHIVE_DETAIL', '0') == '1'
+        chat_ids = chat_ids_from_env() or ['']
+        for chat_id in chat_ids:
+            paths = chat_paths(chat_id, chat_id == chat_ids[0], os.getenv('CHAT_DATA_DIR', 'chats'))
+            backend = open_stats_backend(paths)
+            archived = backend.archive(days, keep_detail=detail)
+            logger.info(f"🗄️ Чат {chat_id or '-'}: в архив перенесено дней: {archived}, в горячем хранилище: {backend.hot.count()}")
+            backend.close()
+        return
+    
     bot = TaskTrackerBot()
     asyncio.run(bot.run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Очередь входящих обновлений Telegram для tracker_bot.py
+Webhook только кладёт обновление в очередь и сразу отвечает 200,
+а обработкой занимается пул воркеров. Обновления одного сообщения
+(чат + message_id) всегда попадают к одному воркеру (порядок сохраняется),
+разные сообщения и чаты обрабатываются параллельно.
+"""
+
+import asyncio
+import logging
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PROCESSING_SECONDS = REGISTRY.histogram(
+    'tracker_update_processing_seconds', 'Длительность обработки обновления воркером', ('update_type',)
+)
+
+
+def update_type(update):
+    """Тип обновления: message, channel_post, callback_query, ..."""
+    for key in update:
+        if key != 'update_id':
+            return key
+    return 'unknown'
+
+
+def update_key(update):
+    """Ключ упорядочивания: (chat_id, message_id) сообщения, к которому относится обновление"""
+    callback_query = update.get('callback_query')
+    if callback_query:
+        message = callback_query.get('message') or {}
+    else:
+        message = update.get('message') or update.get('channel_post') or {}
+    chat_id = (message.get('chat') or {}).get('id')
+    return chat_id, message.get('message_id', update.get('update_id', 0))
+
+
+class UpdateWorkerPool:
+    """Ограниченная очередь обновлений и пул воркеров с шардированием по (chat_id, message_id)"""
+
+    def __init__(self, handler, workers=4, maxsize=1000, on_done=None):
+        self.handler = handler  # async handler(update)
+        self.on_done = on_done  # on_done(update) после обработки (успешной или нет)
+        self.workers = max(1, workers)
+        shard_size = max(1, maxsize // self.workers)
+        self.queues = [asyncio.Queue(maxsize=shard_size) for _ in range(self.workers)]
+        self.tasks = []
+        self.stats = {
+            'received': 0, 'processed': 0, 'failed': 0, 'dropped': 0,
+            'latency_total_ms': 0.0, 'latency_max_ms': 0.0, 'latency_last_ms': 0.0,
+            'processing_total_ms': 0.0
+        }
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._worker(queue)) for queue in self.queues]
+            logger.info(f"👷 Запущено воркеров обновлений: {self.workers}")
+
+    async def stop(self, timeout=10):
+        """Дожидается обработки очереди (не дольше timeout) и останавливает воркеры"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Очередь не опустела за {timeout}с, осталось: {self.depth()}")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, update):
+        """Кладёт обновление в очередь. False - очередь переполнена"""
+        self.stats['received'] += 1
+        key = update_key(update)
+        queue = self.queues[hash(key) % self.workers]
+        try:
+            queue.put_nowait((time.monotonic(), update))
+            return True
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            logger.error(f"❌ Очередь обновлений переполнена, update_id={update.get('update_id')}")
+            return False
+
+    async def put(self, update):
+        """Кладёт обновление в очередь, дожидаясь места (для long polling)"""
+        self.stats['received'] += 1
+        await self.queues[hash(update_key(update)) % self.workers].put((time.monotonic(), update))
+
+    def depth(self):
+        return sum(queue.qsize() for queue in self.queues)
+
+    async def _worker(self, queue):
+        while True:
+            enqueued, update = await queue.get()
+            started = time.monotonic()
+            try:
+                await self.handler(update)
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"❌ Ошибка обработки обновления {update.get('update_id')}: {e}", exc_info=True)
+            finally:
+                finished = time.monotonic()
+                PROCESSING_SECONDS.observe(finished - started, update_type=update_type(update))
+                latency_ms = (finished - enqueued) * 1000
+                self.stats['latency_total_ms'] += latency_ms
+                self.stats['latency_last_ms'] = latency_ms
+                self.stats['latency_max_ms'] = max(self.stats['latency_max_ms'], latency_ms)
+                self.stats['processing_total_ms'] += (finished - started) * 1000
+                if self.on_done:
+                    self.on_done(update)
+                queue.task_done()
+
+    def get_stats(self):
+        """Глубина очереди и задержки (от постановки в очередь до конца обработки)"""
+        stats = dict(self.stats)
+        done = stats['processed'] + stats['failed']
+        stats['depth'] = self.depth()
+        stats['depth_by_worker'] = [queue.qsize() for queue in self.queues]
+        stats['workers'] = self.workers
+        stats['latency_avg_ms'] = round(stats['latency_total_ms'] / done, 1) if done else 0.0
+        stats['processing_avg_ms'] = round(stats['processing_total_ms'] / done, 1) if done else 0.0
+        return stats